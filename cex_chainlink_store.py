@@ -0,0 +1,311 @@
+#!/usr/bin/env python3
+"""
+Chainlink 历史价格（data.chain.link historical-stream-data）的本地时间序列存储
+
+    .cache/chainlink_{feed[-12:]}_{timeRange}.bin
+
+    header '<8s' = MAGIC
+    record '<dd' = (timestamp, price)，按时间递增追加
+
+- 内存中保存解析好的 ts/price 数组（array('d')），不再每次对所有节点做 fromisoformat 和排序
+- refresh() 在缓存过期后请求一次接口，只解析并追加比最后一个点更新的节点；
+  文件 mtime 即上次成功拉取的时间，重启后在 max_age_s 内不会重复请求
+- 相邻两点间隔在 [600, 1200] 秒内视为一个窗口，窗口偏移 |p1 - p0| 在追加时增量计算
+- 多个进程共用同一文件时，追加前先读入其他进程追加的记录；时间不递增的记录被忽略
+- 接口地址可用环境变量 CHAINLINK_API_BASE 指向本地替身（见 --serve）
+
+    store = ChainlinkHistoryStore(feed_id, "1W", cache_dir=Path(".cache"))
+    store.refresh(max_age_s=300)
+    offsets = store.recent_offsets(20)
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import random
+import struct
+import sys
+import time
+import urllib.parse
+import urllib.request
+from array import array
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Optional
+
+CHAINLINK_API_BASE = os.environ.get("CHAINLINK_API_BASE", "https://data.chain.link").rstrip("/")
+
+_MAGIC = b"CLSTORE1"
+_RECORD = struct.Struct("<dd")
+
+# 相邻两点的间隔在此范围内才算一个窗口（与旧的 _recent_chainlink_offsets 一致）
+WINDOW_DT_MIN_S = 600.0
+WINDOW_DT_MAX_S = 1200.0
+
+# 拉取失败后至少等这么久再重试（避免每次打分都阻塞在超时上）
+RETRY_AFTER_S = 30.0
+
+# 只保留最近这么久的点；加载时超出部分较多则重写文件
+RETAIN_S = 30 * 86400.0
+
+TIME_RANGE_SECONDS = {"1D": 86400, "1W": 7 * 86400, "1M": 30 * 86400}
+
+
+def extract_nodes(payload: dict[str, Any]) -> list[dict[str, Any]]:
+    data = payload.get("data") or {}
+    if not isinstance(data, dict):
+        return []
+    for _, val in data.items():
+        if isinstance(val, dict):
+            nodes = val.get("nodes")
+            if isinstance(nodes, list):
+                return nodes
+    return []
+
+
+def parse_node(node: dict[str, Any]) -> Optional[tuple[float, float]]:
+    tb = node.get("timeBucket")
+    mid = node.get("mid")
+    if not tb or mid is None:
+        return None
+    try:
+        ts = datetime.fromisoformat(str(tb).replace("Z", "+00:00")).timestamp()
+        price = float(mid) / 1e18
+    except Exception:
+        return None
+    return float(ts), float(price)
+
+
+def store_path_for(cache_dir: Path, feed_id: str, time_range: str) -> Path:
+    safe_feed = feed_id.replace("0x", "")[-12:]
+    return Path(cache_dir) / f"chainlink_{safe_feed}_{time_range}.bin"
+
+
+class ChainlinkHistoryStore:
+    """单个 (feedId, timeRange) 的持久化价格序列"""
+
+    def __init__(
+        self,
+        feed_id: str,
+        time_range: str = "1W",
+        *,
+        cache_dir: Optional[Path] = None,
+        api_base: Optional[str] = None,
+    ) -> None:
+        self.feed_id = str(feed_id)
+        self.time_range = str(time_range)
+        self.api_base = (api_base or CHAINLINK_API_BASE).rstrip("/")
+        self.path = store_path_for(Path(cache_dir) if cache_dir else Path(".cache"), self.feed_id, self.time_range)
+        self.ts = array("d")
+        self.prices = array("d")
+        self.offsets: list[float] = []
+        self.fetched_at = 0.0
+        self._last_attempt = 0.0
+        self._file_pos = 0
+        self._load()
+
+    def __len__(self) -> int:
+        return len(self.ts)
+
+    @property
+    def last_ts(self) -> Optional[float]:
+        return self.ts[-1] if self.ts else None
+
+    def _push(self, ts: float, price: float) -> bool:
+        """追加一个点（时间必须递增），同时更新窗口偏移"""
+        if self.ts:
+            dt = ts - self.ts[-1]
+            if dt <= 0:
+                return False
+            if WINDOW_DT_MIN_S <= dt <= WINDOW_DT_MAX_S:
+                self.offsets.append(abs(price - self.prices[-1]))
+        self.ts.append(ts)
+        self.prices.append(price)
+        return True
+
+    def _load(self) -> None:
+        try:
+            st = self.path.stat()
+        except FileNotFoundError:
+            return
+        self.fetched_at = st.st_mtime
+        self._sync()
+        cutoff = time.time() - RETAIN_S
+        if self.ts and self.ts[0] < cutoff:
+            keep = [(t, p) for t, p in zip(self.ts, self.prices) if t >= cutoff]
+            stale = len(self.ts) - len(keep)
+            self.ts, self.prices, self.offsets = array("d"), array("d"), []
+            for t, p in keep:
+                self._push(t, p)
+            if stale > len(keep):
+                self._rewrite()
+
+    def _sync(self) -> None:
+        """读入文件中尚未加载的记录（其他进程追加的部分）"""
+        try:
+            with open(self.path, "rb") as f:
+                if self._file_pos == 0:
+                    if f.read(len(_MAGIC)) != _MAGIC:
+                        return
+                    self._file_pos = len(_MAGIC)
+                f.seek(self._file_pos)
+                data = f.read()
+        except OSError:
+            return
+        n = len(data) // _RECORD.size
+        for t, p in _RECORD.iter_unpack(data[: n * _RECORD.size]):
+            self._push(t, p)
+        self._file_pos += n * _RECORD.size
+
+    def _rewrite(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        with open(tmp, "wb") as f:
+            f.write(_MAGIC)
+            for t, p in zip(self.ts, self.prices):
+                f.write(_RECORD.pack(t, p))
+        os.replace(tmp, self.path)
+        self._file_pos = len(_MAGIC) + len(self.ts) * _RECORD.size
+
+    def _append_file(self, points: list[tuple[float, float]]) -> None:
+        if not self._file_pos or not self.path.exists():
+            self._rewrite()
+            return
+        with open(self.path, "r+b") as f:
+            # 丢弃崩溃时写了一半的尾部记录（按整条记录对齐，不截掉其他进程刚追加的记录）
+            size = f.seek(0, 2)
+            aligned = len(_MAGIC) + (size - len(_MAGIC)) // _RECORD.size * _RECORD.size
+            f.truncate(aligned)
+            f.seek(aligned)
+            f.write(b"".join(_RECORD.pack(t, p) for t, p in points))
+            self._file_pos = f.tell()
+
+    def ingest(self, nodes: list[dict[str, Any]]) -> int:
+        """解析接口返回的节点，只追加比最后一个点更新的部分；返回新增点数"""
+        last = self.last_ts
+        fresh: list[tuple[float, float]] = []
+        if nodes:
+            first, final = parse_node(nodes[0]), parse_node(nodes[-1])
+            ordered = nodes[::-1] if not (first and final and first[0] > final[0]) else nodes
+            # 从最新的节点往回解析，遇到已有的时间即停止
+            for node in ordered:
+                point = parse_node(node)
+                if point is None:
+                    continue
+                if last is not None and point[0] <= last:
+                    break
+                fresh.append(point)
+        fresh.sort(key=lambda x: x[0])
+        added = [pt for pt in fresh if self._push(*pt)]
+        if added:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._append_file(added)
+        return len(added)
+
+    def _fetch_nodes(self, timeout_s: float) -> Optional[list[dict[str, Any]]]:
+        url = f"{self.api_base}/api/historical-stream-data?" + urllib.parse.urlencode(
+            {"feedId": self.feed_id, "timeRange": self.time_range}
+        )
+        req = urllib.request.Request(url, headers={"User-Agent": "Mozilla/5.0"})
+        try:
+            with urllib.request.urlopen(req, timeout=float(timeout_s)) as resp:
+                payload = json.loads(resp.read().decode("utf-8", errors="replace"))
+        except Exception:
+            return None
+        return extract_nodes(payload) if isinstance(payload, dict) else None
+
+    def refresh(self, *, max_age_s: float = 300.0, timeout_s: float = 1.5, now: Optional[float] = None) -> int:
+        """缓存过期时拉取一次并追加新点；返回新增点数"""
+        now = time.time() if now is None else float(now)
+        if now - self.fetched_at <= float(max_age_s):
+            return 0
+        if now - self._last_attempt < min(float(max_age_s), RETRY_AFTER_S):
+            return 0
+        self._last_attempt = now
+        nodes = self._fetch_nodes(timeout_s)
+        if nodes is None:
+            return 0
+        self._sync()
+        added = self.ingest(nodes)
+        self.fetched_at = now
+        if self.path.exists():
+            os.utime(self.path, (now, now))
+        return added
+
+    def recent_offsets(self, n_windows: int) -> list[float]:
+        if n_windows <= 0:
+            return list(self.offsets)
+        return self.offsets[-int(n_windows):]
+
+
+def _stand_in_handler(*, step_s: float = 900.0, seed: int = 0):
+    """本地替身：按 Chainlink 接口格式返回 timeRange 内的点（随机游走，随时间继续生成）"""
+    rng = random.Random(seed)
+    start = (time.time() // step_s) * step_s - 8 * 86400
+    points: list[tuple[float, float]] = [(start, 60_000.0)]
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self) -> None:
+            url = urllib.parse.urlparse(self.path)
+            if url.path != "/api/historical-stream-data":
+                self.send_error(404)
+                return
+            query = urllib.parse.parse_qs(url.query)
+            span = TIME_RANGE_SECONDS.get((query.get("timeRange") or ["1W"])[0], 7 * 86400)
+            end = time.time()
+            while points[-1][0] + step_s <= end:
+                points.append((points[-1][0] + step_s, points[-1][1] + rng.gauss(0.0, 40.0)))
+            nodes = [
+                {
+                    "timeBucket": datetime.fromtimestamp(t, tz=timezone.utc).isoformat().replace("+00:00", "Z"),
+                    "mid": str(int(p * 1e18)),
+                }
+                for t, p in points
+                if end - span <= t <= end
+            ]
+            body = json.dumps({"data": {"allStreamValuesGeneric": {"nodes": nodes}}}).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format: str, *args: Any) -> None:
+            return
+
+    return Handler
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Chainlink history store")
+    ap.add_argument("--feed-id", type=str, default="0x00039d9e45394f473ab1f050a1b963e6b05351e52d71e507509ada0c95ed75b8")
+    ap.add_argument("--time-range", type=str, default="1W")
+    ap.add_argument("--cache-dir", type=str, default=".cache")
+    ap.add_argument("--n-windows", type=int, default=20)
+    ap.add_argument("--serve", type=int, default=0, help="在该端口启动本地替身接口（随机游走）")
+    ap.add_argument("--serve-step-s", type=float, default=900.0, help="替身接口的点间隔（秒）")
+    args = ap.parse_args()
+
+    if args.serve:
+        handler = _stand_in_handler(step_s=float(args.serve_step_s))
+        server = ThreadingHTTPServer(("127.0.0.1", int(args.serve)), handler)
+        print(f"[INFO] chainlink stand-in on http://127.0.0.1:{int(args.serve)}", file=sys.stderr)
+        server.serve_forever()
+        return
+
+    store = ChainlinkHistoryStore(args.feed_id, args.time_range, cache_dir=Path(args.cache_dir))
+    added = store.refresh(max_age_s=0)
+    print(json.dumps({
+        "path": str(store.path),
+        "points": len(store),
+        "added": added,
+        "last_ts": store.last_ts,
+        "offsets": store.recent_offsets(int(args.n_windows)),
+    }))
+
+
+if __name__ == "__main__":
+    main()
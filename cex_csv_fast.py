@@ -0,0 +1,265 @@
+"""
+CEX 切片CSV（cex_{symbol}_YYYYMMDD_00-12.csv）的快速解析
+
+scorer/daemon 只需要 sample_id, t_sample_unix, venue, imb, err 五列：
+列位置在读header时解析一次，之后每行直接 str.split（带maxsplit），
+不再为每行构造 csv.DictReader 和整行dict。含引号的行（err 中带逗号等）
+回退到 csv 模块解析。
+
+    parser = CexSignalParser(read_header(path))
+    for row in parser.iter_rows(lines, venues=venues):
+        sid, t, venue, imb = row
+
+倒序分块读取（warmup只需回溯lookback窗口时使用）：
+    for lines in iter_chunks_reverse(path):
+        ...
+
+单个venue的价格序列（回放/回测代替实时K线）：
+    prices = read_venue_prices(path, venue="binance_spot")
+
+NumPy 数组（可选依赖，调用时才导入；参数扫描等需要按venue矩阵运算时使用）：
+    arrays = load_signal_arrays(path, venues=venues)
+    ts, scores = complete_signals_from_arrays(arrays, weights=weights)
+    ts, imb = complete_matrix_from_arrays(arrays, n_venues=len(venues))  # 每个venue一列（参数扫描用）
+"""
+
+from __future__ import annotations
+
+import csv
+from pathlib import Path
+from typing import Any, Iterable, Iterator, Optional
+
+SIGNAL_COLUMNS = ("sample_id", "t_sample_unix", "venue", "imb", "err")
+HEADER_PREFIX = "ts_sample_utc,"
+
+# (sample_id, t_sample_unix, venue, imb)
+SignalRow = tuple[int, float, str, float]
+
+
+def read_header(path: Path) -> list[str]:
+    with Path(path).open("r", encoding="utf-8", errors="replace") as f:
+        line = f.readline().strip("\r\n")
+    return next(csv.reader([line]))
+
+
+class CexSignalParser:
+    """按header解析一次列位置的行解析器"""
+
+    def __init__(self, header: list[str]) -> None:
+        self.header = list(header)
+        pos = {name.strip(): i for i, name in enumerate(self.header)}
+        missing = [c for c in SIGNAL_COLUMNS if c not in pos]
+        if missing:
+            raise ValueError(f"CEX CSV header missing columns: {missing}")
+        self.i_sid = pos["sample_id"]
+        self.i_t = pos["t_sample_unix"]
+        self.i_venue = pos["venue"]
+        self.i_imb = pos["imb"]
+        self.i_err = pos["err"]
+        self.max_idx = max(self.i_sid, self.i_t, self.i_venue, self.i_imb, self.i_err)
+        # 只切到需要的最后一列；其后还有列时多切一刀，保证该列不含剩余部分
+        self.maxsplit = min(self.max_idx + 1, len(self.header) - 1)
+
+    def split(self, line: str) -> list[str]:
+        if '"' in line:
+            try:
+                return next(csv.reader([line]))
+            except Exception:
+                return []
+        return line.split(",", self.maxsplit)
+
+    def parse(self, line: str, need: Optional[set[str]] = None) -> Optional[SignalRow]:
+        """解析一行；header行、err非空、字段缺失或venue不在need中时返回None"""
+        if not line or line.startswith(HEADER_PREFIX):
+            return None
+        parts = self.split(line)
+        if len(parts) <= self.max_idx:
+            return None
+        venue = parts[self.i_venue].strip()
+        if need is not None and venue not in need:
+            return None
+        if parts[self.i_err].strip():
+            return None
+        sid_s = parts[self.i_sid].strip()
+        t_s = parts[self.i_t].strip()
+        imb_s = parts[self.i_imb].strip()
+        if not (sid_s and t_s and imb_s):
+            return None
+        try:
+            return int(float(sid_s)), float(t_s), venue, float(imb_s)
+        except ValueError:
+            return None
+
+    def iter_rows(self, lines: Iterable[str], *, venues: Optional[Iterable[str]] = None) -> Iterator[SignalRow]:
+        need = set(venues) if venues is not None else None
+        parse = self.parse
+        for ln in lines:
+            row = parse(ln.rstrip("\r\n"), need)
+            if row is not None:
+                yield row
+
+
+def _read_lines(path: Path, start_offset: int = 0) -> list[str]:
+    with Path(path).open("rb") as f:
+        f.seek(max(0, int(start_offset)))
+        data = f.read()
+    lines = data.decode("utf-8", errors="replace").splitlines()
+    if start_offset > 0 and lines:
+        lines = lines[1:]
+    return lines
+
+
+def read_signal_rows(
+    path: Path,
+    *,
+    venues: Optional[Iterable[str]] = None,
+    start_offset: int = 0,
+    parser: Optional[CexSignalParser] = None,
+) -> list[SignalRow]:
+    """
+    从 start_offset 起读取整个文件剩余部分并解析
+
+    start_offset>0 时第一行可能不完整，直接丢弃。
+    """
+    path = Path(path)
+    parser = parser or CexSignalParser(read_header(path))
+    return list(parser.iter_rows(_read_lines(path, start_offset), venues=venues))
+
+
+def iter_chunks_reverse(path: Path, *, chunk_bytes: int = 4 << 20) -> Iterator[list[str]]:
+    """
+    从文件末尾向前按块读取，每次产出一个块内的完整行（块内按文件顺序）
+
+    块边界处被截断的行留到下一个（更靠前的）块拼接，调用方可随时停止，
+    读取量只取决于需要回溯多远而不是文件大小。
+    """
+    chunk_bytes = max(1024, int(chunk_bytes))
+    with Path(path).open("rb") as f:
+        f.seek(0, 2)
+        pos = f.tell()
+        carry = b""
+        while pos > 0:
+            start = max(0, pos - chunk_bytes)
+            f.seek(start)
+            data = f.read(pos - start) + carry
+            pos = start
+            if pos > 0:
+                cut = data.find(b"\n")
+                if cut < 0:
+                    carry = data
+                    continue
+                carry, data = data[:cut], data[cut + 1:]
+            else:
+                carry = b""
+            lines = data.decode("utf-8", errors="replace").splitlines()
+            if lines:
+                yield lines
+
+
+def load_signal_arrays(
+    path: Path,
+    *,
+    venues: list[str],
+    start_offset: int = 0,
+) -> dict[str, Any]:
+    """
+    把切片读成NumPy数组：
+
+        {"sample_id": int64, "t": float64, "venue": int16 (venues中的下标), "imb": float64}
+
+    解析结果直接经 np.fromiter 写入一个结构化数组（不经过中间的行列表），
+    耗时基本等于逐行解析本身。
+    """
+    import numpy as np
+
+    path = Path(path)
+    code = {v: i for i, v in enumerate(venues)}
+    parser = CexSignalParser(read_header(path))
+    rows = parser.iter_rows(_read_lines(path, start_offset), venues=venues)
+    dtype = np.dtype([("sample_id", np.int64), ("t", np.float64), ("venue", np.int16), ("imb", np.float64)])
+    rec = np.fromiter(((s, t, code[v], x) for s, t, v, x in rows), dtype=dtype)
+    return {name: np.ascontiguousarray(rec[name]) for name in dtype.names}
+
+
+def complete_matrix_from_arrays(arrays: dict[str, Any], *, n_venues: int) -> tuple[Any, Any]:
+    """
+    按sample_id分组，保留所有venue都有数据的样本，返回 (t, imb矩阵)：
+    t 按时间排序，矩阵形状 (样本数, n_venues)，列顺序与 load_signal_arrays 的 venues 一致
+
+    同一 (sample_id, venue) 重复出现时以最后一条为准，样本时间取该sample_id最后一行的 t_sample_unix。
+    """
+    import numpy as np
+
+    sid = arrays["sample_id"]
+    if sid.size == 0:
+        return np.empty(0, dtype=np.float64), np.empty((0, int(n_venues)), dtype=np.float64)
+    n_venues = int(n_venues)
+    uniq, inv = np.unique(sid, return_inverse=True)
+    # 逆序后取首次出现 = 原序最后一次出现
+    rev = np.arange(sid.size)[::-1]
+    key = inv[rev].astype(np.int64) * n_venues + arrays["venue"][rev]
+    _, first = np.unique(key, return_index=True)
+    last_rows = rev[first]
+    mat = np.full((uniq.size, n_venues), np.nan)
+    mat[inv[last_rows], arrays["venue"][last_rows]] = arrays["imb"][last_rows]
+    _, first_sid = np.unique(inv[rev], return_index=True)
+    t = arrays["t"][rev[first_sid]]
+    complete = ~np.isnan(mat).any(axis=1)
+    t, mat = t[complete], mat[complete]
+    order = np.argsort(t, kind="stable")
+    return t[order], mat[order]
+
+
+def complete_signals_from_arrays(
+    arrays: dict[str, Any],
+    *,
+    weights: list[float],
+    min_abs_score: float = 0.0,
+) -> tuple[Any, Any]:
+    """
+    与逐行版本语义一致的完整信号：返回 (t, score) 两个按时间排序的数组（见 complete_matrix_from_arrays）
+    """
+    import numpy as np
+
+    t, mat = complete_matrix_from_arrays(arrays, n_venues=len(weights))
+    score = mat @ np.asarray(weights, dtype=np.float64)
+    if min_abs_score > 0:
+        keep = np.abs(score) >= float(min_abs_score)
+        t, score = t[keep], score[keep]
+    return t, score
+
+
+def read_venue_prices(path: Path, *, venue: str, column: str = "mid") -> list[tuple[float, float]]:
+    """
+    某个venue的价格序列 [(t_sample_unix, price), ...]（按文件顺序）
+
+    回放/回测用录制的价格代替实时K线；err 非空或价格为空的行跳过。
+    """
+    header = read_header(path)
+    pos = {name.strip(): i for i, name in enumerate(header)}
+    for name in ("t_sample_unix", "venue", column, "err"):
+        if name not in pos:
+            raise ValueError(f"CEX CSV header missing column: {name}")
+    i_t, i_venue, i_px, i_err = pos["t_sample_unix"], pos["venue"], pos[column], pos["err"]
+    max_idx = max(i_t, i_venue, i_px, i_err)
+    maxsplit = min(max_idx + 1, len(header) - 1)
+    out: list[tuple[float, float]] = []
+    with Path(path).open("r", encoding="utf-8", errors="replace") as f:
+        for ln in f:
+            if ln.startswith(HEADER_PREFIX) or venue not in ln:
+                continue
+            ln = ln.rstrip("\r\n")
+            if '"' in ln:
+                try:
+                    parts = next(csv.reader([ln]))
+                except Exception:
+                    continue
+            else:
+                parts = ln.split(",", maxsplit)
+            if len(parts) <= max_idx or parts[i_venue].strip() != venue or parts[i_err].strip():
+                continue
+            try:
+                out.append((float(parts[i_t]), float(parts[i_px])))
+            except ValueError:
+                continue
+    return out
@@ -0,0 +1,285 @@
+#!/usr/bin/env python3
+"""
+可随机访问的压缩CSV分片（按时间分帧）
+
+每个时间段（默认1分钟）压缩为一个独立可解压的帧（gzip member 或 zstd frame），
+顺序追加写入同一个文件；旁边的 `.idx` 文件（JSONL）记录每帧的字节偏移：
+
+    cex_btc_20260110_00-12.csv.gz
+    cex_btc_20260110_00-12.csv.gz.idx
+
+- 整个文件仍可直接 `gzip -dc` / `zstd -dc` 得到完整CSV（header在第一帧）
+- 读取某个时间段时，只需按索引seek并解压对应的帧
+
+注意：当前帧在内存中缓冲，直到时间段结束才落盘（崩溃最多丢失一帧）。
+重新打开已有文件时以 `.idx` 为准：索引之外的尾部字节（崩溃时写了一半的帧）被截掉，
+是否还需要写header由索引中是否已有header帧决定。
+
+压缩切片只用于归档：score_cex / IncrementalSignalReader / daemon 只读取未压缩的 .csv
+切片，需要实时打分的采集器不要开启压缩。
+"""
+
+from __future__ import annotations
+
+import gzip
+import json
+import os
+import sys
+import time
+import zlib
+from pathlib import Path
+from typing import Any, Iterator, Optional
+
+CODECS = ("gzip", "zstd")
+CODEC_SUFFIX = {"gzip": ".gz", "zstd": ".zst"}
+_CODEC_MAGIC = {"gzip": b"\x1f\x8b", "zstd": b"\x28\xb5\x2f\xfd"}
+
+
+def _zstd_module() -> Any:
+    try:
+        import zstandard  # type: ignore
+    except Exception as e:
+        raise RuntimeError("codec=zstd 需要安装 zstandard (pip install zstandard)") from e
+    return zstandard
+
+
+def index_path_for(path: Path) -> Path:
+    """数据文件对应的帧索引路径"""
+    return Path(str(path) + ".idx")
+
+
+def _compress(codec: str, data: bytes, level: int) -> bytes:
+    if codec == "gzip":
+        # wbits=31: 每次输出一个完整的gzip member
+        c = zlib.compressobj(level, zlib.DEFLATED, 31)
+        return c.compress(data) + c.flush()
+    if codec == "zstd":
+        return _zstd_module().ZstdCompressor(level=level).compress(data)
+    raise ValueError(f"unknown codec: {codec}")
+
+
+def _decompress(codec: str, data: bytes) -> bytes:
+    if codec == "gzip":
+        return gzip.decompress(data)
+    if codec == "zstd":
+        return _zstd_module().ZstdDecompressor().decompress(data)
+    raise ValueError(f"unknown codec: {codec}")
+
+
+class FramedCsvWriter:
+    """
+    文件对象风格的分帧压缩写入器，可直接交给 csv.writer 使用。
+
+    调用方在写入每个tick之前调用 mark(ts)；当 ts 跨入新的时间段时，
+    上一段缓冲的数据被压缩为一帧并追加到文件，同时写入一条索引。
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        *,
+        codec: str = "gzip",
+        frame_seconds: int = 60,
+        level: Optional[int] = None,
+        max_frame_bytes: int = 8_000_000,
+    ) -> None:
+        if codec not in CODECS:
+            raise ValueError(f"codec must be one of {CODECS}")
+        if codec == "zstd":
+            _zstd_module()
+        self.path = Path(path)
+        self.codec = codec
+        self.frame_seconds = max(1, int(frame_seconds))
+        self.level = int(level) if level is not None else (6 if codec == "gzip" else 3)
+        self.max_frame_bytes = int(max_frame_bytes)
+
+        has_header = self._recover()
+        self._f = self.path.open("ab")
+        self._offset = self._f.tell()
+        self._idx = index_path_for(self.path).open("a", encoding="utf-8")
+        if self._idx.tell() == 0:
+            meta = {"codec": self.codec, "frame_seconds": self.frame_seconds}
+            self._idx.write(json.dumps(meta) + "\n")
+            self._idx.flush()
+
+        self._buf: list[str] = []
+        self._buf_bytes = 0
+        self._rows = 0
+        self._frame_id: Optional[int] = None
+        self._header_pending = not has_header
+
+    @property
+    def needs_header(self) -> bool:
+        """文件中还没有header帧：调用方的第一次写入应当是header"""
+        return self._header_pending
+
+    def _recover(self) -> bool:
+        """
+        按索引校验已有文件：只保留从头连续、完整落在文件内的帧，截掉其余字节并重写索引。
+        返回是否已有header帧。数据文件非空但没有索引时无法校验，原文件改名保留后重新开始。
+        """
+        idx_path = index_path_for(self.path)
+        try:
+            size = self.path.stat().st_size
+        except FileNotFoundError:
+            size = 0
+        if not idx_path.exists():
+            if size > 0:
+                aside = self.path.with_name(f"{self.path.name}.noindex-{int(time.time())}")
+                os.replace(self.path, aside)
+                print(f"[WARN] {self.path} 没有帧索引，已改名为 {aside.name}，重新开始写入", file=sys.stderr)
+            return False
+        meta, entries = read_frame_index(self.path)
+        self._check_meta(meta, size)
+        kept: list[dict[str, Any]] = []
+        end = 0
+        for e in entries:
+            try:
+                off, length = int(e["off"]), int(e["len"])
+            except (KeyError, TypeError, ValueError):
+                break
+            if off != end or off + length > size:
+                break
+            kept.append(e)
+            end = off + length
+        if end != size or len(kept) != len(entries) or not meta:
+            if end != size or len(kept) != len(entries):
+                print(
+                    f"[WARN] {self.path} 恢复：保留 {len(kept)}/{len(entries)} 帧，截断 {size - end} 字节",
+                    file=sys.stderr,
+                )
+            with self.path.open("r+b" if size else "wb") as f:
+                f.truncate(end)
+            tmp = idx_path.with_name(idx_path.name + ".tmp")
+            with tmp.open("w", encoding="utf-8") as f:
+                # 保留原有的索引头（已确认与本次参数一致）；索引头丢失时才按本次参数补写
+                f.write(json.dumps(meta or {"codec": self.codec, "frame_seconds": self.frame_seconds}) + "\n")
+                for e in kept:
+                    f.write(json.dumps(e) + "\n")
+            os.replace(tmp, idx_path)
+        return any(e.get("header") for e in kept)
+
+    def _check_meta(self, meta: dict[str, Any], size: int) -> None:
+        """已有文件的 codec / frame_seconds 必须与本次一致（在截断或改写索引之前检查）"""
+        codec = meta.get("codec")
+        if codec is None and size > 0:
+            # 索引头丢失：按第一帧的魔数判断已有数据的 codec
+            with self.path.open("rb") as f:
+                magic = f.read(4)
+            codec = next((c for c, m in _CODEC_MAGIC.items() if magic.startswith(m)), None)
+        if codec is not None and codec != self.codec:
+            raise ValueError(f"{self.path} 已用 codec={codec} 写入，不能以 {self.codec} 追加")
+        frame_seconds = meta.get("frame_seconds")
+        if frame_seconds is not None and int(frame_seconds) != self.frame_seconds:
+            raise ValueError(
+                f"{self.path} 已用 frame_seconds={int(frame_seconds)} 写入，不能以 {self.frame_seconds} 追加"
+            )
+
+    def mark(self, ts: float) -> None:
+        """声明接下来写入的行属于时间 ts；跨时间段时封帧"""
+        frame_id = int(float(ts) // self.frame_seconds)
+        if self._frame_id is not None and frame_id != self._frame_id:
+            self._emit()
+        self._frame_id = frame_id
+
+    def write(self, s: str) -> int:
+        if self._header_pending:
+            # 第一次写入的是header，单独成帧，便于按区间读取时带上列名
+            self._buf.append(s)
+            self._header_pending = False
+            self._emit(header=True)
+            return len(s)
+        self._buf.append(s)
+        self._buf_bytes += len(s)
+        self._rows += s.count("\n")
+        if self._buf_bytes >= self.max_frame_bytes:
+            # 同一时间段内的子帧：保留 frame_id，t0 仍为时间段起点
+            self._emit()
+        return len(s)
+
+    def flush(self) -> None:
+        # 帧在时间段结束时才落盘；这里不强制封帧，避免产生大量小帧
+        return None
+
+    def _emit(self, *, header: bool = False) -> None:
+        if not self._buf:
+            return
+        raw = "".join(self._buf).encode("utf-8")
+        blob = _compress(self.codec, raw, self.level)
+        self._f.write(blob)
+        self._f.flush()
+        entry: dict[str, Any] = {
+            "t0": None if header else (self._frame_id * self.frame_seconds if self._frame_id is not None else None),
+            "off": self._offset,
+            "len": len(blob),
+            "rows": 0 if header else self._rows,
+        }
+        if header:
+            entry["header"] = True
+        self._idx.write(json.dumps(entry) + "\n")
+        self._idx.flush()
+        self._offset += len(blob)
+        self._buf = []
+        self._buf_bytes = 0
+        self._rows = 0
+
+    def close(self) -> None:
+        try:
+            self._emit()
+        finally:
+            self._f.close()
+            self._idx.close()
+
+
+def read_frame_index(path: Path) -> tuple[dict[str, Any], list[dict[str, Any]]]:
+    """读取帧索引，返回 (meta, entries)；末尾不完整的行会被忽略"""
+    meta: dict[str, Any] = {}
+    entries: list[dict[str, Any]] = []
+    with index_path_for(Path(path)).open("r", encoding="utf-8") as f:
+        for i, line in enumerate(f):
+            try:
+                obj = json.loads(line)
+            except Exception:
+                continue
+            if i == 0 and "codec" in obj:
+                meta = obj
+                continue
+            entries.append(obj)
+    return meta, entries
+
+
+def iter_frame_lines(
+    path: Path,
+    *,
+    start_ts: Optional[float] = None,
+    end_ts: Optional[float] = None,
+    include_header: bool = True,
+) -> Iterator[str]:
+    """
+    只解压覆盖 [start_ts, end_ts] 的帧，逐行返回CSV文本（不含换行符）。
+
+    帧按时间段对齐，所以返回的行可能略超出请求区间，调用方按 t_sample_unix 再过滤。
+    """
+    p = Path(path)
+    meta, entries = read_frame_index(p)
+    codec = str(meta.get("codec") or "gzip")
+    frame_s = float(meta.get("frame_seconds") or 60)
+    with p.open("rb") as f:
+        for e in entries:
+            t0 = e.get("t0")
+            if e.get("header"):
+                if not include_header:
+                    continue
+            else:
+                if t0 is None:
+                    continue
+                if start_ts is not None and float(t0) + frame_s <= float(start_ts):
+                    continue
+                if end_ts is not None and float(t0) > float(end_ts):
+                    continue
+            f.seek(int(e["off"]))
+            blob = f.read(int(e["len"]))
+            text = _decompress(codec, blob).decode("utf-8", errors="replace")
+            for ln in text.splitlines():
+                if ln:
+                    yield ln
@@ -0,0 +1,288 @@
+"""
+打分热路径的分阶段耗时统计（进程内直方图）
+
+每个阶段（如 score_cex.load_signal / score_cex.normalize / daemon.process）一个
+LatencyHistogram：对数分桶（每个2倍区间 16 个桶，相对误差约 ±2%，覆盖 1µs ~ 1000s），
+记录一次只是一次 log2 和一次计数器自增，不做任何 I/O。
+
+    METRICS.observe("score_cex.total", dt)
+    METRICS.snapshot()          -> {stage: {count, mean, p50, p90, p99, p999, max}}
+    start_metrics_server(9101)  -> GET /metrics（Prometheus 文本格式）, /metrics.json
+
+日志改为抽样（SampledTimingLog）：每 every_s 秒输出一行最近一段时间的分位数，
+单次耗时超过 slow_s 的调用单独输出一行；其余调用不写 stdout。
+
+环境变量（score_cex 读取）：
+    CEX_METRICS_PORT    >0 时在首次打分时启动 metrics 端口（CEX_METRICS_HOST，默认 127.0.0.1）
+    CEX_METRICS_LOG_S   汇总日志间隔（秒），默认 60，0 = 关闭
+    CEX_METRICS_SLOW_S  慢调用阈值（秒），默认 1.0，0 = 关闭
+"""
+
+from __future__ import annotations
+
+import json
+import math
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Optional
+
+SUB_BUCKETS = 16  # 每个2倍区间的桶数
+MIN_SECONDS = 1e-6
+N_BUCKETS = SUB_BUCKETS * 30 + 2  # 1µs * 2^30 ≈ 1074s；首尾各一个溢出桶
+
+QUANTILES = (0.5, 0.9, 0.99, 0.999)
+
+
+def _bucket_index(seconds: float) -> int:
+    if seconds < MIN_SECONDS:
+        return 0
+    i = int(math.log2(seconds / MIN_SECONDS) * SUB_BUCKETS) + 1
+    return i if i < N_BUCKETS else N_BUCKETS - 1
+
+
+def _bucket_value(i: int) -> float:
+    """桶的代表值（桶上下界的几何中点）"""
+    if i <= 0:
+        return MIN_SECONDS
+    return MIN_SECONDS * 2.0 ** ((i - 0.5) / SUB_BUCKETS)
+
+
+class LatencyHistogram:
+    """固定对数分桶的耗时直方图；percentile 的相对误差约为半个桶宽"""
+
+    __slots__ = ("counts", "count", "total", "min", "max")
+
+    def __init__(self) -> None:
+        self.counts = [0] * N_BUCKETS
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = 0.0
+
+    def record(self, seconds: float) -> None:
+        self.counts[_bucket_index(seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+        if seconds < self.min:
+            self.min = seconds
+
+    def copy(self) -> 'LatencyHistogram':
+        h = LatencyHistogram()
+        h.counts = list(self.counts)
+        h.count, h.total, h.min, h.max = self.count, self.total, self.min, self.max
+        return h
+
+    def since(self, earlier: 'LatencyHistogram') -> 'LatencyHistogram':
+        """两次快照之间新增的部分（min/max 取自非空桶，为近似值）"""
+        h = LatencyHistogram()
+        h.counts = [a - b for a, b in zip(self.counts, earlier.counts)]
+        h.count = self.count - earlier.count
+        h.total = self.total - earlier.total
+        nonzero = [i for i, c in enumerate(h.counts) if c]
+        if nonzero:
+            h.min = max(self.min, _bucket_value(nonzero[0]))
+            h.max = min(self.max, _bucket_value(nonzero[-1]))
+        return h
+
+    def percentile(self, q: float) -> float:
+        if self.count <= 0:
+            return math.nan
+        rank = max(1, math.ceil(float(q) * self.count))
+        seen = 0
+        for i, c in enumerate(self.counts):
+            seen += c
+            if seen >= rank:
+                return min(max(_bucket_value(i), self.min), self.max)
+        return self.max
+
+    def summary(self, quantiles: tuple[float, ...] = QUANTILES) -> dict[str, float]:
+        out: dict[str, float] = {
+            "count": self.count,
+            "mean": self.total / self.count if self.count else math.nan,
+            "max": self.max if self.count else math.nan,
+        }
+        for q in quantiles:
+            out[_quantile_label(q)] = self.percentile(q)
+        return out
+
+
+def _quantile_label(q: float) -> str:
+    """0.5 -> p50, 0.99 -> p99, 0.999 -> p999"""
+    digits = f"{float(q):.6f}".split(".")[1].rstrip("0")
+    return "p" + (digits if len(digits) > 1 else digits + "0")
+
+
+class StageMetrics:
+    """阶段名 -> LatencyHistogram；observe 可在任意线程调用"""
+
+    def __init__(self) -> None:
+        self._hist: dict[str, LatencyHistogram] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, stage: str, seconds: float) -> None:
+        with self._lock:
+            h = self._hist.get(stage)
+            if h is None:
+                h = self._hist[stage] = LatencyHistogram()
+            h.record(float(seconds))
+
+    def histogram(self, stage: str) -> Optional[LatencyHistogram]:
+        """该阶段直方图的拷贝；没有记录时返回None"""
+        with self._lock:
+            h = self._hist.get(stage)
+            return h.copy() if h is not None else None
+
+    def snapshot(self) -> dict[str, dict[str, float]]:
+        with self._lock:
+            hists = {k: h.copy() for k, h in self._hist.items()}
+        return {k: h.summary() for k, h in sorted(hists.items())}
+
+    def reset(self) -> None:
+        with self._lock:
+            self._hist.clear()
+
+    def render_prometheus(self) -> str:
+        """Prometheus summary：cex_stage_seconds{stage=...,quantile=...}"""
+        lines = [
+            "# HELP cex_stage_seconds CEX scoring stage latency",
+            "# TYPE cex_stage_seconds summary",
+        ]
+        for stage, s in self.snapshot().items():
+            for q in QUANTILES:
+                v = s[_quantile_label(q)]
+                lines.append(f'cex_stage_seconds{{stage="{stage}",quantile="{q}"}} {v:.9g}')
+            mean = s["mean"] if s["count"] else 0.0
+            lines.append(f'cex_stage_seconds_sum{{stage="{stage}"}} {mean * s["count"]:.9g}')
+            lines.append(f'cex_stage_seconds_count{{stage="{stage}"}} {int(s["count"])}')
+        return "\n".join(lines) + "\n"
+
+
+METRICS = StageMetrics()
+
+
+def _fmt_ms(seconds: float) -> str:
+    return "nan" if math.isnan(seconds) else f"{seconds * 1000.0:.2f}ms"
+
+
+class SampledTimingLog:
+    """
+    抽样的耗时日志：每 every_s 秒输出一行（最近这段时间各阶段的 p50/p99/max），
+    单次 total 超过 slow_s 时额外输出一行明细；两者为0时分别关闭
+    """
+
+    def __init__(
+        self,
+        prefix: str,
+        *,
+        stages: list[str],
+        metrics: StageMetrics = METRICS,
+        every_s: float = 60.0,
+        slow_s: float = 1.0,
+    ) -> None:
+        self.prefix = prefix
+        self.stages = list(stages)
+        self.metrics = metrics
+        self.every_s = float(every_s)
+        self.slow_s = float(slow_s)
+        self._last_log = time.monotonic()
+        self._last: dict[str, LatencyHistogram] = {}
+
+    def tick(self, total_s: float, detail: Optional[Callable[[], str]] = None) -> None:
+        if self.slow_s > 0 and total_s >= self.slow_s:
+            extra = f" {detail()}" if detail is not None else ""
+            print(f"{self.prefix} slow total={_fmt_ms(total_s)}{extra}", flush=True)
+        if self.every_s <= 0:
+            return
+        now = time.monotonic()
+        if now - self._last_log < self.every_s:
+            return
+        self._last_log = now
+        print(f"{self.prefix} {self.summary_line()}", flush=True)
+
+    def summary_line(self) -> str:
+        """自上次输出以来各阶段的 n/p50/p99/max，并记下当前快照"""
+        parts: list[str] = []
+        for stage in self.stages:
+            h = self.metrics.histogram(stage)
+            if h is None:
+                continue
+            prev = self._last.get(stage)
+            window = h.since(prev) if prev is not None else h
+            self._last[stage] = h
+            if window.count <= 0:
+                continue
+            name = stage.rsplit(".", 1)[-1]
+            parts.append(
+                f"{name}[n={window.count} p50={_fmt_ms(window.percentile(0.5))} "
+                f"p99={_fmt_ms(window.percentile(0.99))} max={_fmt_ms(window.max)}]"
+            )
+        return " ".join(parts) if parts else "idle"
+
+
+def env_float(name: str, default: float) -> float:
+    try:
+        return float(os.environ.get(name, default))
+    except ValueError:
+        return float(default)
+
+
+def _metrics_handler(metrics: StageMetrics):
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self) -> None:
+            path = self.path.split("?", 1)[0]
+            if path == "/metrics":
+                body = metrics.render_prometheus().encode("utf-8")
+                ctype = "text/plain; version=0.0.4"
+            elif path == "/metrics.json":
+                snap = {
+                    stage: {k: (None if isinstance(v, float) and math.isnan(v) else v) for k, v in s.items()}
+                    for stage, s in metrics.snapshot().items()
+                }
+                body = json.dumps(snap).encode("utf-8")
+                ctype = "application/json"
+            else:
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", ctype)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format: str, *args: Any) -> None:
+            return
+
+    return Handler
+
+
+_SERVERS: dict[int, ThreadingHTTPServer] = {}
+
+
+def start_metrics_server(port: int, *, host: str = "127.0.0.1", metrics: StageMetrics = METRICS) -> Optional[ThreadingHTTPServer]:
+    """在后台线程提供 /metrics 与 /metrics.json；同一端口只启动一次，失败时返回None"""
+    port = int(port)
+    if port in _SERVERS:
+        return _SERVERS[port]
+    try:
+        server = ThreadingHTTPServer((host, port), _metrics_handler(metrics))
+    except OSError as e:
+        print(f"[WARN] metrics server: 无法监听 {host}:{port} {type(e).__name__}: {e}", file=sys.stderr, flush=True)
+        return None
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name=f"metrics-{port}", daemon=True).start()
+    _SERVERS[port] = server
+    print(f"[INFO] metrics on http://{host}:{port}/metrics", file=sys.stderr, flush=True)
+    return server
+
+
+def start_metrics_server_from_env() -> Optional[ThreadingHTTPServer]:
+    """CEX_METRICS_PORT>0 时启动（可重复调用）"""
+    port = int(env_float("CEX_METRICS_PORT", 0))
+    if port <= 0:
+        return None
+    return start_metrics_server(port, host=os.environ.get("CEX_METRICS_HOST", "127.0.0.1"))
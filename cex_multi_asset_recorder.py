@@ -26,6 +26,8 @@ from threading import Lock
 
 import requests
 
+from cex_framed_csv import CODEC_SUFFIX, FramedCsvWriter
+
 
 def utc_ts() -> str:
     """返回UTC时间戳字符串"""
@@ -267,28 +269,42 @@ def get_12h_session() -> str:
     return "00-12" if hour < 12 else "12-24"
 
 
-def get_output_file(asset: str, output_dir: Path) -> tuple[Path, str]:
+def get_output_file(asset: str, output_dir: Path, compress: str = "") -> tuple[Path, str]:
     """
     获取当前应该写入的文件路径
     返回: (文件路径, 时段标识)
+    compress: ""=普通CSV, "gzip"/"zstd"=分帧压缩（.csv.gz / .csv.zst）
     """
     now = datetime.now(timezone.utc)
     date_str = now.strftime("%Y%m%d")
     session = get_12h_session()
     filename = f"cex_{asset}_{date_str}_{session}.csv"
+    if compress:
+        filename += CODEC_SUFFIX[compress]
     return output_dir / filename, session
 
 
 class AssetRecorder:
     """单个资产的采集器"""
     
-    def __init__(self, asset: str, output_dir: Path, band_bps: float, limit: int, timeout_s: float):
+    def __init__(
+        self,
+        asset: str,
+        output_dir: Path,
+        band_bps: float,
+        limit: int,
+        timeout_s: float,
+        compress: str = "",
+        frame_seconds: int = 60,
+    ):
         self.asset = asset
         self.output_dir = output_dir
         self.band_bps = band_bps
         self.limit = limit
         self.timeout_s = timeout_s
         self.config = ASSETS[asset]
+        self.compress = compress
+        self.frame_seconds = frame_seconds
         
         self.current_file = None
         self.current_writer = None
@@ -300,7 +316,7 @@ class AssetRecorder:
     
     def _check_rotate_file(self):
         """检查是否需要切换文件"""
-        file_path, session = get_output_file(self.asset, self.output_dir)
+        file_path, session = get_output_file(self.asset, self.output_dir, self.compress)
         
         if self.current_session != session:
             # 需要切换文件
@@ -308,9 +324,15 @@ class AssetRecorder:
                 self.current_file.close()
                 print(f"[{self.asset}] Rotated to new file: {file_path}", file=sys.stderr)
             
-            # 打开新文件
-            is_new = not file_path.exists()
-            self.current_file = open(file_path, "a", newline="", encoding="utf-8")
+            # 打开新文件（已存在但为空的文件同样需要header；压缩文件以帧索引为准）
+            if self.compress:
+                self.current_file = FramedCsvWriter(
+                    file_path, codec=self.compress, frame_seconds=self.frame_seconds
+                )
+                is_new = self.current_file.needs_header
+            else:
+                is_new = not file_path.exists() or file_path.stat().st_size == 0
+                self.current_file = open(file_path, "a", newline="", encoding="utf-8")
             self.current_writer = csv.writer(self.current_file)
             self.current_session = session
             
@@ -386,6 +408,8 @@ class AssetRecorder:
         t0 = time.time()
         ts = utc_ts()
         self.sample_id += 1
+        if enable_write and self.compress:
+            self.current_file.mark(t0)
         
         ok = 0
         total = 0
@@ -530,6 +554,14 @@ def main():
     ap.add_argument("--timeout-s", type=float, default=1.0)
     ap.add_argument("--test-seconds", type=float, default=0.0)
     ap.add_argument("--log-dir", type=str, default=str(Path(__file__).parent / "log"))
+    ap.add_argument(
+        "--compress",
+        type=str,
+        default="none",
+        choices=["none", "gzip", "zstd"],
+        help="分帧压缩输出（每帧可独立解压，附带 .idx 帧索引）；仅用于归档，scorer/daemon 只读取未压缩的 .csv",
+    )
+    ap.add_argument("--frame-seconds", type=int, default=60, help="压缩模式下每帧覆盖的秒数")
     args = ap.parse_args()
 
     output_dir = Path(args.output_dir)
@@ -539,6 +571,8 @@ def main():
     timeout_s = float(args.timeout_s)
     test_seconds = float(args.test_seconds)
     log_dir = Path(args.log_dir)
+    compress = "" if args.compress == "none" else str(args.compress)
+    frame_seconds = max(1, int(args.frame_seconds))
 
     print(f"[INFO] CEX多资产采集器启动", file=sys.stderr)
     print(f"[INFO] 输出目录: {output_dir}", file=sys.stderr)
@@ -546,10 +580,16 @@ def main():
     print(f"[INFO] 采集频率: {hz} Hz", file=sys.stderr)
     print(f"[INFO] 文件切分: 每12小时", file=sys.stderr)
     print(f"[INFO] timeout_s: {timeout_s}", file=sys.stderr)
+    if compress:
+        print(f"[INFO] 分帧压缩: {compress} frame_seconds={frame_seconds}", file=sys.stderr)
+        print("[WARN] 压缩切片仅用于归档：score_cex / daemon 只读取未压缩的 .csv 切片", file=sys.stderr)
 
     # 创建每个资产的采集器
     recorders = {
-        asset: AssetRecorder(asset, output_dir, band_bps, limit, timeout_s)
+        asset: AssetRecorder(
+            asset, output_dir, band_bps, limit, timeout_s,
+            compress=compress, frame_seconds=frame_seconds,
+        )
         for asset in ASSETS.keys()
     }
 
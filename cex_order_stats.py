@@ -0,0 +1,140 @@
+"""
+滚动窗口的顺序统计（中位数 / MAD）
+
+SortedBuckets 是一个可按下标访问的有序多重集合：数据分成若干个有序小桶
+（每桶约 LOAD 个元素），桶的最大值单独保存用于二分定位。
+
+    add / remove      二分找桶 + 桶内 insort/del，O(log n + LOAD)
+    median()          按下标取，O(log n)（桶长度前缀和在结构变化后按需重建）
+    median_abs_deviation(center)
+                      |x - center| 的中位数：center 左右两侧的偏差各自有序，
+                      转化为“两个有序序列的第k小”，二分求解 O(log^2 n)
+
+窗口样本数在几千到十万量级，不需要更复杂的平衡树。
+"""
+
+from __future__ import annotations
+
+from bisect import bisect_left, bisect_right, insort
+from typing import Iterable, Optional
+
+LOAD = 512
+
+
+class SortedBuckets:
+    def __init__(self, values: Iterable[float] = ()) -> None:
+        vals = sorted(float(v) for v in values)
+        self._buckets: list[list[float]] = [vals[i:i + LOAD] for i in range(0, len(vals), LOAD)]
+        self._maxes: list[float] = [b[-1] for b in self._buckets]
+        self._len = len(vals)
+        self._prefix: Optional[list[int]] = None
+
+    def __len__(self) -> int:
+        return self._len
+
+    def add(self, value: float) -> None:
+        x = float(value)
+        self._len += 1
+        self._prefix = None
+        if not self._buckets:
+            self._buckets.append([x])
+            self._maxes.append(x)
+            return
+        i = bisect_left(self._maxes, x)
+        if i == len(self._maxes):
+            i -= 1
+        b = self._buckets[i]
+        insort(b, x)
+        self._maxes[i] = b[-1]
+        if len(b) > 2 * LOAD:
+            self._buckets[i:i + 1] = [b[:LOAD], b[LOAD:]]
+            self._maxes[i:i + 1] = [b[LOAD - 1], b[-1]]
+
+    def remove(self, value: float) -> None:
+        x = float(value)
+        i = bisect_left(self._maxes, x)
+        if i == len(self._maxes):
+            raise ValueError(f"{x!r} not in SortedBuckets")
+        b = self._buckets[i]
+        j = bisect_left(b, x)
+        if j == len(b) or b[j] != x:
+            raise ValueError(f"{x!r} not in SortedBuckets")
+        del b[j]
+        self._len -= 1
+        self._prefix = None
+        if b:
+            self._maxes[i] = b[-1]
+        else:
+            del self._buckets[i]
+            del self._maxes[i]
+
+    def _positions(self) -> list[int]:
+        """各桶第一个元素的全局下标（末尾附总长度）"""
+        if self._prefix is None:
+            prefix = [0]
+            for b in self._buckets:
+                prefix.append(prefix[-1] + len(b))
+            self._prefix = prefix
+        return self._prefix
+
+    def __getitem__(self, k: int) -> float:
+        if k < 0:
+            k += self._len
+        if not 0 <= k < self._len:
+            raise IndexError("SortedBuckets index out of range")
+        prefix = self._positions()
+        i = bisect_right(prefix, k) - 1
+        return self._buckets[i][k - prefix[i]]
+
+    def bisect_left(self, value: float) -> int:
+        """小于 value 的元素个数"""
+        x = float(value)
+        i = bisect_left(self._maxes, x)
+        if i == len(self._maxes):
+            return self._len
+        return self._positions()[i] + bisect_left(self._buckets[i], x)
+
+    def median(self) -> float:
+        n = self._len
+        if n == 0:
+            raise ValueError("median of empty SortedBuckets")
+        mid = n // 2
+        if n % 2:
+            return self[mid]
+        return (self[mid - 1] + self[mid]) / 2.0
+
+    def median_abs_deviation(self, center: Optional[float] = None) -> float:
+        """median(|x - center|)，center 默认为中位数；偶数个时取中间两个的平均（与 statistics.median 一致）"""
+        n = self._len
+        if n == 0:
+            raise ValueError("MAD of empty SortedBuckets")
+        c = self.median() if center is None else float(center)
+        p = self.bisect_left(c)
+        n_left, n_right = p, n - p
+
+        # 左侧偏差 c - x 随与 p 的距离递增；右侧偏差 x - c 同样递增
+        def left(j: int) -> float:
+            return c - self[p - 1 - j]
+
+        def right(j: int) -> float:
+            return self[p + j] - c
+
+        def kth(k: int) -> float:
+            # 合并两个有序序列后的第k小（0起）：二分左侧取多少个
+            lo, hi = max(0, k + 1 - n_right), min(k + 1, n_left)
+            while lo < hi:
+                i = (lo + hi) // 2
+                if left(i) < right(k - i):
+                    lo = i + 1
+                else:
+                    hi = i
+            i, j = lo, k + 1 - lo
+            best = left(i - 1) if i > 0 else float("-inf")
+            if j > 0:
+                best = max(best, right(j - 1))
+            return best
+
+        mid = n // 2
+        if n % 2:
+            return kth(mid)
+        return (kth(mid - 1) + kth(mid)) / 2.0
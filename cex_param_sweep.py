@@ -0,0 +1,443 @@
+#!/usr/bin/env python3
+"""
+venue 权重与衰减参数的批量扫描（网格 / 随机搜索）
+
+历史数据只加载一次：已关闭切片的逐 venue imb 矩阵（只保留所有 venue 齐全的样本）、
+录制价格推出的衰减输入（窗口偏移、cum_change、已过时间）和每个样本所在窗口的结果，
+全部放进一块共享内存；工作进程只挂载这块内存，不再解析CSV。
+
+每组配置的打分与 score_cex_batch 完全一致（同一套 _rolling_zscore / _decay_inputs /
+_decay_from_inputs），只是拆成了与参数无关、只算一次的部分和随参数变化的部分：
+
+    z      只取决于权重（与权重的正比例缩放无关），同一进程内按归一化后的权重缓存
+    decay  只取决于衰减参数，逐窗口推进 SignalOptimizer，逐样本部分向量化
+
+窗口结果：窗口结束价 >= 开始价记为 +1（Up），否则 -1（Down），价格取 --price-venue
+录制的 mid（代替 Chainlink 结算价）；数据未覆盖到窗口结束的样本不参与评估。
+
+指标（只统计 [start, end] 内、z_eff 有值且窗口结果已知的样本）：
+
+    logloss   mean(log(1 + exp(-y * z_eff)))，即把 sigmoid(z_eff) 当作 Up 概率的对数损失（越小越好）
+    hit_rate  sign(z_eff) 与 y 一致的比例（z_eff=0 的样本不计）
+    edge      mean(y * z_eff)
+
+    python cex_param_sweep.py --hot-dir real_hot --start 1791590400 --end 1792195200 \\
+        --weight-values 0,1,2,3 --decay-lambda-base 0.1,0.22,0.4 --decay-sigma 6,11 --top 20
+
+    python cex_param_sweep.py --hot-dir real_hot --start ... --end ... --random 5000 --output sweep.jsonl
+"""
+
+from __future__ import annotations
+
+import argparse
+import itertools
+import json
+import math
+import os
+import random
+import sys
+import time
+from pathlib import Path
+from typing import Any, Iterable, Optional
+
+from cex_csv_fast import complete_matrix_from_arrays, load_signal_arrays
+from cex_scorer import (
+    SignalOptimizer,
+    _decay_from_inputs,
+    _decay_inputs,
+    _rolling_zscore,
+    _slice_prices,
+    _slices_in_range,
+)
+
+DEFAULT_VENUES = ["binance_spot", "okx_spot", "okx_swap", "bybit_spot", "bybit_linear"]
+
+# 配置中的衰减参数名与 score_cex / score_cex_batch 的关键字参数一致，排名结果可以直接传回
+DECAY_DEFAULTS: dict[str, float] = {
+    "decay_lambda_base": 0.22,
+    "decay_sigma": 11.0,
+    "decay_multiplier": 0.6,
+    "decay_min_mu": 8.0,
+    "decay_max_mu": 60.0,
+    "decay_N_windows": 20,
+}
+
+RANK_METRICS = {"logloss": False, "hit_rate": True, "edge": True}  # 指标 -> 是否越大越好
+
+
+def load_sweep_data(
+    slices: list[Path],
+    *,
+    venues: list[str],
+    start_ts: Optional[float] = None,
+    end_ts: Optional[float] = None,
+    lookback_seconds: int = 7200,
+    min_samples: int = 100,
+    window: str = "15m",
+    price_venue: str = "binance_spot",
+) -> dict[str, Any]:
+    """
+    把切片读成扫描用的数组（全部为 NumPy 数组，可直接放入共享内存）：
+
+        t, imb         完整样本的时间和逐 venue imb 矩阵 (n, len(venues))
+        left           滚动窗口起始下标（lookback 固定，与权重无关）
+        idx/win/cum/elapsed/has_ok/last_cum
+                       衰减输入（见 cex_scorer._decay_inputs）
+        eval_pos       参与评估的样本在 idx 中的位置
+        outcome        对应样本所在窗口的结果（+1 / -1）
+    """
+    import numpy as np
+
+    t_parts: list[Any] = []
+    imb_parts: list[Any] = []
+    for path in slices:
+        arrays = load_signal_arrays(path, venues=venues)
+        t_i, imb_i = complete_matrix_from_arrays(arrays, n_venues=len(venues))
+        t_parts.append(t_i)
+        imb_parts.append(imb_i)
+    t = np.concatenate(t_parts) if t_parts else np.empty(0, dtype=np.float64)
+    imb = np.concatenate(imb_parts) if imb_parts else np.empty((0, len(venues)), dtype=np.float64)
+    t = np.where(t > 1e11, t / 1000.0, t)
+    order = np.argsort(t, kind="stable")
+    t, imb = t[order], np.ascontiguousarray(imb[order])
+
+    left = np.searchsorted(t, t - float(lookback_seconds), side="left")
+    normalized = (np.arange(t.size) + 1 - left) >= int(min_samples)
+
+    pts = [pt for path in slices for pt in _slice_prices(path, venue=price_venue)]
+    pts.sort(key=lambda x: x[0])
+    p_t = np.array([x[0] for x in pts], dtype=np.float64)
+    p_v = np.array([x[1] for x in pts], dtype=np.float64)
+    inputs = _decay_inputs(t, normalized, p_t, p_v, window=window)
+
+    # 窗口结果：开始价取窗口内第一个价格，结束价取窗口结束前最后一个价格
+    size = 3600.0 if window == "1h" else 900.0
+    ts = t[inputs["idx"]]
+    ws = np.floor(ts / size) * size
+    open_i = np.searchsorted(p_t, ws, side="left")
+    end_i = np.searchsorted(p_t, ws + size, side="left")
+    known = (end_i < p_t.size) & (end_i - 1 >= open_i)
+    if start_ts is not None:
+        known &= ts >= float(start_ts)
+    if end_ts is not None:
+        known &= ts <= float(end_ts)
+    eval_pos = np.flatnonzero(known)
+    close_px = p_v[end_i[eval_pos] - 1]
+    open_px = p_v[open_i[eval_pos]]
+    outcome = np.where(close_px >= open_px, 1.0, -1.0)
+
+    data = {"t": t, "imb": imb, "left": left, "eval_pos": eval_pos, "outcome": outcome}
+    data.update(inputs)
+    data["min_samples"] = np.array([int(min_samples)], dtype=np.int64)
+    return data
+
+
+def _weights_key(weights: Iterable[float]) -> Optional[tuple[float, ...]]:
+    """z 与权重的正比例缩放无关：按 sum(|w|) 归一化后作为缓存键；全零返回None"""
+    w = [float(x) for x in weights]
+    total = sum(abs(x) for x in w)
+    if total <= 0:
+        return None
+    return tuple(round(x / total, 12) for x in w)
+
+
+def evaluate_config(data: dict[str, Any], config: dict[str, Any], *, z: Any = None) -> dict[str, Any]:
+    """单组配置的指标；z 为该权重下已算好的滚动 z-score（可选）"""
+    import numpy as np
+
+    if z is None:
+        raw = data["imb"] @ np.asarray(config["weights"], dtype=np.float64)
+        z, _ = _rolling_zscore(data["t"], raw, left=data["left"], min_samples=int(data["min_samples"][0]))
+    optimizer = SignalOptimizer(
+        lambda_base=float(config["decay_lambda_base"]),
+        sigma=float(config["decay_sigma"]),
+        multiplier=float(config["decay_multiplier"]),
+        min_mu=float(config["decay_min_mu"]),
+        max_mu=float(config["decay_max_mu"]),
+        N_windows=int(config["decay_N_windows"]),
+    )
+    decay = _decay_from_inputs(data, optimizer)
+    pos = data["eval_pos"]
+    y = data["outcome"]
+    z_eff = z[data["idx"][pos]] * decay[pos]
+    n = int(z_eff.size)
+    if not n:
+        return {"n": 0, "logloss": math.nan, "hit_rate": math.nan, "edge": math.nan}
+    signed = y * z_eff
+    decided = z_eff != 0.0
+    n_decided = int(decided.sum())
+    return {
+        "n": n,
+        "logloss": float(np.logaddexp(0.0, -signed).mean()),
+        "hit_rate": float((signed[decided] > 0).sum() / n_decided) if n_decided else math.nan,
+        "edge": float(signed.mean()),
+    }
+
+
+def _evaluate_many(data: dict[str, Any], configs: list[tuple[int, dict[str, Any]]]) -> list[tuple[int, dict[str, Any]]]:
+    """同一进程内按归一化权重缓存最近一次的 z（调用方已按权重分组）"""
+    import numpy as np
+
+    out: list[tuple[int, dict[str, Any]]] = []
+    cached_key: Optional[tuple[float, ...]] = None
+    cached_z: Any = None
+    for i, config in configs:
+        key = _weights_key(config["weights"])
+        if key is None:
+            continue
+        if key != cached_key:
+            raw = data["imb"] @ np.asarray(key, dtype=np.float64)
+            cached_z, _ = _rolling_zscore(data["t"], raw, left=data["left"], min_samples=int(data["min_samples"][0]))
+            cached_key = key
+        out.append((i, evaluate_config(data, config, z=cached_z)))
+    return out
+
+
+# ---------------- 共享内存 ----------------
+
+_WORKER_DATA: dict[str, Any] = {}
+_WORKER_SHM: Any = None
+
+
+def _to_shared(data: dict[str, Any]) -> tuple[Any, dict[str, tuple[int, str, tuple[int, ...]]]]:
+    """把所有数组依次拷贝进一块共享内存；返回 (SharedMemory, {名字: (偏移, dtype, shape)})"""
+    import numpy as np
+    from multiprocessing import shared_memory
+
+    layout: dict[str, tuple[int, str, tuple[int, ...]]] = {}
+    offset = 0
+    for name, arr in data.items():
+        arr = np.ascontiguousarray(arr)
+        layout[name] = (offset, arr.dtype.str, tuple(arr.shape))
+        offset += (arr.nbytes + 63) // 64 * 64
+    shm = shared_memory.SharedMemory(create=True, size=max(offset, 1))
+    for name, arr in data.items():
+        off, dtype, shape = layout[name]
+        np.ndarray(shape, dtype=dtype, buffer=shm.buf, offset=off)[...] = arr
+    return shm, layout
+
+
+def _attach_shared(shm: Any, layout: dict[str, tuple[int, str, tuple[int, ...]]]) -> dict[str, Any]:
+    import numpy as np
+
+    out: dict[str, Any] = {}
+    for name, (off, dtype, shape) in layout.items():
+        arr = np.ndarray(shape, dtype=dtype, buffer=shm.buf, offset=off)
+        arr.flags.writeable = False
+        out[name] = arr
+    return out
+
+
+def _init_worker(shm_name: str, layout: dict[str, tuple[int, str, tuple[int, ...]]]) -> None:
+    global _WORKER_SHM
+    from multiprocessing import shared_memory
+
+    # 工作进程与父进程共用同一个 resource_tracker，只挂载不 unlink（由父进程负责）
+    _WORKER_SHM = shared_memory.SharedMemory(name=shm_name)
+    _WORKER_DATA.clear()
+    _WORKER_DATA.update(_attach_shared(_WORKER_SHM, layout))
+
+
+def _sweep_worker(configs: list[tuple[int, dict[str, Any]]]) -> list[tuple[int, dict[str, Any]]]:
+    return _evaluate_many(_WORKER_DATA, configs)
+
+
+# ---------------- 配置生成 ----------------
+
+def _decay_config(values: dict[str, float]) -> dict[str, Any]:
+    cfg: dict[str, Any] = {k: float(v) for k, v in values.items()}
+    cfg["decay_N_windows"] = int(round(cfg["decay_N_windows"]))
+    return cfg
+
+
+def grid_configs(weight_grid: list[list[float]], decay_grid: dict[str, list[float]]) -> list[dict[str, Any]]:
+    """权重与衰减参数的笛卡尔积（全零权重跳过）；decay_grid 缺少的参数取 DECAY_DEFAULTS"""
+    names = list(DECAY_DEFAULTS)
+    decay_lists = [list(decay_grid.get(k) or [DECAY_DEFAULTS[k]]) for k in names]
+    decays = [_decay_config(dict(zip(names, combo))) for combo in itertools.product(*decay_lists)]
+    out: list[dict[str, Any]] = []
+    for weights in itertools.product(*weight_grid):
+        if _weights_key(weights) is None:
+            continue
+        for decay in decays:
+            out.append({"weights": [float(w) for w in weights], **decay})
+    return out
+
+
+def random_configs(
+    weight_grid: list[list[float]],
+    decay_grid: dict[str, list[float]],
+    n: int,
+    *,
+    seed: int = 0,
+) -> list[dict[str, Any]]:
+    """在每个参数 [min, max] 范围内均匀采样 n 组配置（按权重排序，便于工作进程复用 z）"""
+    rng = random.Random(seed)
+    out: list[dict[str, Any]] = []
+    while len(out) < int(n):
+        weights = [rng.uniform(min(vals), max(vals)) for vals in weight_grid]
+        if _weights_key(weights) is None:
+            if all(min(vals) == max(vals) == 0 for vals in weight_grid):
+                break
+            continue
+        decay = {}
+        for k, default in DECAY_DEFAULTS.items():
+            vals = list(decay_grid.get(k) or [default])
+            decay[k] = rng.uniform(min(vals), max(vals))
+        out.append({"weights": weights, **_decay_config(decay)})
+    return out
+
+
+# ---------------- 执行 ----------------
+
+def run_sweep(
+    data: dict[str, Any],
+    configs: list[dict[str, Any]],
+    *,
+    workers: Optional[int] = None,
+    rank_by: str = "logloss",
+    progress: bool = False,
+) -> list[dict[str, Any]]:
+    """
+    评估所有配置并按 rank_by 排名；返回 [{**config, n, logloss, hit_rate, edge}, ...]
+
+    workers>1 时数据放入共享内存，由进程池按“同一权重的配置尽量在同一批”分批评估。
+    """
+    if rank_by not in RANK_METRICS:
+        raise ValueError(f"unknown rank_by {rank_by!r} (expected one of {list(RANK_METRICS)})")
+    # 同一权重的配置相邻，工作进程可复用 z
+    order = sorted(range(len(configs)), key=lambda i: _weights_key(configs[i]["weights"]) or ())
+    tagged = [(i, configs[i]) for i in order]
+    n_workers = min(len(tagged), int(workers or os.cpu_count() or 1))
+    t0 = time.perf_counter()
+    results: list[tuple[int, dict[str, Any]]] = []
+    if n_workers > 1:
+        from concurrent.futures import ProcessPoolExecutor, as_completed
+
+        # 每个进程约 8 批：足够均衡负载，又不至于让同一权重被拆得太碎
+        batch = max(1, math.ceil(len(tagged) / (n_workers * 8)))
+        batches = [tagged[i:i + batch] for i in range(0, len(tagged), batch)]
+        shm, layout = _to_shared(data)
+        try:
+            with ProcessPoolExecutor(max_workers=n_workers, initializer=_init_worker, initargs=(shm.name, layout)) as pool:
+                futures = [pool.submit(_sweep_worker, b) for b in batches]
+                for k, fut in enumerate(as_completed(futures), 1):
+                    results.extend(fut.result())
+                    if progress and (k % max(1, len(futures) // 10) == 0 or k == len(futures)):
+                        print(f"[sweep] {len(results)}/{len(tagged)} configs elapsed_s={time.perf_counter() - t0:.1f}", flush=True)
+        finally:
+            shm.close()
+            shm.unlink()
+    else:
+        step = max(1, len(tagged) // 10)
+        for k in range(0, len(tagged), step):
+            results.extend(_evaluate_many(data, tagged[k:k + step]))
+            if progress:
+                print(f"[sweep] {len(results)}/{len(tagged)} configs elapsed_s={time.perf_counter() - t0:.1f}", flush=True)
+
+    higher_better = RANK_METRICS[rank_by]
+    ranked = []
+    for i, metrics in results:
+        ranked.append({**configs[i], **metrics})
+
+    def sort_key(r: dict[str, Any]) -> tuple[bool, float]:
+        v = r[rank_by]
+        if v is None or math.isnan(v):
+            return (True, 0.0)
+        return (False, -v if higher_better else v)
+
+    ranked.sort(key=sort_key)
+    return ranked
+
+
+def _parse_values(text: str) -> list[float]:
+    return [float(x) for x in str(text).split(",") if x.strip()]
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="CEX venue weight / decay parameter sweep")
+    ap.add_argument("--hot-dir", type=str, default="real_hot")
+    ap.add_argument("--symbol", type=str, default="btc")
+    ap.add_argument("--slices", type=str, nargs="*", default=None, help="直接指定切片（默认按 --start/--end 从 hot-dir 选取）")
+    ap.add_argument("--start", type=float, default=None, help="评估起始时间（epoch秒）")
+    ap.add_argument("--end", type=float, default=None, help="评估结束时间（epoch秒）")
+    ap.add_argument("--venues", type=str, default=",".join(DEFAULT_VENUES))
+    ap.add_argument("--weight-values", type=str, default="1,2,3", help="每个 venue 的候选权重（逗号分隔）")
+    ap.add_argument("--weight", type=str, action="append", default=[], help="单个 venue 的候选权重，如 okx_swap=1,2,4（可重复）")
+    for name, default in DECAY_DEFAULTS.items():
+        flag = "--" + name.replace("_", "-")
+        ap.add_argument(flag, type=str, default=str(default), dest=name, help=f"候选值（逗号分隔），默认 {default}")
+    ap.add_argument("--lookback-s", type=int, default=7200)
+    ap.add_argument("--min-samples", type=int, default=100)
+    ap.add_argument("--window", type=str, default="15m", help="window tag (15m/1h)")
+    ap.add_argument("--price-venue", type=str, default="binance_spot")
+    ap.add_argument("--random", type=int, default=0, help="随机搜索的配置数（0=网格）")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--workers", type=int, default=0, help="工作进程数（0=CPU核数）")
+    ap.add_argument("--rank-by", type=str, default="logloss", choices=sorted(RANK_METRICS))
+    ap.add_argument("--top", type=int, default=20)
+    ap.add_argument("--output", type=str, default="", help="把全部排名结果写为 JSONL")
+    args = ap.parse_args()
+
+    venues = [v.strip() for v in str(args.venues).split(",") if v.strip()]
+    per_venue: dict[str, list[float]] = {}
+    for spec in args.weight:
+        venue, _, values = str(spec).partition("=")
+        if venue.strip() not in venues or not values:
+            ap.error(f"--weight {spec!r}: expected VENUE=v1,v2 with VENUE in --venues")
+        per_venue[venue.strip()] = _parse_values(values)
+    default_values = _parse_values(args.weight_values)
+    weight_grid = [per_venue.get(v, default_values) for v in venues]
+    decay_grid = {name: _parse_values(getattr(args, name)) for name in DECAY_DEFAULTS}
+
+    lookback = float(args.lookback_s)
+    if args.slices:
+        slices = [Path(p) for p in args.slices]
+    else:
+        if args.start is None or args.end is None:
+            ap.error("need --slices or --start/--end")
+        slices = _slices_in_range(Path(args.hot_dir), str(args.symbol), float(args.start) - lookback, float(args.end) + 3600.0)
+    if not slices:
+        print("[sweep] 没有找到切片", file=sys.stderr, flush=True)
+        sys.exit(1)
+
+    t0 = time.perf_counter()
+    data = load_sweep_data(
+        slices,
+        venues=venues,
+        start_ts=args.start,
+        end_ts=args.end,
+        lookback_seconds=int(args.lookback_s),
+        min_samples=int(args.min_samples),
+        window=str(args.window),
+        price_venue=str(args.price_venue),
+    )
+    print(
+        f"[sweep] loaded slices={len(slices)} samples={data['t'].size} eval_samples={data['eval_pos'].size} "
+        f"elapsed_s={time.perf_counter() - t0:.1f}",
+        flush=True,
+    )
+
+    if int(args.random) > 0:
+        configs = random_configs(weight_grid, decay_grid, int(args.random), seed=int(args.seed))
+    else:
+        configs = grid_configs(weight_grid, decay_grid)
+    print(f"[sweep] configs={len(configs)} workers={int(args.workers or os.cpu_count() or 1)} rank_by={args.rank_by}", flush=True)
+
+    t1 = time.perf_counter()
+    ranked = run_sweep(data, configs, workers=int(args.workers) or None, rank_by=str(args.rank_by), progress=True)
+    elapsed = time.perf_counter() - t1
+    print(f"[sweep] done configs={len(ranked)} elapsed_s={elapsed:.1f} configs_per_s={len(ranked) / max(elapsed, 1e-9):.0f}", flush=True)
+
+    if args.output:
+        out_path = Path(args.output)
+        with out_path.open("w", encoding="utf-8") as f:
+            for r in ranked:
+                f.write(json.dumps(r, ensure_ascii=False) + "\n")
+        print(f"[sweep] wrote {out_path}", flush=True)
+    for rank, r in enumerate(ranked[: max(0, int(args.top))], 1):
+        print(json.dumps({"rank": rank, **r}, ensure_ascii=False), flush=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,140 +1,48 @@
 from __future__ import annotations
 
 import argparse
-import csv
+import bisect
 import json
+import os
 import socket
 import threading
 import time
 import urllib.parse
 import urllib.request
-from collections import deque
 from datetime import datetime, timezone
 from pathlib import Path
-from typing import Any
 
+from cex_metrics import METRICS, SampledTimingLog, start_metrics_server
 from cex_scorer import (
+    NORMALIZER_METHODS,
     AdaptiveScoreNormalizer,
+    IncrementalSignalReader,
     SignalOptimizer,
     _needs_warmup,
     _normalize_ts,
+    _normalizer_cache_name,
+    _prev_cex_slice_path,
+    _slice_prices,
+    _slices_in_range,
     _warmup_normalizer_recursive,
 )
+from cex_signal_cache import slice_path_for, slice_start_ts
 
 
-class IncrementalCexTailReader:
+class IncrementalCexTailReader(IncrementalSignalReader):
+    """daemon 从文件末尾开始，只处理启动之后新写入的样本"""
+
     def __init__(self, csv_path: Path, *, venues: list[str], weights: list[float]) -> None:
-        self.csv_path = Path(csv_path)
-        self.venues = list(venues)
-        self.weights = list(weights)
-        self.header = self._read_header(self.csv_path)
-        self.file_pos = self.csv_path.stat().st_size
-        self.buffer = ""
-        self.groups: dict[int, dict[str, Any]] = {}
-        self.last_sample_id = -1
-
-    @staticmethod
-    def _read_header(path: Path) -> list[str]:
-        with path.open("r", encoding="utf-8", errors="replace") as f:
-            line = f.readline().strip("\n")
-        return next(csv.reader([line]))
+        super().__init__(csv_path, venues=venues, weights=weights, seed_tail_bytes=0)
 
     def reset_for_new_file(self, csv_path: Path) -> None:
-        self.csv_path = Path(csv_path)
-        self.header = self._read_header(self.csv_path)
-        self.file_pos = self.csv_path.stat().st_size
-        self.buffer = ""
-        self.groups.clear()
-        self.last_sample_id = -1
+        self.reset(csv_path)
 
     def poll_latest_complete(self) -> tuple[int, float, float] | None:
-        size = self.csv_path.stat().st_size
-        if size < self.file_pos:
-            # file rotated/truncated
-            self.reset_for_new_file(self.csv_path)
-            return None
-        if size == self.file_pos:
-            return None
-        with self.csv_path.open("rb") as f:
-            f.seek(self.file_pos)
-            chunk = f.read()
-            self.file_pos = f.tell()
-        text = (self.buffer + chunk.decode("utf-8", errors="replace"))
-        lines = text.splitlines()
-        if text and not text.endswith("\n"):
-            self.buffer = lines.pop() if lines else text
-        else:
-            self.buffer = ""
-
-        if not lines:
-            return None
-
-        need = set(self.venues)
-        for ln in lines:
-            if not ln or ln.startswith("ts_sample_utc,"):
-                continue
-            try:
-                row = next(csv.DictReader([",".join(self.header), ln]))
-            except Exception:
-                continue
-            venue = (row.get("venue") or "").strip()
-            if venue not in need:
-                continue
-            if (row.get("err") or "").strip():
-                continue
-            sid_s = (row.get("sample_id") or "").strip()
-            t_s = (row.get("t_sample_unix") or "").strip()
-            imb_s = (row.get("imb") or "").strip()
-            if not (sid_s and t_s and imb_s):
-                continue
-            try:
-                sid = int(float(sid_s))
-                t = float(t_s)
-                imb = float(imb_s)
-            except Exception:
-                continue
-            g = self.groups.setdefault(sid, {"t": t, "imbs": {}})
-            g["t"] = t
-            imbs = g.get("imbs")
-            if isinstance(imbs, dict):
-                imbs[venue] = imb
-
-        # keep groups from growing without bound
-        if len(self.groups) > 2000:
-            cutoff = max(self.last_sample_id - 500, 0)
-            for sid in list(self.groups.keys()):
-                if sid < cutoff:
-                    self.groups.pop(sid, None)
-
-        # find latest complete sample
-        best_sid = None
-        best_t = 0.0
-        best_score = 0.0
-        for sid, g in self.groups.items():
-            if sid <= self.last_sample_id:
-                continue
-            imbs = g.get("imbs") if isinstance(g, dict) else None
-            if not isinstance(imbs, dict):
-                continue
-            if not all(v in imbs for v in self.venues):
-                continue
-            score = 0.0
-            for i, v in enumerate(self.venues):
-                score += float(self.weights[i]) * float(imbs[v])
-            t = float(g.get("t") or 0.0)
-            if best_sid is None or sid > best_sid:
-                best_sid = sid
-                best_t = t
-                best_score = score
-
-        if best_sid is None:
+        sig = self.poll()
+        if sig is None:
             return None
-
-        self.last_sample_id = int(best_sid)
-        for sid in list(self.groups.keys()):
-            if sid < self.last_sample_id:
-                self.groups.pop(sid, None)
-        return int(best_sid), float(best_t), float(best_score)
+        return sig.sample_id, sig.t, sig.score
 
 
 class TcpBroadcaster:
@@ -319,6 +227,230 @@ def _binance_cum_change_with_retry(
     raise RuntimeError("binance cum_change unavailable after retries")
 
 
+class BinanceKlinePriceProvider:
+    """实时价格：Binance 1m K线（开盘价/收盘价），带缓存和重试"""
+
+    def __init__(self, *, max_retries: int = 10, sleep_s: float = 1.0) -> None:
+        self.max_retries = int(max_retries)
+        self.sleep_s = float(sleep_s)
+        # key=分钟时间戳, value=(open, close)
+        self.cache: dict[int, tuple[float, float]] = {}
+
+    def price(self, ts: float, *, use_open: bool) -> float:
+        return _fetch_binance_price_with_retry(
+            ts_ms=int(float(ts) * 1000),
+            use_open=use_open,
+            cache=self.cache,
+            max_retries=self.max_retries,
+            sleep_s=self.sleep_s,
+        )
+
+
+class RecordedPriceProvider:
+    """
+    回放价格：切片中录制的某个 venue 的 mid
+
+    use_open=True（窗口起始价）取 ts 及之后的第一个价格，否则取不晚于 ts 的最近价格，
+    与 score_cex_batch 的约定一致。
+    """
+
+    def __init__(self, slices: list[Path], *, venue: str = "binance_spot") -> None:
+        points = sorted(pt for path in slices for pt in _slice_prices(path, venue=venue))
+        self.ts = [t for t, _ in points]
+        self.prices = [p for _, p in points]
+
+    def price(self, ts: float, *, use_open: bool) -> float:
+        if use_open:
+            i = bisect.bisect_left(self.ts, float(ts))
+        else:
+            i = bisect.bisect_right(self.ts, float(ts)) - 1
+        if i < 0 or i >= len(self.ts):
+            raise RuntimeError(f"recorded price unavailable at ts={ts}")
+        return self.prices[i]
+
+
+class ScorePipeline:
+    """单个样本：normalizer → optimizer（动态衰减）→ JSONL + TCP 发布；实时和回放共用"""
+
+    def __init__(
+        self,
+        *,
+        normalizer: AdaptiveScoreNormalizer,
+        optimizer: SignalOptimizer,
+        prices: BinanceKlinePriceProvider | RecordedPriceProvider,
+        symbol: str,
+        window: str,
+        output_path: Path,
+        broadcaster: TcpBroadcaster | None = None,
+        optimizer_file: Path | None = None,
+        flush_each: bool = True,
+        truncate_output: bool = False,
+        timing_log_s: float = 60.0,
+    ) -> None:
+        self.normalizer = normalizer
+        self.optimizer = optimizer
+        self.prices = prices
+        self.symbol = symbol
+        self.window = window
+        self.broadcaster = broadcaster
+        self.optimizer_file = optimizer_file
+        self.flush_each = bool(flush_each)
+        self.current_window_start: float | None = None
+        self.window_start_price: float | None = None
+        self.last_cum_change: float | None = None
+        self.price_failure_count = 0  # 失败计数器（用于日志）
+        self.samples = 0
+        self.timing_log = SampledTimingLog(
+            "[cex-score] timing",
+            stages=["daemon.normalize", "daemon.decay", "daemon.output", "daemon.process"],
+            every_s=timing_log_s,
+        )
+        self._out = None
+        self.set_output(output_path, truncate=truncate_output)
+
+    def set_output(self, output_path: Path, *, truncate: bool = False) -> None:
+        self.close()
+        self.output_path = Path(output_path)
+        self.output_path.parent.mkdir(parents=True, exist_ok=True)
+        self._out = self.output_path.open("w" if truncate else "a", encoding="utf-8")
+
+    def close(self) -> None:
+        if self._out is not None:
+            self._out.close()
+            self._out = None
+
+    def process(self, sample_id: int, t_sample: float, raw_score: float) -> str:
+        t0 = time.perf_counter()
+        normalizer = self.normalizer
+        optimizer = self.optimizer
+        normalizer.update(raw_score, t_sample)
+        z_score, stats = normalizer.normalize(raw_score, t_sample)
+        is_normalized = bool(stats.get("is_normalized"))
+        t1 = time.perf_counter()
+
+        extra_factor = None
+        price_ok = True
+        if is_normalized:
+            try:
+                window_start = _window_start_ts(float(t_sample), self.window)
+                if self.current_window_start is None or window_start != self.current_window_start:
+                    if self.last_cum_change is not None:
+                        optimizer.add_offset(float(self.last_cum_change))
+                        if self.optimizer_file is not None:
+                            try:
+                                optimizer.save_state(self.optimizer_file)
+                            except Exception:
+                                pass
+                    self.current_window_start = float(window_start)
+                    self.window_start_price = self.prices.price(self.current_window_start, use_open=True)
+                if self.window_start_price is None:
+                    raise RuntimeError("window_start_price unavailable")
+                current_price = self.prices.price(float(t_sample), use_open=False)
+                cum_change = abs(float(current_price) - float(self.window_start_price))
+                # 处理 cum_change=0 的情况（窗口刚开始时价格可能未变化）
+                if cum_change <= 0.0:
+                    if optimizer.sorted_offsets:
+                        cum_change = optimizer.sorted_offsets[0] * 0.1
+                    else:
+                        cum_change = 0.01  # 默认 1 美分
+                    if self.price_failure_count < 3:  # 只在前几次输出警告
+                        print(f"[cex-score] warn: sample_id={sample_id} cum_change=0, using min={cum_change:.4f}", flush=True)
+                self.last_cum_change = float(cum_change)
+                elapsed_time_min = max(0.0, (float(t_sample) - float(window_start)) / 60.0)
+                extra_factor = optimizer.dynamic_decay(float(elapsed_time_min), float(cum_change))
+            except Exception as exc:
+                price_ok = False
+                self.price_failure_count += 1
+                # 详细记录失败原因
+                if self.price_failure_count <= 10 or int(sample_id) % 100 == 0:
+                    print(f"[cex-score] error: sample_id={sample_id} price_ok=False reason={type(exc).__name__}: {exc}", flush=True)
+
+        t2 = time.perf_counter()
+        z_eff = None
+        if is_normalized and price_ok and extra_factor is not None:
+            z_eff = float(z_score) * float(extra_factor)
+
+        payload = {
+            "ts": float(_normalize_ts(t_sample)),
+            "sample_id": int(sample_id),
+            "raw_score": float(raw_score),
+            "z_score": float(z_score),
+            "z_eff": float(z_eff) if z_eff is not None else None,
+            "symbol": self.symbol,
+            "window": self.window,
+        }
+        line = json.dumps(payload, ensure_ascii=True)
+        self._out.write(line + "\n")
+        if self.flush_each:
+            self._out.flush()
+        if self.broadcaster is not None:
+            self.broadcaster.publish(line)
+        self.samples += 1
+        t3 = time.perf_counter()
+        METRICS.observe("daemon.normalize", t1 - t0)
+        METRICS.observe("daemon.decay", t2 - t1)
+        METRICS.observe("daemon.output", t3 - t2)
+        METRICS.observe("daemon.process", t3 - t0)
+        self.timing_log.tick(t3 - t0, detail=lambda: f"sample_id={sample_id} normalize_s={t1 - t0:.3f} decay_s={t2 - t1:.3f} output_s={t3 - t2:.3f}")
+        return line
+
+
+def _replay_slices(args: argparse.Namespace, hot_dir: Path, symbol: str) -> list[Path]:
+    if args.replay:
+        return [Path(p) for p in args.replay]
+    start = float(args.replay_from)
+    end = float(args.replay_to) if args.replay_to is not None else time.time()
+    return _slices_in_range(hot_dir, symbol, start, end)
+
+
+def _run_replay(
+    *,
+    args: argparse.Namespace,
+    slices: list[Path],
+    pipeline: ScorePipeline,
+    venues: list[str],
+    weights: list[float],
+    replay_from: float | None,
+) -> int:
+    """按文件顺序把录制的切片送入与实时相同的 reader → pipeline；speed>0 时按样本时间的倍速回放"""
+    speed = float(args.replay_speed)
+    replay_to = float(args.replay_to) if args.replay_to is not None else None
+    wall0 = time.perf_counter()
+    t_first: float | None = None
+    for path in slices:
+        # seed 长度取文件大小：从头读取
+        reader = IncrementalSignalReader(path, venues=venues, weights=weights, seed_tail_bytes=path.stat().st_size)
+        while True:
+            batch = reader.poll_all(max_bytes=1 << 20)
+            if not batch:
+                if reader.at_eof:
+                    break
+                continue
+            for sig in batch:
+                t = _normalize_ts(sig.t)
+                if replay_from is not None and t <= replay_from:
+                    # 已包含在 warmup 中
+                    continue
+                if replay_to is not None and t > replay_to:
+                    continue
+                if speed > 0:
+                    if t_first is None:
+                        t_first = t
+                    delay = (t - t_first) / speed - (time.perf_counter() - wall0)
+                    if delay > 0:
+                        time.sleep(delay)
+                pipeline.process(sig.sample_id, sig.t, sig.score)
+    pipeline.close()
+    elapsed = time.perf_counter() - wall0
+    rate = pipeline.samples / elapsed if elapsed > 0 else 0.0
+    print(
+        f"[cex-score] replay done samples={pipeline.samples} elapsed_s={elapsed:.3f} "
+        f"samples_per_s={rate:.0f} output={pipeline.output_path}",
+        flush=True,
+    )
+    return 0
+
+
 def main() -> int:
     ap = argparse.ArgumentParser(description="CEX score daemon (incremental, file + TCP).")
     ap.add_argument("--symbol", type=str, default="btc")
@@ -329,7 +461,9 @@ def main() -> int:
     ap.add_argument("--port", type=int, default=9001)
     ap.add_argument("--sleep-s", type=float, default=1.0)
     ap.add_argument("--lookback-s", type=int, default=7200)
+    ap.add_argument("--warmup-workers", type=int, default=0, help="warmup时并行解析切片的进程数（0=CPU核数）")
     ap.add_argument("--min-samples", type=int, default=100)
+    ap.add_argument("--normalizer", type=str, default="zscore", choices=sorted(NORMALIZER_METHODS), help="zscore=均值/标准差，robust=滚动中位数/MAD")
     ap.add_argument("--chainlink-feed-id", type=str, default="0x00039d9e45394f473ab1f050a1b963e6b05351e52d71e507509ada0c95ed75b8")
     ap.add_argument("--chainlink-time-range", type=str, default="1W")
     ap.add_argument("--chainlink-cache-dir", type=str, default="")
@@ -341,7 +475,17 @@ def main() -> int:
     ap.add_argument("--decay-min-mu", type=float, default=8.0)
     ap.add_argument("--decay-max-mu", type=float, default=60.0)
     ap.add_argument("--decay-N-windows", type=int, default=10)
+    ap.add_argument("--replay", type=str, nargs="*", default=None, help="回放这些录制的切片（按给定顺序），不读写实时状态")
+    ap.add_argument("--replay-from", type=float, default=None, help="回放起始时间（epoch秒）；未给 --replay 时从 hot-dir 选取切片")
+    ap.add_argument("--replay-to", type=float, default=None, help="回放结束时间（epoch秒）")
+    ap.add_argument("--replay-speed", type=float, default=0.0, help="回放倍速（0=尽可能快）")
+    ap.add_argument("--replay-price-venue", type=str, default="binance_spot", help="回放时用该 venue 录制的 mid 代替 Binance K线")
+    ap.add_argument("--replay-publish", action="store_true", help="回放时同样通过 TCP 发布")
+    ap.add_argument("--metrics-port", type=int, default=0, help="在该端口提供 /metrics（各阶段耗时分位数，0=关闭）")
+    ap.add_argument("--metrics-host", type=str, default="127.0.0.1")
+    ap.add_argument("--timing-log-s", type=float, default=60.0, help="耗时汇总日志间隔（秒，0=关闭）")
     args = ap.parse_args()
+    replay = args.replay is not None or args.replay_from is not None
 
     symbol = str(args.symbol).strip().lower()
     window = str(args.window).strip().lower()
@@ -350,22 +494,27 @@ def main() -> int:
     decay_T = float(args.decay_T) if float(args.decay_T) > 0 else (60.0 if window == "1h" else 15.0)
     chainlink_cache_dir = Path(args.chainlink_cache_dir) if args.chainlink_cache_dir else None
 
-    output_path = _score_output_path(
-        csv_path=_current_slice_path(hot_dir, symbol),
-        hot_dir=hot_dir,
-        symbol=symbol,
-        window=window,
-        explicit=args.output,
-    )
-    output_path.parent.mkdir(parents=True, exist_ok=True)
+    if replay:
+        output_path = Path(args.output) if str(args.output).strip() else Path(f"cex_score_replay_{symbol}_{window}.jsonl")
+    else:
+        output_path = _score_output_path(
+            csv_path=_current_slice_path(hot_dir, symbol),
+            hot_dir=hot_dir,
+            symbol=symbol,
+            window=window,
+            explicit=args.output,
+        )
 
     cache_dir = Path(".cache")
     cache_dir.mkdir(parents=True, exist_ok=True)
-    cache_file = cache_dir / f"cex_normalizer_{symbol}_{window}.pkl"
+    normalizer_cls = NORMALIZER_METHODS[str(args.normalizer)]
+    cache_file = cache_dir / _normalizer_cache_name(symbol, str(args.normalizer), suffix=window)
+    optimizer_file = cache_dir / f"cex_optimizer_{symbol}_{window}.json"
 
-    normalizer = AdaptiveScoreNormalizer.load_state(cache_file)
+    # 回放从空状态开始，保证结果可复现
+    normalizer = None if replay else normalizer_cls.load_state(cache_file)
     if normalizer is None:
-        normalizer = AdaptiveScoreNormalizer(
+        normalizer = normalizer_cls(
             lookback_seconds=int(args.lookback_s),
             min_samples=int(args.min_samples),
         )
@@ -378,14 +527,46 @@ def main() -> int:
         flush=True,
     )
 
+    optimizer_params = dict(
+        T=float(decay_T),
+        lambda_base=float(args.decay_lambda_base),
+        sigma=float(args.decay_sigma),
+        multiplier=float(args.decay_multiplier),
+        min_mu=float(args.decay_min_mu),
+        max_mu=float(args.decay_max_mu),
+        N_windows=int(args.decay_N_windows),
+    )
+    optimizer = None if replay else SignalOptimizer.load_state(optimizer_file, **optimizer_params)
+    if optimizer is not None:
+        print(
+            f"[cex-score] optimizer state loaded: offsets_n={len(optimizer.historical_offsets)} "
+            f"mu={optimizer.compute_dynamic_mu():.3f}",
+            flush=True,
+        )
+    else:
+        optimizer = SignalOptimizer(**optimizer_params)
+
     venues = ["binance_spot", "okx_spot", "okx_swap", "bybit_spot", "bybit_linear"]
     weights = [1.0, 1.0, 2.0, 2.0, 3.0]
 
+    replay_slices: list[Path] = []
+    replay_from: float | None = None
+    if replay:
+        replay_slices = _replay_slices(args, hot_dir, symbol)
+        if not replay_slices:
+            print("[cex-score] replay: 没有找到要回放的切片", flush=True)
+            return 1
+        replay_from = float(args.replay_from) if args.replay_from is not None else slice_start_ts(replay_slices[0])
+
     # 如果 normalizer 需要 warmup，递归往前查找多个文件来 warmup
-    now_ts = time.time()
-    if _needs_warmup(normalizer, now_ts=now_ts):
+    # 回放时以回放起点为“当前时间”，只用起点之前的数据
+    now_ts = float(replay_from) if replay_from is not None else time.time()
+    if (not replay or replay_from is not None) and _needs_warmup(normalizer, now_ts=now_ts):
         print("[cex-score] warmup: normalizer history不足，开始递归补齐数据...", flush=True)
-        current_csv = _current_slice_path(hot_dir, symbol, now_ts=now_ts)
+        current_csv = (
+            slice_path_for(replay_slices[0].parent, symbol, now_ts) if replay
+            else _current_slice_path(hot_dir, symbol, now_ts=now_ts)
+        )
         if current_csv.exists():
             _warmup_normalizer_recursive(
                 current_csv=current_csv,
@@ -394,29 +575,72 @@ def main() -> int:
                 weights=weights,
                 lookback_seconds=int(args.lookback_s),
                 now_ts=now_ts,
-                max_files=10,
+                # 12h一个切片：保证覆盖整个lookback
+                max_files=max(10, int(args.lookback_s) // 43200 + 2),
+                workers=int(args.warmup_workers) or os.cpu_count() or 1,
             )
             # 保存 warmup 后的状态
-            try:
-                normalizer.save_state(cache_file)
-            except Exception:
-                pass
+            if not replay:
+                try:
+                    normalizer.save_state(cache_file)
+                except Exception:
+                    pass
         else:
             print("[cex-score] warn: 当前 CSV 文件不存在，无法 warmup，z_eff 可能为0直到样本补齐", flush=True)
 
-    broadcaster = TcpBroadcaster(args.host, int(args.port))
-    broadcaster.start()
+    if int(args.metrics_port) > 0:
+        start_metrics_server(int(args.metrics_port), host=str(args.metrics_host))
+
+    broadcaster: TcpBroadcaster | None = None
+    if not replay or args.replay_publish:
+        broadcaster = TcpBroadcaster(args.host, int(args.port))
+        broadcaster.start()
+
+    if replay:
+        price_slices = list(replay_slices)
+        prev = _prev_cex_slice_path(replay_slices[0])
+        if prev is not None:
+            # 第一个窗口可能从上一个切片开始
+            price_slices.insert(0, prev)
+        pipeline = ScorePipeline(
+            normalizer=normalizer,
+            optimizer=optimizer,
+            prices=RecordedPriceProvider(price_slices, venue=str(args.replay_price_venue)),
+            symbol=symbol,
+            window=window,
+            output_path=output_path,
+            broadcaster=broadcaster,
+            flush_each=False,
+            truncate_output=True,
+            timing_log_s=float(args.timing_log_s),
+        )
+        print(
+            f"[cex-score] replay slices={len(replay_slices)} from={replay_from} to={args.replay_to} "
+            f"speed={float(args.replay_speed)} output={output_path}",
+            flush=True,
+        )
+        return _run_replay(
+            args=args,
+            slices=replay_slices,
+            pipeline=pipeline,
+            venues=venues,
+            weights=weights,
+            replay_from=replay_from,
+        )
 
+    pipeline = ScorePipeline(
+        normalizer=normalizer,
+        optimizer=optimizer,
+        prices=BinanceKlinePriceProvider(max_retries=10, sleep_s=1.0),
+        symbol=symbol,
+        window=window,
+        output_path=output_path,
+        broadcaster=broadcaster,
+        optimizer_file=optimizer_file,
+        timing_log_s=float(args.timing_log_s),
+    )
     last_save_s = 0.0
     reader: IncrementalCexTailReader | None = None
-    offsets_history: deque[float] = deque(maxlen=int(args.decay_N_windows))
-    current_window_start: float | None = None
-    window_start_price: float | None = None
-    last_cum_change: float | None = None
-    
-    # Binance 价格缓存：key=分钟时间戳, value=(open, close)
-    binance_price_cache: dict[int, tuple[float, float]] = {}
-    binance_failure_count = 0  # 失败计数器（用于日志）
 
     print(
         f"[cex-score] start symbol={symbol} window={window} hot_dir={hot_dir} "
@@ -442,7 +666,7 @@ def main() -> int:
                     window=window,
                     explicit=args.output,
                 )
-                output_path.parent.mkdir(parents=True, exist_ok=True)
+                pipeline.set_output(output_path)
                 print(f"[cex-score] rotate output={output_path}", flush=True)
 
             signal = reader.poll_latest_complete()
@@ -451,87 +675,7 @@ def main() -> int:
                 continue
 
             sample_id, t_sample, raw_score = signal
-            normalizer.update(raw_score, t_sample)
-            z_score, stats = normalizer.normalize(raw_score, t_sample)
-            is_normalized = bool(stats.get("is_normalized"))
-
-            extra_factor = None
-            mu_val = None
-            offsets_n = 0
-            binance_ok = True
-            if is_normalized:
-                try:
-                    window_start = _window_start_ts(float(t_sample), window)
-                    if current_window_start is None or window_start != current_window_start:
-                        if last_cum_change is not None:
-                            offsets_history.append(float(last_cum_change))
-                        current_window_start = float(window_start)
-                        window_start_price = _fetch_binance_price_with_retry(
-                            ts_ms=int(current_window_start * 1000),
-                            use_open=True,
-                            cache=binance_price_cache,
-                            max_retries=10,
-                            sleep_s=1.0,
-                        )
-                    if window_start_price is None:
-                        raise RuntimeError("binance window_start_price unavailable")
-                    current_price = _fetch_binance_price_with_retry(
-                        ts_ms=int(float(t_sample) * 1000),
-                        use_open=False,
-                        cache=binance_price_cache,
-                        max_retries=10,
-                        sleep_s=1.0,
-                    )
-                    cum_change = abs(float(current_price) - float(window_start_price))
-                    # 处理 cum_change=0 的情况（窗口刚开始时价格可能未变化）
-                    if cum_change <= 0.0:
-                        if offsets_history:
-                            cum_change = min(offsets_history) * 0.1
-                        else:
-                            cum_change = 0.01  # 默认 1 美分
-                        if binance_failure_count < 3:  # 只在前几次输出警告
-                            print(f"[cex-score] warn: sample_id={sample_id} cum_change=0, using min={cum_change:.4f}", flush=True)
-                    last_cum_change = float(cum_change)
-                    offsets = list(offsets_history)
-                    offsets_n = len(offsets)
-                    elapsed_time_min = max(0.0, (float(t_sample) - float(window_start)) / 60.0)
-                    optimizer = SignalOptimizer(
-                        T=float(decay_T),
-                        lambda_base=float(args.decay_lambda_base),
-                        sigma=float(args.decay_sigma),
-                        multiplier=float(args.decay_multiplier),
-                        min_mu=float(args.decay_min_mu),
-                        max_mu=float(args.decay_max_mu),
-                        N_windows=int(args.decay_N_windows),
-                    )
-                    optimizer.set_historical_offsets(offsets)
-                    mu_val = optimizer.compute_dynamic_mu()
-                    extra_factor = optimizer.dynamic_decay(float(elapsed_time_min), float(cum_change))
-                except Exception as exc:
-                    binance_ok = False
-                    binance_failure_count += 1
-                    # 详细记录失败原因
-                    if binance_failure_count <= 10 or int(sample_id) % 100 == 0:
-                        print(f"[cex-score] error: sample_id={sample_id} binance_ok=False reason={type(exc).__name__}: {exc}", flush=True)
-
-            z_eff = None
-            if is_normalized and binance_ok and extra_factor is not None:
-                z_eff = float(z_score) * float(extra_factor)
-
-            payload = {
-                "ts": float(_normalize_ts(t_sample)),
-                "sample_id": int(sample_id),
-                "raw_score": float(raw_score),
-                "z_score": float(z_score),
-                "z_eff": float(z_eff) if z_eff is not None else None,
-                "symbol": symbol,
-                "window": window,
-            }
-            line = json.dumps(payload, ensure_ascii=True)
-            with output_path.open("a", encoding="utf-8") as f:
-                f.write(line + "\n")
-
-            broadcaster.publish(line)
+            pipeline.process(sample_id, t_sample, raw_score)
 
             now_s = time.time()
             if now_s - last_save_s >= 5.0:
@@ -541,6 +685,7 @@ def main() -> int:
                     pass
                 last_save_s = now_s
         except KeyboardInterrupt:
+            pipeline.close()
             print("[cex-score] exit", flush=True)
             return 0
         except Exception as exc:
@@ -1,58 +1,51 @@
 from __future__ import annotations
 
+import bisect
 import json
 import math
-import pickle
+import os
 import time
-import urllib.parse
-import urllib.request
-import statistics
 from collections import deque
 from dataclasses import dataclass
 from datetime import datetime, timezone, timedelta
 from pathlib import Path
 from typing import Any, Optional
 
+from cex_chainlink_store import ChainlinkHistoryStore
+from cex_csv_fast import (
+    CexSignalParser,
+    SignalRow,
+    iter_chunks_reverse,
+    read_header,
+    read_signal_rows,
+    read_venue_prices,
+)
+from cex_metrics import METRICS, SampledTimingLog, env_float, start_metrics_server_from_env
+from cex_order_stats import SortedBuckets
+from cex_signal_cache import PRICE_CACHE_DIR, SliceSignalCache, is_closed_slice, slice_path_for, slice_start_ts
+from cex_state_journal import HistoryJournal
+
 _NORMALIZER_CACHE: dict[str, AdaptiveScoreNormalizer] = {}
 _LOGGED_NORMALIZER: set[str] = set()
 _LOGGED_CSV: set[str] = set()
 _WARMUP_DONE: set[str] = set()
-_CHAINLINK_CACHE: dict[str, dict[str, Any]] = {}
-
-
-def _read_csv_header(path: Path) -> list[str]:
-    with path.open("r", encoding="utf-8", errors="replace") as f:
-        line = f.readline().strip("\n")
-    import csv
-
-    return next(csv.reader([line]))
-
+_CHAINLINK_CACHE: dict[str, ChainlinkHistoryStore] = {}
+_SIGNAL_CACHE = SliceSignalCache()
+_PRICE_CACHE = SliceSignalCache(PRICE_CACHE_DIR)
 
-def _read_tail_rows(path: Path, *, tail_bytes: int) -> list[dict[str, str]]:
-    import csv
-
-    header = _read_csv_header(path)
-    with path.open("rb") as f:
-        f.seek(0, 2)
-        size = f.tell()
-        start = max(0, size - int(tail_bytes))
-        f.seek(start)
-        text = f.read().decode("utf-8", errors="replace")
-    lines = [ln for ln in text.splitlines() if ln.strip()]
-    rows: list[dict[str, str]] = []
-    for ln in lines:
-        if ln.startswith("ts_sample_utc,") and "venue" in ln:
-            continue
-        try:
-            row = next(csv.DictReader([",".join(header), ln]))
-        except Exception:
-            continue
-        rows.append({k: (row.get(k) or "") for k in header})
-    return rows
+# score_cex 各阶段耗时：进程内直方图（cex_metrics.METRICS），日志按时间抽样
+_SCORE_STAGES = ("load_signal", "warmup", "normalize", "save", "chainlink", "total")
+_TIMING_LOG = SampledTimingLog(
+    "[cex] timing",
+    stages=[f"score_cex.{s}" for s in _SCORE_STAGES],
+    every_s=env_float("CEX_METRICS_LOG_S", 60.0),
+    slow_s=env_float("CEX_METRICS_SLOW_S", 1.0),
+)
+_METRICS_SERVER_CHECKED = False
 
 
 def _iter_complete_signals_from_rows(
-    rows: list[dict[str, str]],
+    rows: list[SignalRow],
     *,
     venues: list[str],
     weights: list[float],
@@ -60,30 +53,18 @@ def _iter_complete_signals_from_rows(
 ) -> list[tuple[float, float]]:
     need = set(venues)
     groups: dict[int, dict[str, Any]] = {}
-    for row in rows:
-        venue = (row.get("venue") or "").strip()
+    for sid, t, venue, imb in rows:
         if venue not in need:
             continue
-        if (row.get("err") or "").strip():
-            continue
-        sid_s = (row.get("sample_id") or "").strip()
-        t_s = (row.get("t_sample_unix") or "").strip()
-        imb_s = (row.get("imb") or "").strip()
-        if not (sid_s and t_s and imb_s):
-            continue
-        try:
-            sid = int(float(sid_s))
-            t = float(t_s)
-            imb = float(imb_s)
-        except Exception:
-            continue
-        g = groups.setdefault(sid, {"t": t, "imbs": {}})
+        g = groups.get(sid)
+        if g is None:
+            g = groups[sid] = {"t": t, "imbs": {}}
         g["t"] = t
         g["imbs"][venue] = imb
     out: list[tuple[float, float]] = []
     for sid, g in groups.items():
-        imbs = g.get("imbs") or {}
-        if not all(v in imbs for v in venues):
+        imbs = g["imbs"]
+        if len(imbs) < len(need) or not all(v in imbs for v in venues):
             continue
         score = 0.0
         for i, v in enumerate(venues):
@@ -95,6 +76,174 @@ def _iter_complete_signals_from_rows(
     return out
 
 
+def _complete_signals_from_file(
+    path: Path,
+    *,
+    venues: list[str],
+    weights: list[float],
+    min_abs_score: float = 0.0,
+) -> list[tuple[float, float]]:
+    """整个切片的完整信号（耗时主要在逐行解析，NumPy 路径并不更快，因此直接走逐行版本）"""
+    rows = read_signal_rows(path, venues=venues)
+    return _iter_complete_signals_from_rows(rows, venues=venues, weights=weights, min_abs_score=min_abs_score)
+
+
+@dataclass
+class CexSignal:
+    sample_id: int
+    t: float
+    score: float
+
+
+class IncrementalSignalReader:
+    """
+    增量读取正在写入的CEX切片，维护“最新的 venues 齐全的 sample_id”
+
+    - 首次从文件末尾 seed_tail_bytes 处开始（0 表示只看之后新追加的行）
+    - 之后每次 poll() 只读取上次偏移之后追加的字节；未写完的最后一行留到下次
+    - 尚未齐全的 sample 分组跨调用保留
+    - inode 变化或文件变短（轮转/截断）时重新 seed
+    """
+
+    GROUP_LIMIT = 2000
+
+    def __init__(
+        self,
+        csv_path: Path,
+        *,
+        venues: list[str],
+        weights: list[float],
+        seed_tail_bytes: int = 16_384,
+    ) -> None:
+        self.venues = list(venues)
+        self.weights = [float(w) for w in weights]
+        self.seed_tail_bytes = max(0, int(seed_tail_bytes))
+        self._n_need = len(set(self.venues))
+        self.reset(csv_path)
+
+    def reset(self, csv_path: Optional[Path] = None) -> None:
+        if csv_path is not None:
+            self.csv_path = Path(csv_path)
+        st = self.csv_path.stat()
+        self.parser = CexSignalParser(read_header(self.csv_path))
+        self.inode = st.st_ino
+        self.file_pos = max(0, st.st_size - self.seed_tail_bytes)
+        # 从行中间开始时第一行不完整，丢弃
+        self._skip_partial = False
+        if self.file_pos > 0:
+            with self.csv_path.open("rb") as f:
+                f.seek(self.file_pos - 1)
+                self._skip_partial = f.read(1) != b"\n"
+        self._pending = b""
+        self.groups: dict[int, list[Any]] = {}
+        self.last_sample_id = -1
+        self.latest: Optional[CexSignal] = None
+
+    @property
+    def at_eof(self) -> bool:
+        return self.file_pos >= self.csv_path.stat().st_size
+
+    def _read_new(self, max_bytes: Optional[int] = None) -> set[int]:
+        """读取新追加的字节（最多 max_bytes）并并入分组；返回本次涉及的 sample_id"""
+        st = self.csv_path.stat()
+        if st.st_ino != self.inode or st.st_size < self.file_pos:
+            self.reset()
+            st = self.csv_path.stat()
+        if st.st_size <= self.file_pos:
+            return set()
+        with self.csv_path.open("rb") as f:
+            f.seek(self.file_pos)
+            chunk = f.read() if max_bytes is None else f.read(int(max_bytes))
+            self.file_pos = f.tell()
+        data = self._pending + chunk
+        cut = data.rfind(b"\n")
+        if cut < 0:
+            self._pending = data
+            return set()
+        self._pending = data[cut + 1:]
+        lines = data[:cut].decode("utf-8", errors="replace").splitlines()
+        if self._skip_partial:
+            lines = lines[1:]
+            self._skip_partial = False
+
+        groups = self.groups
+        touched: set[int] = set()
+        for sid, t, venue, imb in self.parser.iter_rows(lines, venues=self.venues):
+            g = groups.get(sid)
+            if g is None:
+                g = groups[sid] = [t, {}]
+            g[0] = t
+            g[1][venue] = imb
+            touched.add(sid)
+        return touched
+
+    def _is_new_complete(self, sid: int) -> bool:
+        return sid > self.last_sample_id and len(self.groups[sid][1]) >= self._n_need
+
+    def _emit(self, sid: int) -> CexSignal:
+        t, imbs = self.groups[sid]
+        score = 0.0
+        for w, v in zip(self.weights, self.venues):
+            score += w * float(imbs[v])
+        return CexSignal(sample_id=int(sid), t=float(t), score=float(score))
+
+    def _advance(self, sid: int) -> None:
+        """sid 及更早的分组不再需要（更早但仍不齐全的样本与实时逻辑一致地丢弃）"""
+        self.last_sample_id = int(sid)
+        groups = self.groups
+        for s in [s for s in groups if s <= sid]:
+            del groups[s]
+
+    def _trim(self) -> None:
+        groups = self.groups
+        if len(groups) > self.GROUP_LIMIT:
+            cutoff = max(groups) - self.GROUP_LIMIT // 4
+            for sid in [s for s in groups if s < cutoff]:
+                del groups[sid]
+
+    def poll(self) -> Optional[CexSignal]:
+        """读取新追加的数据；返回本次新出现的最新完整样本（没有则None，latest 保持不变）"""
+        touched = self._read_new()
+        best: Optional[int] = None
+        for sid in touched:
+            if self._is_new_complete(sid) and (best is None or sid > best):
+                best = sid
+        if best is None:
+            self._trim()
+            return None
+        self.latest = self._emit(best)
+        self._advance(best)
+        return self.latest
+
+    def poll_all(self, max_bytes: Optional[int] = None) -> list[CexSignal]:
+        """与 poll 相同，但按 sample_id 顺序返回本次新出现的所有完整样本（回放用）"""
+        touched = self._read_new(max_bytes)
+        complete = sorted(sid for sid in touched if self._is_new_complete(sid))
+        if not complete:
+            self._trim()
+            return []
+        out = [self._emit(sid) for sid in complete]
+        self.latest = out[-1]
+        self._advance(complete[-1])
+        return out
+
+
+_SIGNAL_READERS: dict[tuple, IncrementalSignalReader] = {}
+_SIGNAL_READER_LIMIT = 8
+
+
+def _signal_reader_for(path: Path, *, venues: list[str], weights: list[float], tail_bytes: int) -> IncrementalSignalReader:
+    key = (str(path.resolve()), tuple(venues), tuple(float(w) for w in weights))
+    reader = _SIGNAL_READERS.get(key)
+    if reader is None:
+        reader = IncrementalSignalReader(path, venues=venues, weights=weights, seed_tail_bytes=int(tail_bytes))
+        _SIGNAL_READERS[key] = reader
+        # 切片轮转后旧路径的 reader 不再使用
+        while len(_SIGNAL_READERS) > _SIGNAL_READER_LIMIT:
+            _SIGNAL_READERS.pop(next(iter(_SIGNAL_READERS)))
+    return reader
+
+
 def _normalize_ts(ts: float) -> float:
     t = float(ts)
     # Normalize ms/us timestamps to seconds.
@@ -149,6 +298,124 @@ def _prev_cex_slice_path(p: Path) -> Optional[Path]:
         return None
 
 
+def _covering_slices(csv_path: Path, *, cutoff: float, max_files: int = 10) -> list[Path]:
+    """
+    覆盖 [cutoff, 当前] 的切片列表（从新到旧），根据文件名中的切片起始时间提前确定，
+    不需要先解析文件。非切片命名的文件只返回它自己。
+    """
+    out: list[Path] = []
+    path: Optional[Path] = csv_path
+    while path is not None and path.exists() and len(out) < int(max_files):
+        out.append(path)
+        start = slice_start_ts(path)
+        if start is None or start <= cutoff:
+            break
+        path = _prev_cex_slice_path(path)
+    return out
+
+
+def _slice_signals_worker(path: str, venues: list[str], weights: list[float], cache_dir: str) -> list[tuple[float, float]]:
+    """进程池worker：解析一个已关闭的切片并写入信号缓存sidecar"""
+    p = Path(path)
+    signals = _complete_signals_from_file(p, venues=venues, weights=weights)
+    SliceSignalCache(Path(cache_dir)).put(p, signals, venues=venues, weights=weights)
+    return signals
+
+
+def _parse_closed_slices(
+    paths: list[Path],
+    *,
+    venues: list[str],
+    weights: list[float],
+    workers: Optional[int] = None,
+) -> dict[Path, list[tuple[float, float]]]:
+    """缓存未命中的已关闭切片：workers>1 时用进程池并行解析，否则（默认）顺序解析；进程池不可用时回退为顺序"""
+    out: dict[Path, list[tuple[float, float]]] = {}
+    if not paths:
+        return out
+    n_workers = min(len(paths), int(workers or 1))
+    if n_workers > 1:
+        try:
+            from concurrent.futures import ProcessPoolExecutor
+
+            with ProcessPoolExecutor(max_workers=n_workers) as pool:
+                futures = {
+                    pool.submit(_slice_signals_worker, str(p), list(venues), list(weights), str(_SIGNAL_CACHE.cache_dir)): p
+                    for p in paths
+                }
+                for fut, p in futures.items():
+                    out[p] = fut.result()
+                    _SIGNAL_CACHE.put(p, out[p], venues=venues, weights=weights, write=False)
+            return out
+        except Exception as e:
+            print(f"[cex] warmup: 并行解析失败，改为顺序解析 {type(e).__name__}: {e}", flush=True)
+            out.clear()
+    for p in paths:
+        out[p] = _SIGNAL_CACHE.get(
+            p,
+            venues=venues,
+            weights=weights,
+            compute=lambda p=p: _complete_signals_from_file(p, venues=venues, weights=weights),
+        )
+    return out
+
+
+def _read_open_slice_backward(
+    path: Path,
+    *,
+    venues: list[str],
+    weights: list[float],
+    cutoff: float,
+    chunk_bytes: int = 4 << 20,
+) -> list[tuple[float, float]]:
+    """仍在写入的切片：从末尾倒序分块读取，越过 cutoff 即停止"""
+    parser = CexSignalParser(read_header(path))
+    chunks: list[list[SignalRow]] = []
+    for lines in iter_chunks_reverse(path, chunk_bytes=chunk_bytes):
+        rows = list(parser.iter_rows(lines, venues=venues))
+        chunks.append(rows)
+        if rows and _normalize_ts(min(r[1] for r in rows)) < cutoff:
+            break
+    rows = [r for chunk in reversed(chunks) for r in chunk]
+    return _iter_complete_signals_from_rows(rows, venues=venues, weights=weights, min_abs_score=0.0)
+
+
+def _collect_signals_backward(
+    csv_path: Path,
+    *,
+    venues: list[str],
+    weights: list[float],
+    cutoff: float,
+    max_files: int = 10,
+    workers: Optional[int] = None,
+) -> tuple[list[tuple[float, float]], int]:
+    """
+    收集 [cutoff, 当前] 的完整信号：先按文件名确定覆盖lookback的切片集合，
+    已关闭的切片取缓存（未命中的按 workers 解析），仍在写入的切片倒序读取到 cutoff 为止。
+
+    返回 (按时间排序的完整信号, 读取过的文件数)。sample_id 只在单个切片内分组。
+    """
+    slices = _covering_slices(csv_path, cutoff=cutoff, max_files=max_files)
+    now = time.time()
+    per_slice: dict[Path, list[tuple[float, float]]] = {}
+    misses: list[Path] = []
+    for path in slices:
+        if not is_closed_slice(path, now):
+            per_slice[path] = _read_open_slice_backward(path, venues=venues, weights=weights, cutoff=cutoff)
+            continue
+        cached = _SIGNAL_CACHE.lookup(path, venues=venues, weights=weights)
+        if cached is None:
+            misses.append(path)
+        else:
+            per_slice[path] = cached
+    if misses:
+        print(f"[cex] warmup: 解析 {len(misses)} 个已关闭切片", flush=True)
+        per_slice.update(_parse_closed_slices(misses, venues=venues, weights=weights, workers=workers))
+    signals = [sig for path in slices for sig in per_slice.get(path, [])]
+    signals.sort(key=lambda x: x[0])
+    return signals, len(slices)
+
+
 def _warmup_normalizer_from_csv(
     *,
     csv_path: Path,
@@ -158,10 +425,15 @@ def _warmup_normalizer_from_csv(
     lookback_seconds: int,
     now_ts: float,
     warmup_end_ts: float | None = None,
-) -> None:
+    max_files: int = 10,
+    workers: Optional[int] = None,
+) -> int:
     """
     Warmup normalizer from CSV file.
     
+    倒序分块读取（见 _collect_signals_backward），只读到 lookback cutoff 为止，
+    不够时继续读上一个切片；I/O和内存与lookback窗口成正比，与文件大小无关。
+    
     Args:
         csv_path: CSV file path
         normalizer: Normalizer to warmup
@@ -172,59 +444,48 @@ def _warmup_normalizer_from_csv(
         warmup_end_ts: Optional end timestamp for warmup data. If None, uses now_ts.
                       This is useful when warmuping the current file in training,
                       where we want to include data up to start_t, not now_ts.
+        max_files: 最多读取的切片数（含当前切片）
+        workers: 并行解析已关闭切片的进程数（None/1=在当前进程顺序解析）
+    
+    Returns:
+        读取过的文件数
     """
     now_s = _normalize_ts(float(now_ts))
     cutoff = float(now_s) - float(lookback_seconds)
     # 如果指定了 warmup_end_ts，使用它作为上限；否则使用 now_ts
     warmup_end = float(warmup_end_ts) if warmup_end_ts is not None else float(now_s)
     warmup_end = _normalize_ts(warmup_end)
-    try:
-        last_ts = max((_normalize_ts(t) for t, _ in normalizer.history), default=None)
-    except Exception:
-        last_ts = None
-    tail_bytes = 64_000_000
-    rows = _read_tail_rows(csv_path, tail_bytes=tail_bytes)
-    signals = _iter_complete_signals_from_rows(rows, venues=venues, weights=weights, min_abs_score=0.0)
-    earliest = min((_normalize_ts(t) for t, _ in signals), default=float("inf"))
-    use_full_scan = earliest > cutoff
-    if use_full_scan:
-        print("[cex] warmup: tail 不够覆盖 2h，改用全量扫描", flush=True)
-        import csv
-
-        header = _read_csv_header(csv_path)
-        rows = []
-        with csv_path.open("r", encoding="utf-8", errors="replace") as f:
-            r = csv.DictReader(f, fieldnames=header)
-            for row in r:
-                if row.get("ts_sample_utc", "").startswith("ts_sample_utc,"):
-                    continue
-                rows.append({k: (row.get(k) or "") for k in header})
-        signals = _iter_complete_signals_from_rows(rows, venues=venues, weights=weights, min_abs_score=0.0)
-    # filter to last lookback window
-    # 如果 last_ts 存在，说明之前已经加载过数据，现在需要加载 [cutoff, last_ts) 范围内的数据来填补空白
-    # 如果 last_ts 不存在，说明是第一次加载，加载 [cutoff, warmup_end) 范围内的数据
-    used = 0
-    newest_ts: float | None = None
+    normalizer._cleanup(float(now_s))
+    history = normalizer.history
+    # 已有历史时只补齐更早的部分 [cutoff, 最早样本)，按时间顺序放在已有历史之前
+    first_ts = _normalize_ts(float(history[0][0])) if history else None
+    upper = float(first_ts) if first_ts is not None else float(warmup_end)
+    
+    signals, files = _collect_signals_backward(
+        csv_path, venues=venues, weights=weights, cutoff=cutoff, max_files=max_files, workers=workers
+    )
+    added: list[tuple[float, float]] = []
     for t, s in signals:
         t_s = _normalize_ts(float(t))
         if t_s + 1e-9 < cutoff:
             continue
-        # 如果 last_ts 存在，只加载 [cutoff, last_ts) 范围内的数据（填补空白）
-        # 如果 last_ts 不存在，加载 [cutoff, warmup_end) 范围内的数据
-        if last_ts is not None:
-            if t_s >= float(last_ts) - 1e-9:
+        if first_ts is not None:
+            if t_s >= upper - 1e-9:
                 continue  # 跳过已经加载过的数据
-        else:
-            # 如果 warmup_end 指定了，包含 [cutoff, warmup_end] 范围的数据（包含 warmup_end 本身）
-            # 这样训练开始时间 start_t 的数据也会被包含在 warmup 中
-            if t_s > float(warmup_end) + 1e-9:
-                continue  # 跳过 warmup_end 之后的数据（使用 > 而不是 >=，包含 warmup_end 本身）
-        normalizer.update(float(s), float(t_s))
-        used += 1
-        newest_ts = t_s if newest_ts is None else max(newest_ts, t_s)
+        elif t_s > upper + 1e-9:
+            # 包含 warmup_end 本身（训练开始时间 start_t 的数据也计入 warmup）
+            continue
+        added.append((t_s, float(s)))
+    if added:
+        normalizer.history = deque(added + list(history))
     normalizer._cleanup(float(now_s))
-    last_ts_str = f"{last_ts:.0f}" if last_ts is not None else "None"
-    print(f"[cex] warmup: 已补齐样本 {used} 条 (lookback_s={int(lookback_seconds)}, cutoff={cutoff:.0f}, warmup_end={warmup_end:.0f}, last_ts={last_ts_str})", flush=True)
+    first_ts_str = f"{first_ts:.0f}" if first_ts is not None else "None"
+    print(
+        f"[cex] warmup: 已补齐样本 {len(added)} 条 (files={files}, lookback_s={int(lookback_seconds)}, "
+        f"cutoff={cutoff:.0f}, warmup_end={warmup_end:.0f}, first_ts={first_ts_str})",
+        flush=True,
+    )
+    return files
 
 
 def _warmup_normalizer_recursive(
@@ -237,57 +498,34 @@ def _warmup_normalizer_recursive(
     now_ts: float,
     max_files: int = 10,
     warmup_end_ts: float | None = None,
+    workers: Optional[int] = None,
 ) -> None:
     """
-    递归往前查找多个文件来 warmup normalizer，直到有足够的数据。
-    先尝试当前文件，如果不够就往前找上一个文件，直到满足 warmup 要求或达到最大文件数。
+    从当前切片往前（必要时跨多个切片）warmup normalizer，直到覆盖lookback窗口或达到最大文件数。
     
     Args:
         warmup_end_ts: Optional end timestamp for warmup data. When warmuping the current file,
                       this should be set to the training start time (start_t), so that data
-                      in [cutoff, start_t) is included. For previous files, this should be None
-                      to use now_ts as the limit.
+                      in [cutoff, start_t) is included.
     """
     if not current_csv.exists():
         return
     
-    # 先尝试从当前文件 warmup（使用 warmup_end_ts 作为上限）
+    files_checked = 0
     try:
-        _warmup_normalizer_from_csv(
+        files_checked = _warmup_normalizer_from_csv(
             csv_path=current_csv,
             normalizer=normalizer,
             venues=venues,
             weights=weights,
             lookback_seconds=lookback_seconds,
             now_ts=now_ts,
-            warmup_end_ts=warmup_end_ts,  # 当前文件使用 warmup_end_ts
+            warmup_end_ts=warmup_end_ts,
+            max_files=max_files,
+            workers=workers,
         )
     except Exception as e:
-        print(f"[cex] warmup: 当前文件失败 {type(e).__name__}: {e}", flush=True)
-    
-    # 检查是否还需要更多数据
-    files_checked = 1
-    prev_csv = _prev_cex_slice_path(current_csv)
-    while _needs_warmup(normalizer, now_ts=now_ts) and files_checked < max_files:
-        if prev_csv is None or not prev_csv.exists():
-            break
-        try:
-            print(f"[cex] warmup: 数据仍不足，继续从上一个文件加载: {prev_csv.name}", flush=True)
-            # 对于之前的文件，不使用 warmup_end_ts（使用 None，即 now_ts）
-            _warmup_normalizer_from_csv(
-                csv_path=prev_csv,
-                normalizer=normalizer,
-                venues=venues,
-                weights=weights,
-                lookback_seconds=lookback_seconds,
-                now_ts=now_ts,
-                warmup_end_ts=None,  # 之前的文件使用 now_ts 作为上限
-            )
-            files_checked += 1
-            prev_csv = _prev_cex_slice_path(prev_csv)
-        except Exception as e:
-            print(f"[cex] warmup: 上一个文件失败 {type(e).__name__}: {e}", flush=True)
-            break
+        print(f"[cex] warmup: 读取失败 {type(e).__name__}: {e}", flush=True)
     
     if _needs_warmup(normalizer, now_ts=now_ts):
         print(f"[cex] warmup: 警告：已检查 {files_checked} 个文件，normalizer history仍不足，z_eff 可能为0直到样本补齐", flush=True)
@@ -317,10 +555,60 @@ class AdaptiveScoreNormalizer:
         min_samples: 最小样本数，低于此值返回原始score，默认100
     """
     
+    # 每累计这么多次增删后，从history精确重算一次累加和并重新选取平移中心
+    RECENTER_EVERY = 10_000
+    
     def __init__(self, lookback_seconds: int = 7200, min_samples: int = 100):
         self.lookback_seconds = float(lookback_seconds)
         self.min_samples = int(min_samples)
-        self.history: deque[tuple[float, float]] = deque()  # [(timestamp, score), ...]
+        self._journal: Optional[HistoryJournal] = None
+        self._unsaved: list[tuple[float, float]] = []  # 上次save_state之后新增的样本
+        self.history = deque()  # [(timestamp, score), ...]
+    
+    @property
+    def history(self) -> deque[tuple[float, float]]:
+        """只读；增删样本用 update()，整体替换请赋值（setter 会重建累加状态）"""
+        return self._history
+    
+    @history.setter
+    def history(self, value) -> None:
+        self._history: deque[tuple[float, float]] = value if isinstance(value, deque) else deque(value)
+        self._recompute()
+        # 整体替换后journal无法表达，下次保存写完整快照
+        self._unsaved = []
+        if self._journal is not None:
+            self._journal.dirty = True
+    
+    def _recompute(self) -> None:
+        """
+        从history重算平移累加和：sum(x-K), sum((x-K)^2)，K取当前均值。
+        平移后方差公式 E[(x-K)^2] - E[x-K]^2 不会因均值远离0而损失精度。
+        """
+        n = len(self._history)
+        shift = (sum(s for _, s in self._history) / n) if n else 0.0
+        self._shift = float(shift)
+        self._sum = 0.0
+        self._sumsq = 0.0
+        for _, s in self._history:
+            d = s - self._shift
+            self._sum += d
+            self._sumsq += d * d
+        self._count = n
+        self._ops = 0
+    
+    def _add(self, score: float) -> None:
+        d = score - self._shift
+        self._sum += d
+        self._sumsq += d * d
+        self._count += 1
+        self._ops += 1
+    
+    def _remove(self, score: float) -> None:
+        d = score - self._shift
+        self._sum -= d
+        self._sumsq -= d * d
+        self._count -= 1
+        self._ops += 1
     
     def update(self, score: float, timestamp: Optional[float] = None) -> None:
         """
@@ -331,14 +619,33 @@ class AdaptiveScoreNormalizer:
             timestamp: Unix时间戳，默认使用当前时间
         """
         ts = _normalize_ts(float(timestamp) if timestamp is not None else time.time())
-        self.history.append((float(ts), float(score)))
+        self._history.append((float(ts), float(score)))
+        self._add(float(score))
+        self._unsaved.append((float(ts), float(score)))
+        if len(self._unsaved) > max(2 * len(self._history), 10_000):
+            # 长时间未保存：与其追加大量已过期样本，不如下次直接写快照
+            self._unsaved = []
+            if self._journal is not None:
+                self._journal.dirty = True
         self._cleanup(ts)
     
     def _cleanup(self, current_time: float) -> None:
         """删除超出lookback窗口的旧数据"""
         cutoff = float(current_time) - self.lookback_seconds
-        while self.history and self.history[0][0] < cutoff:
-            self.history.popleft()
+        history = self._history
+        while history and history[0][0] < cutoff:
+            self._remove(history.popleft()[1])
+        if self._ops >= self.RECENTER_EVERY:
+            self._recompute()
+    
+    def stats(self) -> tuple[float, float]:
+        """当前窗口的 (mean, std)，O(1)"""
+        n = self._count
+        if n <= 0:
+            return 0.0, 0.0
+        m = self._sum / n
+        variance = max(self._sumsq / n - m * m, 0.0)
+        return self._shift + m, variance ** 0.5
     
     def normalize(self, score: float, timestamp: Optional[float] = None) -> tuple[float, dict[str, Any]]:
         """
@@ -367,11 +674,8 @@ class AdaptiveScoreNormalizer:
                 'raw_score': float(score),
             }
         
-        # 计算均值和标准差
-        scores = [s for _, s in self.history]
-        mean = sum(scores) / len(scores)
-        variance = sum((s - mean) ** 2 for s in scores) / len(scores)
-        std = variance ** 0.5
+        # 均值和标准差（维护的累加和，O(1)）
+        mean, std = self.stats()
         
         # 避免除零
         if std < 1e-9:
@@ -392,23 +696,29 @@ class AdaptiveScoreNormalizer:
         """
         持久化normalizer状态到文件。
         
+        快照 + 追加日志（见 cex_state_journal）：通常只把上次保存后新增的样本
+        追加到 {path}.journal；journal过长或状态被整体替换时才原子重写快照。
+        
         Args:
             path: 保存路径（.pkl文件）
         """
-        path.parent.mkdir(parents=True, exist_ok=True)
-        state = {
-            'lookback_seconds': self.lookback_seconds,
-            'min_samples': self.min_samples,
-            'history': list(self.history),  # deque -> list for pickle
-            'saved_at': time.time(),
-        }
-        with open(path, 'wb') as f:
-            pickle.dump(state, f)
+        path = Path(path)
+        journal = self._journal
+        if journal is None or journal.snapshot_path != path:
+            journal = self._journal = HistoryJournal(path)
+        if journal.dirty or journal.needs_compaction(len(self.history)) or not journal.append(self._unsaved):
+            journal.write_snapshot({
+                'lookback_seconds': self.lookback_seconds,
+                'min_samples': self.min_samples,
+                'history': list(self.history),  # deque -> list for pickle
+                'saved_at': time.time(),
+            })
+        self._unsaved = []
     
     @classmethod
     def load_state(cls, path: Path) -> Optional['AdaptiveScoreNormalizer']:
         """
-        从文件恢复normalizer状态。
+        从文件恢复normalizer状态（快照 + journal；兼容旧的单个pickle文件）。
         
         Args:
             path: 加载路径（.pkl文件）
@@ -420,8 +730,10 @@ class AdaptiveScoreNormalizer:
             return None
         
         try:
-            with open(path, 'rb') as f:
-                state = pickle.load(f)
+            journal = HistoryJournal(path)
+            state = journal.load()
+            if state is None:
+                return None
             
             normalizer = cls(
                 lookback_seconds=int(state['lookback_seconds']),
@@ -434,6 +746,7 @@ class AdaptiveScoreNormalizer:
                 except Exception:
                     continue
             normalizer.history = deque(hist)
+            normalizer._journal = journal
 
             # 清理过期数据
             normalizer._cleanup(_normalize_ts(time.time()))
@@ -443,120 +756,74 @@ class AdaptiveScoreNormalizer:
             return None
 
 
-def _chainlink_cache_path(cache_dir: Path, feed_id: str, time_range: str) -> Path:
-    safe_feed = feed_id.replace("0x", "")[-12:]
-    return cache_dir / f"chainlink_stream_{safe_feed}_{time_range}.json"
+class RobustScoreNormalizer(AdaptiveScoreNormalizer):
+    """
+    稳健版本：中心用滚动中位数，尺度用 1.4826 * MAD（正态分布下与标准差一致），
+    不会被爆仓时的 imbalance 尖峰拉偏。
 
+    回溯窗口、min_samples、update/normalize 接口和持久化（快照 + journal）与
+    AdaptiveScoreNormalizer 相同；stats() 及 normalize() 返回的 mean/std 即
+    median / 1.4826*MAD。窗口内的值保存在 SortedBuckets（cex_order_stats）中。
+    """
 
-def _load_chainlink_cache(path: Path, *, max_age_s: float) -> Optional[list[dict[str, Any]]]:
-    try:
-        if not path.exists():
-            return None
-        with path.open("r", encoding="utf-8") as f:
-            payload = json.load(f)
-        fetched_at = float(payload.get("fetched_at") or 0.0)
-        if (time.time() - fetched_at) > float(max_age_s):
-            return None
-        nodes = payload.get("nodes")
-        if isinstance(nodes, list):
-            return nodes
-    except Exception:
-        return None
-    return None
+    MAD_SCALE = 1.4826
 
+    def _recompute(self) -> None:
+        self._sorted = SortedBuckets(s for _, s in self._history)
+        self._ops = 0
 
-def _save_chainlink_cache(path: Path, nodes: list[dict[str, Any]]) -> None:
-    try:
-        path.parent.mkdir(parents=True, exist_ok=True)
-        with path.open("w", encoding="utf-8") as f:
-            json.dump({"fetched_at": time.time(), "nodes": nodes}, f)
-    except Exception:
-        return
+    def _add(self, score: float) -> None:
+        self._sorted.add(score)
+
+    def _remove(self, score: float) -> None:
+        self._sorted.remove(score)
 
+    def stats(self) -> tuple[float, float]:
+        """当前窗口的 (median, 1.4826*MAD)"""
+        if not len(self._sorted):
+            return 0.0, 0.0
+        median = self._sorted.median()
+        return median, self.MAD_SCALE * self._sorted.median_abs_deviation(median)
 
-def _extract_chainlink_nodes(payload: dict[str, Any]) -> list[dict[str, Any]]:
-    data = payload.get("data") or {}
-    if not isinstance(data, dict):
-        return []
-    for _, val in data.items():
-        if isinstance(val, dict):
-            nodes = val.get("nodes")
-            if isinstance(nodes, list):
-                return nodes
-    return []
 
+NORMALIZER_METHODS: dict[str, type[AdaptiveScoreNormalizer]] = {
+    "zscore": AdaptiveScoreNormalizer,
+    "robust": RobustScoreNormalizer,
+}
 
-def _fetch_chainlink_history(
+
+def _normalizer_cache_name(symbol: str, method: str = "zscore", suffix: str = "") -> str:
+    """normalizer 缓存文件名；zscore 保持原有文件名，其他方法单独一个文件"""
+    tag = f"_{suffix}" if suffix else ""
+    method_tag = "" if method == "zscore" else f"_{method}"
+    return f"cex_normalizer_{symbol}{tag}{method_tag}.pkl"
+
+
+def _chainlink_store_for(
     *,
     feed_id: str,
     time_range: str,
     cache_dir: Optional[Path],
-    max_age_s: float = 300.0,
-    timeout_s: float = 1.5,
-) -> list[dict[str, Any]]:
-    cache_key = f"{feed_id}:{time_range}"
-    now = time.time()
-    cached = _CHAINLINK_CACHE.get(cache_key)
-    if cached and (now - float(cached.get("fetched_at") or 0.0) <= float(max_age_s)):
-        nodes = cached.get("nodes")
-        if isinstance(nodes, list):
-            return nodes
+    api_base: Optional[str] = None,
+) -> ChainlinkHistoryStore:
     cache_root = Path(cache_dir) if cache_dir else Path(".cache")
-    cache_path = _chainlink_cache_path(cache_root, feed_id, time_range)
-    disk_nodes = _load_chainlink_cache(cache_path, max_age_s=max_age_s)
-    if isinstance(disk_nodes, list):
-        _CHAINLINK_CACHE[cache_key] = {"fetched_at": now, "nodes": disk_nodes}
-        return disk_nodes
-    url = "https://data.chain.link/api/historical-stream-data?" + urllib.parse.urlencode(
-        {"feedId": feed_id, "timeRange": time_range}
-    )
-    req = urllib.request.Request(url, headers={"User-Agent": "Mozilla/5.0"})
-    try:
-        with urllib.request.urlopen(req, timeout=float(timeout_s)) as resp:
-            payload = json.loads(resp.read().decode("utf-8", errors="replace"))
-    except Exception:
-        return disk_nodes or []
-    nodes = _extract_chainlink_nodes(payload)
-    if isinstance(nodes, list):
-        _save_chainlink_cache(cache_path, nodes)
-        _CHAINLINK_CACHE[cache_key] = {"fetched_at": now, "nodes": nodes}
-        return nodes
-    return []
-
-
-def _parse_chainlink_nodes(nodes: list[dict[str, Any]]) -> list[tuple[float, float]]:
-    out: list[tuple[float, float]] = []
-    for node in nodes:
-        tb = node.get("timeBucket")
-        mid = node.get("mid")
-        if not tb or mid is None:
-            continue
-        try:
-            ts = datetime.fromisoformat(str(tb).replace("Z", "+00:00")).timestamp()
-            price = float(mid) / 1e18
-        except Exception:
-            continue
-        out.append((float(ts), float(price)))
-    out.sort(key=lambda x: x[0])
-    return out
+    cache_key = f"{feed_id}:{time_range}:{cache_root.resolve()}:{api_base or ''}"
+    store = _CHAINLINK_CACHE.get(cache_key)
+    if store is None:
+        store = ChainlinkHistoryStore(feed_id, time_range, cache_dir=cache_root, api_base=api_base)
+        _CHAINLINK_CACHE[cache_key] = store
+    return store
 
 
-def _recent_chainlink_offsets(nodes: list[dict[str, Any]], *, n_windows: int) -> list[float]:
-    points = _parse_chainlink_nodes(nodes)
-    offsets: list[float] = []
-    for i in range(len(points) - 1):
-        t0, p0 = points[i]
-        t1, p1 = points[i + 1]
-        dt = float(t1 - t0)
-        if dt < 600.0 or dt > 1200.0:
-            continue
-        offsets.append(abs(float(p1) - float(p0)))
-    if n_windows <= 0:
-        return offsets
-    return offsets[-int(n_windows) :]
+class SignalOptimizer:
+    """
+    动态衰减：mu = clip(multiplier * median(最近 N_windows 个窗口偏移), min_mu, max_mu)
 
+    长期持有一个实例：偏移按到达顺序放在 deque 中，同时维护一个有序列表
+    （bisect 插入/删除），中位数直接按下标取；mu 只在偏移变化时重新计算。
+    偏移每个窗口（15m/1h）才变化一次，逐样本调用 dynamic_decay 只做一次 exp。
+    """
 
-class SignalOptimizer:
     def __init__(
         self,
         *,
@@ -575,31 +842,105 @@ class SignalOptimizer:
         self.min_mu = float(min_mu)
         self.max_mu = float(max_mu)
         self.N_windows = int(N_windows)
-        self.historical_offsets: list[float] = []
+        self._offsets: deque[float] = deque()
+        self._sorted: list[float] = []
+        self._mu: Optional[float] = None
+
+    @property
+    def historical_offsets(self) -> list[float]:
+        return list(self._offsets)
+
+    @historical_offsets.setter
+    def historical_offsets(self, value: list[float]) -> None:
+        self.set_historical_offsets(value)
+
+    @property
+    def sorted_offsets(self) -> list[float]:
+        return self._sorted
+
+    def add_offset(self, offset: float) -> None:
+        """一个窗口结束：追加其偏移，超出 N_windows 时淘汰最早的"""
+        x = abs(float(offset))
+        self._offsets.append(x)
+        bisect.insort(self._sorted, x)
+        if self.N_windows > 0:
+            while len(self._offsets) > self.N_windows:
+                old = self._offsets.popleft()
+                del self._sorted[bisect.bisect_left(self._sorted, old)]
+        self._mu = None
 
     def set_historical_offsets(self, offsets: list[float]) -> None:
         trimmed = [abs(float(x)) for x in offsets]
         if self.N_windows > 0:
             trimmed = trimmed[-int(self.N_windows) :]
-        self.historical_offsets = trimmed
+        if len(trimmed) == len(self._offsets) and all(a == b for a, b in zip(trimmed, self._offsets)):
+            return
+        self._offsets = deque(trimmed)
+        self._sorted = sorted(trimmed)
+        self._mu = None
 
     def compute_dynamic_mu(self) -> float:
-        if not self.historical_offsets:
-            return 20.0
-        base_mu = float(statistics.median(self.historical_offsets))
-        final_mu = max(self.min_mu, min(self.max_mu, self.multiplier * base_mu))
-        return float(final_mu)
+        if self._mu is not None:
+            return self._mu
+        xs = self._sorted
+        n = len(xs)
+        if not n:
+            self._mu = 20.0
+            return self._mu
+        mid = n // 2
+        base_mu = float(xs[mid]) if n % 2 else (xs[mid - 1] + xs[mid]) / 2.0
+        self._mu = float(max(self.min_mu, min(self.max_mu, self.multiplier * base_mu)))
+        return self._mu
 
     def dynamic_decay(self, elapsed_time: float, cum_change: float) -> float:
         abs_delta = abs(float(cum_change))
         mu = self.compute_dynamic_mu()
         try:
-            g_delta = 1.0 / (1.0 + math.exp(-(abs_delta - mu) / float(self.sigma)))
+            g_delta = 1.0 / (1.0 + math.exp(-(abs_delta - mu) / self.sigma))
         except OverflowError:
             g_delta = 1.0 if abs_delta > mu else 0.0
-        effective_lambda = float(self.lambda_base) * float(g_delta)
+        effective_lambda = self.lambda_base * g_delta
         return math.exp(-effective_lambda * float(elapsed_time))
 
+    def save_state(self, path: Path) -> None:
+        """保存窗口偏移（JSON，原子写入）；重启后 mu 立即可用"""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(path.name + ".tmp")
+        with tmp.open("w", encoding="utf-8") as f:
+            json.dump({"N_windows": self.N_windows, "offsets": list(self._offsets), "saved_at": time.time()}, f)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load_state(cls, path: Path, **params: Any) -> Optional['SignalOptimizer']:
+        """
+        读取保存的偏移；参数（T、sigma 等）以调用方传入的为准
+
+        文件不存在或损坏时返回None。
+        """
+        try:
+            with Path(path).open("r", encoding="utf-8") as f:
+                state = json.load(f)
+            offsets = [float(x) for x in state.get("offsets") or []]
+        except Exception:
+            return None
+        optimizer = cls(**params)
+        optimizer.set_historical_offsets(offsets)
+        return optimizer
+
+
+def _record_score_timings(path: Path, stages: dict[str, float]) -> None:
+    """记录一次 score_cex 的分阶段耗时（stages 含 total）；不逐次输出日志"""
+    for name, seconds in stages.items():
+        METRICS.observe(f"score_cex.{name}", seconds)
+    _TIMING_LOG.tick(
+        stages["total"],
+        detail=lambda: f"path={path} " + " ".join(f"{k}_s={v:.3f}" for k, v in stages.items() if k != "total"),
+    )
+
+
+_OPTIMIZER_CACHE: dict[tuple, SignalOptimizer] = {}
+
 
 def score_cex(
     csv_path: Path,
@@ -609,6 +950,7 @@ def score_cex(
     weights_by_venue: Optional[dict[str, float]] = None,
     tail_bytes: int = 16_384,
     use_normalization: bool = True,
+    normalizer_method: str = "zscore",
     lookback_seconds: int = 7200,
     normalizer_cache_dir: Optional[Path] = None,
     symbol: str = "btc",
@@ -619,6 +961,7 @@ def score_cex(
     chainlink_time_range: str = "1W",
     chainlink_cache_dir: Optional[Path] = None,
     chainlink_cache_max_age_s: float = 300.0,
+    chainlink_api_base: Optional[str] = None,
     decay_T: float = 15.0,
     decay_lambda_base: float = 0.22,
     decay_sigma: float = 11.0,
@@ -631,7 +974,8 @@ def score_cex(
     CEX 打分器壳：输入 live CSV + 参数（权重等）→ 输出单一 float score。
 
     说明：
-    - 当前实现为了与旧脚本行为一致，默认复用 `trade/polymarket_live_run_current_window.py` 的尾部扫描逻辑。
+    - 取“最后一个 venues 齐全的 sample_id”，与旧脚本的尾部扫描语义一致；每个CSV路径缓存一个
+      IncrementalSignalReader，首次读取尾部 tail_bytes，之后每次调用只解析新追加的字节。
     - 另一个 agent 可以把这里替换为更复杂的预测/聚合模型，但对外仍保持 `float` 输出。
     
     Args:
@@ -639,8 +983,9 @@ def score_cex(
         venues: 交易所列表
         weights: 对应的权重列表
         weights_by_venue: venue -> weight的字典（优先级高于venues/weights）
-        tail_bytes: 读取CSV尾部的字节数
+        tail_bytes: 首次读取CSV尾部的字节数（之后增量读取）
         use_normalization: 是否使用Z-score标准化，默认True（推荐）
+        normalizer_method: "zscore"（均值/标准差）或 "robust"（滚动中位数/MAD，见 RobustScoreNormalizer）
         lookback_seconds: 标准化回溯窗口（秒），默认7200（2小时）
         normalizer_cache_dir: cache目录，默认为workspace/.cache
         symbol: 交易品种（用于cache文件命名），默认"btc"
@@ -650,7 +995,8 @@ def score_cex(
         chainlink_feed_id: Chainlink feedId（用于历史偏移）
         chainlink_time_range: Chainlink timeRange（如 1W）
         chainlink_cache_dir: Chainlink 缓存目录
-        chainlink_cache_max_age_s: Chainlink 缓存最大年龄（秒）
+        chainlink_cache_max_age_s: Chainlink 缓存最大年龄（秒），过期后增量拉取
+        chainlink_api_base: Chainlink 接口地址，默认 CHAINLINK_API_BASE（环境变量）
         decay_T: 窗口总时长（分钟）
         decay_lambda_base: 基础衰减率
         decay_sigma: 偏移过渡宽度
@@ -663,202 +1009,493 @@ def score_cex(
         标准化后的score（如果use_normalization=True），否则返回原始score。
         当 return_meta=True 时，返回 CexScoreResult，包含 z_eff 与 extra_factor。
     """
+    global _METRICS_SERVER_CHECKED
     t0 = time.perf_counter()
+    if not _METRICS_SERVER_CHECKED:
+        _METRICS_SERVER_CHECKED = True
+        start_metrics_server_from_env()
     p = Path(csv_path)
-    
-    # 如果指定路径不存在，尝试从real_hot/自动查找当前12小时分片
-    if not p.exists():
-        p = _auto_detect_cex_slice(symbol)
+    # 每条返回路径（含提前返回和异常）都记录 load_signal 与 total
+    timings: dict[str, float] = {}
+    try:
+        # 如果指定路径不存在，尝试从real_hot/自动查找当前12小时分片
         if not p.exists():
-            return 0.0
+            p = _auto_detect_cex_slice(symbol)
+            if not p.exists():
+                return 0.0
 
-    if weights_by_venue is not None:
-        venues2 = list(weights_by_venue.keys())
-        weights2 = [float(weights_by_venue[v]) for v in venues2]
-    else:
-        venues2 = list(venues or ["binance_spot", "okx_spot", "okx_swap", "bybit_spot", "bybit_linear"])
-        weights2 = list(weights or [1.0, 1.0, 2.0, 2.0, 3.0])
-    if len(venues2) != len(weights2):
-        return 0.0
+        if weights_by_venue is not None:
+            venues2 = list(weights_by_venue.keys())
+            weights2 = [float(weights_by_venue[v]) for v in venues2]
+        else:
+            venues2 = list(venues or ["binance_spot", "okx_spot", "okx_swap", "bybit_spot", "bybit_linear"])
+            weights2 = list(weights or [1.0, 1.0, 2.0, 2.0, 3.0])
+        if len(venues2) != len(weights2):
+            return 0.0
 
-    # 复用旧脚本的"最后一个 sample_id 且 venues 齐全"的取样逻辑
-    try:
-        from polymarket_live_one_trade import load_latest_complete_cex_signal  # type: ignore
-    except Exception:
+        # "最后一个 sample_id 且 venues 齐全"的取样：每个CSV一个增量reader，只解析新追加的字节
+        t1 = time.perf_counter()
         try:
-            from trade.polymarket_live_run_current_window import load_latest_complete_cex_signal  # type: ignore
+            reader = _signal_reader_for(p, venues=venues2, weights=weights2, tail_bytes=int(tail_bytes))
+            reader.poll()
+        except (OSError, ValueError) as e:
+            print(f"[cex] signal reader: 读取失败 path={p} {type(e).__name__}:{e}", flush=True)
+            return 0.0
+        sig = reader.latest
+        t2 = time.perf_counter()
+        timings["load_signal"] = t2 - t1
+        if sig is None:
+            return 0.0
+    
+        try:
+            raw_score = float(sig.score)
         except Exception:
             return 0.0
-
-    t1 = time.perf_counter()
-    sig = load_latest_complete_cex_signal(
-        p,
-        venues=venues2,
-        weights=weights2,
-        min_abs_score=0.0,
-        tail_bytes=int(tail_bytes),
-    )
-    t2 = time.perf_counter()
-    if sig is None:
-        print(
-            f"[cex] timing path={p} load_signal_s={t2 - t1:.3f} total_s={t2 - t0:.3f}",
-            flush=True,
-        )
-        return 0.0
     
-    try:
-        raw_score = float(sig.score)
-    except Exception:
-        return 0.0
+        # 如果不使用标准化，直接返回原始score
+        if not use_normalization:
+            if return_meta:
+                return CexScoreResult(
+                    score=float(raw_score),
+                    meta={"z_score": float(raw_score), "extra_factor": 1.0, "z_eff": float(raw_score)},
+                )
+            return float(raw_score)
     
-    # 如果不使用标准化，直接返回原始score
-    if not use_normalization:
-        if return_meta:
-            return CexScoreResult(
-                score=float(raw_score),
-                meta={"z_score": float(raw_score), "extra_factor": 1.0, "z_eff": float(raw_score)},
+        # 使用标准化
+        normalizer_cls = NORMALIZER_METHODS.get(str(normalizer_method))
+        if normalizer_cls is None:
+            raise ValueError(f"unknown normalizer_method {normalizer_method!r} (expected one of {list(NORMALIZER_METHODS)})")
+        cache_dir = Path(normalizer_cache_dir) if normalizer_cache_dir else Path(".cache")
+        cache_file = cache_dir / _normalizer_cache_name(symbol, str(normalizer_method))
+
+        csv_key = str(p.resolve()) if p.exists() else str(p)
+        if csv_key not in _LOGGED_CSV:
+            print(
+                f"[cex] 使用CSV={csv_key} tail_bytes={int(tail_bytes)} lookback_s={int(lookback_seconds)} normalize={bool(use_normalization)}",
+                flush=True,
             )
-        return float(raw_score)
+            _LOGGED_CSV.add(csv_key)
     
-    # 使用标准化
-    cache_dir = Path(normalizer_cache_dir) if normalizer_cache_dir else Path(".cache")
-    cache_file = cache_dir / f"cex_normalizer_{symbol}.pkl"
-
-    csv_key = str(p.resolve()) if p.exists() else str(p)
-    if csv_key not in _LOGGED_CSV:
-        print(
-            f"[cex] 使用CSV={csv_key} tail_bytes={int(tail_bytes)} lookback_s={int(lookback_seconds)} normalize={bool(use_normalization)}",
-            flush=True,
-        )
-        _LOGGED_CSV.add(csv_key)
-    
-    cache_key = str(cache_file.resolve())
-    normalizer = _NORMALIZER_CACHE.get(cache_key)
-    reused_from_memory = normalizer is not None
-    loaded_from_disk = False
-    created_new = False
-    if normalizer is None:
-        normalizer = AdaptiveScoreNormalizer.load_state(cache_file)
-        if normalizer is not None:
-            loaded_from_disk = True
-        else:
-            normalizer = AdaptiveScoreNormalizer(
-                lookback_seconds=int(lookback_seconds),
-                min_samples=100
+        cache_key = str(cache_file.resolve())
+        normalizer = _NORMALIZER_CACHE.get(cache_key)
+        reused_from_memory = normalizer is not None
+        loaded_from_disk = False
+        created_new = False
+        if normalizer is None:
+            normalizer = normalizer_cls.load_state(cache_file)
+            if normalizer is not None:
+                loaded_from_disk = True
+            else:
+                normalizer = normalizer_cls(
+                    lookback_seconds=int(lookback_seconds),
+                    min_samples=100
+                )
+                created_new = True
+            _NORMALIZER_CACHE[cache_key] = normalizer
+        if cache_key not in _LOGGED_NORMALIZER:
+            try:
+                n_samples = len(normalizer.history)
+            except Exception:
+                n_samples = 0
+            print(
+                f"[cex] normalizer_cache={cache_key} reused_mem={bool(reused_from_memory)} loaded_disk={bool(loaded_from_disk)} "
+                f"created_new={bool(created_new)} n_samples={int(n_samples)} lookback_s={int(lookback_seconds)} "
+                f"min_samples={int(getattr(normalizer,'min_samples',100))}",
+                flush=True,
             )
-            created_new = True
-        _NORMALIZER_CACHE[cache_key] = normalizer
-    if cache_key not in _LOGGED_NORMALIZER:
+            if created_new:
+                print("[cex] normalizer 初始化为空，样本不足时将暂停交易（不会使用 raw_score）", flush=True)
+            _LOGGED_NORMALIZER.add(cache_key)
+    
+        # 获取当前时间戳
         try:
-            n_samples = len(normalizer.history)
+            timestamp = float(sig.t)
         except Exception:
-            n_samples = 0
-        print(
-            f"[cex] normalizer_cache={cache_key} reused_mem={bool(reused_from_memory)} loaded_disk={bool(loaded_from_disk)} "
-            f"created_new={bool(created_new)} n_samples={int(n_samples)} lookback_s={int(lookback_seconds)} "
-            f"min_samples={int(getattr(normalizer,'min_samples',100))}",
-            flush=True,
-        )
-        if created_new:
-            print("[cex] normalizer 初始化为空，样本不足时将暂停交易（不会使用 raw_score）", flush=True)
-        _LOGGED_NORMALIZER.add(cache_key)
+            timestamp = time.time()
     
-    # 获取当前时间戳
-    try:
-        timestamp = float(sig.t)
-    except Exception:
-        timestamp = time.time()
+        # 确保近 2 小时缓存已补齐（永远不使用 raw）
+        warmup_key = f"{cache_key}:{int(lookback_seconds)}"
+        if warmup_key not in _WARMUP_DONE and _needs_warmup(normalizer, now_ts=float(timestamp)):
+            tw = time.perf_counter()
+            print("[cex] warmup: 检测到缓存不足，开始补齐近 2 小时数据 ...", flush=True)
+            try:
+                _warmup_normalizer_from_csv(
+                    csv_path=p,
+                    normalizer=normalizer,
+                    venues=venues2,
+                    weights=weights2,
+                    lookback_seconds=int(lookback_seconds),
+                    now_ts=float(timestamp),
+                )
+            except Exception as e:
+                print(f"[cex] warmup: 失败 {type(e).__name__}:{e}", flush=True)
+            _WARMUP_DONE.add(warmup_key)
+            timings["warmup"] = time.perf_counter() - tw
+
+        # 更新历史并标准化
+        tn = time.perf_counter()
+        normalizer.update(raw_score, timestamp)
+        normalized_score, stats = normalizer.normalize(raw_score, timestamp)
+        t3 = time.perf_counter()
+        timings["normalize"] = t3 - tn
+
+        # 若样本仍不足，返回 0（避免 raw）
+        if not bool(stats.get("is_normalized")):
+            print(f"[cex] warn: 样本不足(n={int(stats.get('n_samples') or 0)}), 暂不交易", flush=True)
+            try:
+                normalizer.save_state(cache_file)
+            except Exception:
+                pass
+            t4 = time.perf_counter()
+            timings["save"] = t4 - t3
+            if return_meta:
+                return CexScoreResult(score=0.0, meta={"z_score": 0.0, "extra_factor": 0.0, "z_eff": 0.0})
+            return 0.0
     
-    # 确保近 2 小时缓存已补齐（永远不使用 raw）
-    warmup_key = f"{cache_key}:{int(lookback_seconds)}"
-    if warmup_key not in _WARMUP_DONE and _needs_warmup(normalizer, now_ts=float(timestamp)):
-        print("[cex] warmup: 检测到缓存不足，开始补齐近 2 小时数据 ...", flush=True)
-        try:
-            _warmup_normalizer_from_csv(
-                csv_path=p,
-                normalizer=normalizer,
-                venues=venues2,
-                weights=weights2,
-                lookback_seconds=int(lookback_seconds),
-                now_ts=float(timestamp),
-            )
-        except Exception as e:
-            print(f"[cex] warmup: 失败 {type(e).__name__}:{e}", flush=True)
-        _WARMUP_DONE.add(warmup_key)
-
-    # 更新历史并标准化
-    normalizer.update(raw_score, timestamp)
-    normalized_score, stats = normalizer.normalize(raw_score, timestamp)
-    t3 = time.perf_counter()
-
-    # 若样本仍不足，返回 0（避免 raw）
-    if not bool(stats.get("is_normalized")):
-        print(f"[cex] warn: 样本不足(n={int(stats.get('n_samples') or 0)}), 暂不交易", flush=True)
+        # 保存状态
         try:
             normalizer.save_state(cache_file)
         except Exception:
-            pass
-        if return_meta:
-            return CexScoreResult(score=0.0, meta={"z_score": 0.0, "extra_factor": 0.0, "z_eff": 0.0})
-        return 0.0
+            pass  # 保存失败不影响返回结果
+        t4 = time.perf_counter()
+        timings["save"] = t4 - t3
     
-    # 保存状态
-    try:
-        normalizer.save_state(cache_file)
-    except Exception:
-        pass  # 保存失败不影响返回结果
-    t4 = time.perf_counter()
-    
-    extra_factor = 1.0
-    mu_val: Optional[float] = None
-    offsets_n = 0
-    if elapsed_time_min is not None and cum_change is not None:
-        nodes = _fetch_chainlink_history(
-            feed_id=str(chainlink_feed_id),
-            time_range=str(chainlink_time_range),
-            cache_dir=chainlink_cache_dir or normalizer_cache_dir,
-            max_age_s=float(chainlink_cache_max_age_s),
-        )
-        offsets = _recent_chainlink_offsets(nodes, n_windows=int(decay_N_windows))
-        offsets_n = len(offsets)
-        optimizer = SignalOptimizer(
-            T=float(decay_T),
-            lambda_base=float(decay_lambda_base),
-            sigma=float(decay_sigma),
-            multiplier=float(decay_multiplier),
-            min_mu=float(decay_min_mu),
-            max_mu=float(decay_max_mu),
-            N_windows=int(decay_N_windows),
-        )
-        optimizer.set_historical_offsets(offsets)
-        mu_val = optimizer.compute_dynamic_mu()
-        extra_factor = optimizer.dynamic_decay(float(elapsed_time_min), float(cum_change))
-    z_eff = float(normalized_score) * float(extra_factor)
-
-    if return_meta:
-        meta = dict(stats or {})
-        meta.update(
-            {
-                "z_score": float(normalized_score),
-                "extra_factor": float(extra_factor),
-                "z_eff": float(z_eff),
-                "mu": float(mu_val) if mu_val is not None else None,
-                "offsets_n": int(offsets_n),
-            }
-        )
-        print(
-            f"[cex] timing path={p} load_signal_s={t2 - t1:.3f} "
-            f"normalize_s={t3 - t2:.3f} save_s={t4 - t3:.3f} total_s={t4 - t0:.3f}",
-            flush=True,
-        )
-        return CexScoreResult(score=float(normalized_score), meta=meta)
+        extra_factor = 1.0
+        mu_val: Optional[float] = None
+        offsets_n = 0
+        if elapsed_time_min is not None and cum_change is not None:
+            store = _chainlink_store_for(
+                feed_id=str(chainlink_feed_id),
+                time_range=str(chainlink_time_range),
+                cache_dir=chainlink_cache_dir or normalizer_cache_dir,
+                api_base=chainlink_api_base,
+            )
+            store.refresh(max_age_s=float(chainlink_cache_max_age_s))
+            offsets = store.recent_offsets(int(decay_N_windows))
+            offsets_n = len(offsets)
+            params = (
+                float(decay_T), float(decay_lambda_base), float(decay_sigma), float(decay_multiplier),
+                float(decay_min_mu), float(decay_max_mu), int(decay_N_windows),
+            )
+            optimizer = _OPTIMIZER_CACHE.get(params)
+            if optimizer is None:
+                optimizer = SignalOptimizer(
+                    T=params[0],
+                    lambda_base=params[1],
+                    sigma=params[2],
+                    multiplier=params[3],
+                    min_mu=params[4],
+                    max_mu=params[5],
+                    N_windows=params[6],
+                )
+                _OPTIMIZER_CACHE[params] = optimizer
+            # 偏移未变化时保留缓存的 mu
+            optimizer.set_historical_offsets(offsets)
+            mu_val = optimizer.compute_dynamic_mu()
+            extra_factor = optimizer.dynamic_decay(float(elapsed_time_min), float(cum_change))
+            timings["chainlink"] = time.perf_counter() - t4
+        z_eff = float(normalized_score) * float(extra_factor)
 
-    print(
-        f"[cex] timing path={p} load_signal_s={t2 - t1:.3f} "
-        f"normalize_s={t3 - t2:.3f} save_s={t4 - t3:.3f} total_s={t4 - t0:.3f}",
-        flush=True,
+        if return_meta:
+            meta = dict(stats or {})
+            meta.update(
+                {
+                    "z_score": float(normalized_score),
+                    "extra_factor": float(extra_factor),
+                    "z_eff": float(z_eff),
+                    "mu": float(mu_val) if mu_val is not None else None,
+                    "offsets_n": int(offsets_n),
+                }
+            )
+            return CexScoreResult(score=float(normalized_score), meta=meta)
+
+        return float(normalized_score)
+    finally:
+        # 在取到信号之前就返回：到此为止的耗时都算作 load_signal
+        timings.setdefault("load_signal", time.perf_counter() - t0)
+        timings["total"] = time.perf_counter() - t0
+        _record_score_timings(p, timings)
+
+
+@dataclass
+class CexBatchResult:
+    """score_cex_batch 的结果：按时间排序、等长的 NumPy 数组；样本不足处 z_score/z_eff 为 NaN"""
+    t: Any
+    raw_score: Any
+    z_score: Any
+    z_eff: Any
+    decay: Any
+    n_samples: Any
+
+
+def _slices_in_range(hot_dir: Path, symbol: str, start_ts: float, end_ts: float) -> list[Path]:
+    out: list[Path] = []
+    t = float(start_ts) // 43200 * 43200
+    while t <= float(end_ts):
+        path = slice_path_for(hot_dir, symbol, t)
+        if path.exists():
+            out.append(path)
+        t += 43200
+    return out
+
+
+def _batch_signals(
+    slices: list[Path],
+    *,
+    venues: list[str],
+    weights: list[float],
+    workers: Optional[int] = None,
+) -> list[tuple[float, float]]:
+    """各切片的完整信号（已关闭的切片走信号缓存，未命中的并行解析）"""
+    now = time.time()
+    per_slice: dict[Path, list[tuple[float, float]]] = {}
+    misses: list[Path] = []
+    for path in slices:
+        if not is_closed_slice(path, now):
+            per_slice[path] = _complete_signals_from_file(path, venues=venues, weights=weights)
+            continue
+        cached = _SIGNAL_CACHE.lookup(path, venues=venues, weights=weights)
+        if cached is None:
+            misses.append(path)
+        else:
+            per_slice[path] = cached
+    if misses:
+        per_slice.update(_parse_closed_slices(misses, venues=venues, weights=weights, workers=workers))
+    return [sig for path in slices for sig in per_slice.get(path, [])]
+
+
+def _slice_prices(path: Path, *, venue: str) -> list[tuple[float, float]]:
+    """录制的 venue 价格 [(t, mid)]；已关闭的切片缓存为 sidecar（价格缓存单独一个目录）"""
+    compute = lambda: read_venue_prices(path, venue=venue)  # noqa: E731
+    if not is_closed_slice(path, time.time()):
+        return compute()
+    return _PRICE_CACHE.get(path, venues=[venue], weights=[], compute=compute)
+
+
+def _rolling_zscore(t: Any, raw: Any, *, left: Any, min_samples: int) -> tuple[Any, Any]:
+    """
+    滚动 z-score：left[i] 为窗口 [t_i - lookback, t_i] 的起始下标；返回 (z, 窗口样本数)
+
+    平移后的前缀和（平移量取整体均值，避免方差公式的相消误差），总体标准差，
+    std<1e-9 时 z=0，样本数不足 min_samples 时为 NaN。
+    """
+    import numpy as np
+
+    n_all = raw.size
+    idx = np.arange(n_all)
+    n = idx + 1 - left
+    shift = float(raw.mean()) if n_all else 0.0
+    d = raw - shift
+    c1 = np.concatenate(([0.0], np.cumsum(d)))
+    c2 = np.concatenate(([0.0], np.cumsum(d * d)))
+    m = (c1[idx + 1] - c1[left]) / np.maximum(n, 1)
+    var = np.maximum((c2[idx + 1] - c2[left]) / np.maximum(n, 1) - m * m, 0.0)
+    std = np.sqrt(var)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        z = np.where(std < 1e-9, 0.0, (raw - (shift + m)) / std)
+    return np.where(n >= int(min_samples), z, np.nan), n
+
+
+def _decay_inputs(t: Any, normalized: Any, p_t: Any, p_v: Any, *, window: str) -> dict[str, Any]:
+    """
+    衰减因子中与参数无关的部分（与 daemon 一致）：
+
+        idx      有衰减因子的样本下标（已标准化且有价格）
+        win      每个样本所属窗口的序号（只对含已标准化样本的窗口编号）
+        cum      |当前价格 - 窗口起始价|（未做 <=0 的回退）
+        elapsed  窗口内已过时间（分钟）
+        has_ok   每个窗口是否有价格（没有价格的窗口仍会把上一个偏移交给 optimizer）
+        last_cum 每个窗口最后一个样本的 cum
+
+    当前价格取不晚于 t 的最近一个录制价格，窗口起始价取窗口内第一个价格。
+    """
+    import numpy as np
+
+    idx_parts: list[Any] = []
+    win_parts: list[Any] = []
+    cum_parts: list[Any] = []
+    elapsed_parts: list[Any] = []
+    has_ok: list[bool] = []
+    last_cum: list[float] = []
+    n_all = t.size
+    if p_t.size and n_all:
+        size = 3600.0 if window == "1h" else 900.0
+        ws = np.floor(t / size) * size
+        cur_i = np.searchsorted(p_t, t, side="right") - 1
+        bounds = np.flatnonzero(np.diff(ws)) + 1
+        for a, b in zip(np.concatenate(([0], bounds)), np.concatenate((bounds, [n_all]))):
+            sel = np.flatnonzero(normalized[a:b]) + a
+            if not sel.size:
+                continue
+            start_i = int(np.searchsorted(p_t, ws[a], side="left"))
+            ok = sel[cur_i[sel] >= 0] if start_i < p_t.size else sel[:0]
+            has_ok.append(bool(ok.size))
+            if not ok.size:
+                # 没有价格（对应 daemon 中 binance 价格获取失败）：z_eff 为 NaN
+                last_cum.append(float("nan"))
+                continue
+            cum = np.abs(p_v[cur_i[ok]] - p_v[start_i])
+            idx_parts.append(ok)
+            win_parts.append(np.full(ok.size, len(has_ok) - 1, dtype=np.int64))
+            cum_parts.append(cum)
+            elapsed_parts.append(np.maximum(0.0, (t[ok] - ws[ok]) / 60.0))
+            last_cum.append(float(cum[-1]))
+    empty_f = np.empty(0, dtype=np.float64)
+    return {
+        "idx": np.concatenate(idx_parts).astype(np.int64) if idx_parts else np.empty(0, dtype=np.int64),
+        "win": np.concatenate(win_parts) if win_parts else np.empty(0, dtype=np.int64),
+        "cum": np.concatenate(cum_parts) if cum_parts else empty_f,
+        "elapsed": np.concatenate(elapsed_parts) if elapsed_parts else empty_f,
+        "has_ok": np.array(has_ok, dtype=bool),
+        "last_cum": np.array(last_cum, dtype=np.float64),
+    }
+
+
+def _decay_from_inputs(inputs: dict[str, Any], optimizer: SignalOptimizer) -> Any:
+    """
+    由 _decay_inputs 和一组衰减参数得到 inputs["idx"] 处的衰减因子
+
+    逐窗口只在 Python 中推进 optimizer（上一窗口的偏移、cum<=0 时的回退值、mu），
+    逐样本部分整体向量化；optimizer 会被修改。
+    """
+    import numpy as np
+
+    has_ok = inputs["has_ok"]
+    last_cum = inputs["last_cum"]
+    n_win = has_ok.size
+    mu = np.empty(n_win)
+    fallback = np.empty(n_win)
+    last_cum_change: Optional[float] = None
+    for w in range(n_win):
+        if last_cum_change is not None:
+            optimizer.add_offset(last_cum_change)
+        sorted_offsets = optimizer.sorted_offsets
+        fallback[w] = sorted_offsets[0] * 0.1 if sorted_offsets else 0.01
+        mu[w] = optimizer.compute_dynamic_mu()
+        if has_ok[w]:
+            c = float(last_cum[w])
+            last_cum_change = c if c > 0.0 else float(fallback[w])
+    win = inputs["win"]
+    cum = np.where(inputs["cum"] <= 0.0, fallback[win], inputs["cum"])
+    with np.errstate(over="ignore"):
+        g = 1.0 / (1.0 + np.exp(-(cum - mu[win]) / optimizer.sigma))
+    return np.exp(-optimizer.lambda_base * g * inputs["elapsed"])
+
+
+def score_cex_batch(
+    slices: Optional[list[Path]] = None,
+    *,
+    start_ts: Optional[float] = None,
+    end_ts: Optional[float] = None,
+    hot_dir: Optional[Path] = None,
+    symbol: str = "btc",
+    venues: Optional[list[str]] = None,
+    weights: Optional[list[float]] = None,
+    weights_by_venue: Optional[dict[str, float]] = None,
+    lookback_seconds: int = 7200,
+    min_samples: int = 100,
+    window: str = "15m",
+    prices: Optional[tuple[Any, Any]] = None,
+    price_venue: str = "binance_spot",
+    decay_T: float = 15.0,
+    decay_lambda_base: float = 0.22,
+    decay_sigma: float = 11.0,
+    decay_multiplier: float = 0.6,
+    decay_min_mu: float = 8.0,
+    decay_max_mu: float = 60.0,
+    decay_N_windows: int = 20,
+    workers: Optional[int] = None,
+) -> CexBatchResult:
+    """
+    批量（回测）打分：对一段历史一次算出 raw score、滚动 z-score、衰减因子和 z_eff。
+
+    与逐样本调用 AdaptiveScoreNormalizer.update + normalize 的语义一致（窗口为
+    [t - lookback_seconds, t] 内、按时间顺序不晚于当前的样本，总体标准差，
+    std<1e-9 时 z=0，样本数不足 min_samples 时为 NaN）；衰减与 daemon 一致：
+    每个窗口（15m/1h）结束时把最后一个已标准化样本的 cum_change 作为偏移交给
+    SignalOptimizer，当前价格取不晚于 t 的最近一个录制价格，窗口起始价取窗口内第一个价格。
+
+    不读写任何 normalizer 缓存/pickle；已关闭切片的信号和价格走 sidecar 缓存。
+
+    Args:
+        slices: 切片列表；为None时按 [start_ts - lookback_seconds, end_ts] 从 hot_dir 中选取
+        start_ts / end_ts: 输出的时间范围（所选切片中更早的样本只用于补齐回溯窗口和窗口偏移）
+        hot_dir: 切片目录，默认 real_hot
+        prices: (t数组, price数组)；为None时使用切片中 price_venue 的 mid
+        workers: 解析未缓存切片的进程数（None/1=顺序解析）
+
+    Returns:
+        CexBatchResult
+    """
+    import numpy as np
+
+    if weights_by_venue is not None:
+        venues2 = list(weights_by_venue.keys())
+        weights2 = [float(weights_by_venue[v]) for v in venues2]
+    else:
+        venues2 = list(venues or ["binance_spot", "okx_spot", "okx_swap", "bybit_spot", "bybit_linear"])
+        weights2 = list(weights or [1.0, 1.0, 2.0, 2.0, 3.0])
+    if len(venues2) != len(weights2):
+        raise ValueError("venues and weights must have the same length")
+
+    lookback = float(lookback_seconds)
+    if slices is None:
+        if start_ts is None or end_ts is None:
+            raise ValueError("score_cex_batch needs slices or start_ts/end_ts")
+        slices = _slices_in_range(Path(hot_dir) if hot_dir else Path("real_hot"), symbol, float(start_ts) - lookback, float(end_ts))
+    slices = [Path(p) for p in slices]
+
+    signals = _batch_signals(slices, venues=venues2, weights=weights2, workers=workers)
+    t = np.array([x[0] for x in signals], dtype=np.float64)
+    raw = np.array([x[1] for x in signals], dtype=np.float64)
+    while t.size and (t > 1e11).any():
+        t = np.where(t > 1e11, t / 1000.0, t)
+    order = np.argsort(t, kind="stable")
+    t, raw = t[order], raw[order]
+    n_all = t.size
+
+    left = np.searchsorted(t, t - lookback, side="left")
+    z, n = _rolling_zscore(t, raw, left=left, min_samples=int(min_samples))
+    normalized = n >= int(min_samples)
+
+    # 衰减因子：逐窗口（窗口数远少于样本数）计算 mu，窗口内向量化
+    decay = np.full(n_all, np.nan)
+    if prices is None:
+        pts = [pt for path in slices for pt in _slice_prices(path, venue=price_venue)]
+        pts.sort(key=lambda x: x[0])
+        p_t = np.array([x[0] for x in pts], dtype=np.float64)
+        p_v = np.array([x[1] for x in pts], dtype=np.float64)
+    else:
+        p_t = np.asarray(prices[0], dtype=np.float64)
+        p_v = np.asarray(prices[1], dtype=np.float64)
+        order_p = np.argsort(p_t, kind="stable")
+        p_t, p_v = p_t[order_p], p_v[order_p]
+    inputs = _decay_inputs(t, normalized, p_t, p_v, window=window)
+    optimizer = SignalOptimizer(
+        T=float(decay_T),
+        lambda_base=float(decay_lambda_base),
+        sigma=float(decay_sigma),
+        multiplier=float(decay_multiplier),
+        min_mu=float(decay_min_mu),
+        max_mu=float(decay_max_mu),
+        N_windows=int(decay_N_windows),
+    )
+    decay[inputs["idx"]] = _decay_from_inputs(inputs, optimizer)
+    z_eff = z * decay
+
+    keep = np.ones(n_all, dtype=bool)
+    if start_ts is not None:
+        keep &= t >= float(start_ts)
+    if end_ts is not None:
+        keep &= t <= float(end_ts)
+    return CexBatchResult(
+        t=t[keep],
+        raw_score=raw[keep],
+        z_score=z[keep],
+        z_eff=z_eff[keep],
+        decay=decay[keep],
+        n_samples=n[keep],
     )
-    return float(normalized_score)
 
 
 def ensure_cex_warmup(
@@ -867,6 +1504,7 @@ def ensure_cex_warmup(
     venues: Optional[list[str]] = None,
     weights: Optional[list[float]] = None,
     weights_by_venue: Optional[dict[str, float]] = None,
+    normalizer_method: str = "zscore",
     lookback_seconds: int = 7200,
     normalizer_cache_dir: Optional[Path] = None,
     symbol: str = "btc",
@@ -890,16 +1528,19 @@ def ensure_cex_warmup(
     if len(venues2) != len(weights2):
         return False
 
+    normalizer_cls = NORMALIZER_METHODS.get(str(normalizer_method))
+    if normalizer_cls is None:
+        raise ValueError(f"unknown normalizer_method {normalizer_method!r} (expected one of {list(NORMALIZER_METHODS)})")
     cache_dir = Path(normalizer_cache_dir) if normalizer_cache_dir else Path(".cache")
-    cache_file = cache_dir / f"cex_normalizer_{symbol}.pkl"
+    cache_file = cache_dir / _normalizer_cache_name(symbol, str(normalizer_method))
     cache_key = str(cache_file.resolve())
 
     print(f"[cex] warmup: start cache={cache_key}", flush=True)
     normalizer = _NORMALIZER_CACHE.get(cache_key)
     if normalizer is None:
-        normalizer = AdaptiveScoreNormalizer.load_state(cache_file)
+        normalizer = normalizer_cls.load_state(cache_file)
         if normalizer is None:
-            normalizer = AdaptiveScoreNormalizer(
+            normalizer = normalizer_cls(
                 lookback_seconds=int(lookback_seconds),
                 min_samples=100,
             )
@@ -914,17 +1555,7 @@ def ensure_cex_warmup(
             pass
         print("[cex] warmup: reset history for full backfill", flush=True)
         try:
-            prev = _prev_cex_slice_path(p)
-            if prev is not None:
-                print(f"[cex] warmup: try prev slice {prev}", flush=True)
-                _warmup_normalizer_from_csv(
-                    csv_path=prev,
-                    normalizer=normalizer,
-                    venues=venues2,
-                    weights=weights2,
-                    lookback_seconds=int(lookback_seconds),
-                    now_ts=float(now_ts),
-                )
+            # 倒序读取，当前切片不够时自动继续读上一个切片
             _warmup_normalizer_from_csv(
                 csv_path=p,
                 normalizer=normalizer,
@@ -0,0 +1,183 @@
+"""
+已关闭CEX切片的完整信号缓存
+
+12小时切片（cex_{symbol}_YYYYMMDD_00-12.csv / 12-24.csv）轮转之后不再变化，
+warmup时没必要每次重新解析CSV、重新计算加权信号。这里把每个已关闭切片的
+完整信号 (t, score) 存为二进制sidecar：
+
+    .cache/cex_signals/{sha1(path, venues, weights)[:20]}.sig
+
+    header '<8sQqQ' = (MAGIC, csv_size, csv_mtime_ns, n)
+    然后 n 个 float64 时间戳、n 个 float64 score（小端）
+
+读取时只比较文件大小和 mtime_ns，不一致（切片被改写）就重新计算。
+同一进程内再加一层内存缓存。
+
+同样格式也用于缓存单个venue的价格序列 (t, mid)：单独的实例和目录
+（PRICE_CACHE_DIR，venues=[venue]，weights为空），与信号缓存互不占用内存槽位。
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import struct
+import sys
+from array import array
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Callable, Optional
+
+SIGNAL_CACHE_DIR = Path(".cache") / "cex_signals"
+PRICE_CACHE_DIR = Path(".cache") / "cex_prices"
+
+_MAGIC = b"CEXSIG01"
+_HEADER = struct.Struct("<8sQqQ")
+
+# 切片结束后再等这么久才视为关闭（容忍采集器最后几行的写入延迟）
+CLOSE_GRACE_S = 120.0
+
+_MEMORY_LIMIT = 16
+
+
+def slice_end_ts(path: Path) -> Optional[float]:
+    """由切片文件名得到该切片的结束时间（UTC epoch秒）；不是切片命名时返回None"""
+    parts = Path(path).name.split("_")
+    if len(parts) < 4 or parts[0] != "cex":
+        return None
+    label = parts[3].split(".")[0]
+    if label not in ("00-12", "12-24"):
+        return None
+    try:
+        day = datetime.strptime(parts[2], "%Y%m%d").replace(tzinfo=timezone.utc)
+    except ValueError:
+        return None
+    return (day + timedelta(hours=12 if label == "00-12" else 24)).timestamp()
+
+
+def slice_start_ts(path: Path) -> Optional[float]:
+    end = slice_end_ts(path)
+    return None if end is None else end - 12 * 3600
+
+
+def slice_path_for(directory: Path, symbol: str, ts: float) -> Path:
+    """ts 所在的12小时切片路径（不检查是否存在）"""
+    dt = datetime.fromtimestamp(float(ts), tz=timezone.utc)
+    label = "00-12" if dt.hour < 12 else "12-24"
+    return Path(directory) / f"cex_{symbol}_{dt:%Y%m%d}_{label}.csv"
+
+
+def is_closed_slice(path: Path, now_ts: float) -> bool:
+    end = slice_end_ts(path)
+    return end is not None and float(now_ts) >= end + CLOSE_GRACE_S
+
+
+def _weights_key(path: Path, venues: list[str], weights: list[float]) -> str:
+    payload = json.dumps(
+        {"path": str(Path(path).resolve()), "venues": list(venues), "weights": [float(w) for w in weights]},
+        sort_keys=True,
+    )
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()[:20]
+
+
+class SliceSignalCache:
+    """按 (切片路径, size, mtime_ns, venues, weights) 缓存完整信号"""
+
+    def __init__(self, cache_dir: Optional[Path] = None) -> None:
+        self.cache_dir = Path(cache_dir) if cache_dir is not None else SIGNAL_CACHE_DIR
+        self._memory: OrderedDict[tuple, list[tuple[float, float]]] = OrderedDict()
+
+    def sidecar_path(self, path: Path, venues: list[str], weights: list[float]) -> Path:
+        return self.cache_dir / f"{_weights_key(path, venues, weights)}.sig"
+
+    def lookup(self, path: Path, *, venues: list[str], weights: list[float]) -> Optional[list[tuple[float, float]]]:
+        """只查缓存（内存或有效的sidecar），不计算"""
+        st = Path(path).stat()
+        sidecar = self.sidecar_path(path, venues, weights)
+        mem_key = (str(sidecar), st.st_size, st.st_mtime_ns)
+        hit = self._memory.get(mem_key)
+        if hit is not None:
+            self._memory.move_to_end(mem_key)
+            return hit
+        signals = self._read(sidecar, st.st_size, st.st_mtime_ns)
+        if signals is not None:
+            self._remember(mem_key, signals)
+        return signals
+
+    def put(
+        self,
+        path: Path,
+        signals: list[tuple[float, float]],
+        *,
+        venues: list[str],
+        weights: list[float],
+        write: bool = True,
+    ) -> None:
+        """写入缓存；write=False 时只放入内存（sidecar已由其他进程写好）"""
+        st = Path(path).stat()
+        sidecar = self.sidecar_path(path, venues, weights)
+        if write:
+            try:
+                self._write(sidecar, st.st_size, st.st_mtime_ns, signals)
+            except OSError as e:
+                print(f"[cex] signal cache: 写入失败 {sidecar}: {e}", file=sys.stderr, flush=True)
+        self._remember((str(sidecar), st.st_size, st.st_mtime_ns), signals)
+
+    def get(
+        self,
+        path: Path,
+        *,
+        venues: list[str],
+        weights: list[float],
+        compute: Callable[[], list[tuple[float, float]]],
+    ) -> list[tuple[float, float]]:
+        """返回缓存的信号；缺失或失效时调用 compute() 计算并写入缓存"""
+        signals = self.lookup(path, venues=venues, weights=weights)
+        if signals is None:
+            signals = compute()
+            self.put(path, signals, venues=venues, weights=weights)
+        return signals
+
+    def _remember(self, key: tuple, signals: list[tuple[float, float]]) -> None:
+        self._memory[key] = signals
+        self._memory.move_to_end(key)
+        while len(self._memory) > _MEMORY_LIMIT:
+            self._memory.popitem(last=False)
+
+    @staticmethod
+    def _read(sidecar: Path, size: int, mtime_ns: int) -> Optional[list[tuple[float, float]]]:
+        try:
+            with open(sidecar, "rb") as f:
+                head = f.read(_HEADER.size)
+                if len(head) != _HEADER.size:
+                    return None
+                magic, c_size, c_mtime, n = _HEADER.unpack(head)
+                if magic != _MAGIC or c_size != size or c_mtime != mtime_ns:
+                    return None
+                ts = array("d")
+                scores = array("d")
+                ts.fromfile(f, n)
+                scores.fromfile(f, n)
+        except (OSError, EOFError):
+            return None
+        if sys.byteorder != "little":
+            ts.byteswap()
+            scores.byteswap()
+        return list(zip(ts.tolist(), scores.tolist()))
+
+    @staticmethod
+    def _write(sidecar: Path, size: int, mtime_ns: int, signals: list[tuple[float, float]]) -> None:
+        sidecar.parent.mkdir(parents=True, exist_ok=True)
+        ts = array("d", (t for t, _ in signals))
+        scores = array("d", (s for _, s in signals))
+        if sys.byteorder != "little":
+            ts.byteswap()
+            scores.byteswap()
+        tmp = sidecar.with_name(sidecar.name + ".tmp")
+        with open(tmp, "wb") as f:
+            f.write(_HEADER.pack(_MAGIC, size, mtime_ns, len(signals)))
+            ts.tofile(f)
+            scores.tofile(f)
+        os.replace(tmp, sidecar)
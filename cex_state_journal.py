@@ -0,0 +1,154 @@
+"""
+normalizer 历史 (timestamp, score) 的持久化：快照 + 追加日志（journal）
+
+    cex_normalizer_btc.pkl           快照（pickle dict，原子写入：tmp + fsync + os.replace）
+    cex_normalizer_btc.pkl.journal   追加日志，快照之后新增的样本
+
+journal 格式：
+    header  = '<8sQ'  (MAGIC, generation)
+    record  = '<dd'   (timestamp, score) + '<I' crc32(前16字节)
+
+- 快照和 journal 共用一个 generation；journal 的 generation 与快照不一致时整体忽略
+  （例如写完新快照、还没来得及重置 journal 时崩溃）
+- 读取时遇到不完整或crc不符的尾部记录即停止（崩溃时写了一半）
+- 每次保存只追加新样本，成本与样本数成正比而不是与历史长度成正比；
+  journal 记录数超过历史长度时做一次压缩（重写快照并清空 journal）
+- 兼容旧版本的单个 pickle 文件（没有 generation 字段时直接按快照读取）
+"""
+
+from __future__ import annotations
+
+import os
+import pickle
+import struct
+import zlib
+from pathlib import Path
+from typing import Any, Iterable, Optional
+
+JOURNAL_MAGIC = b"CEXJRNL1"
+_HEADER = struct.Struct("<8sQ")
+_PAYLOAD = struct.Struct("<dd")
+_CRC = struct.Struct("<I")
+RECORD_SIZE = _PAYLOAD.size + _CRC.size
+
+# journal 至少积累这么多条记录才考虑压缩
+MIN_COMPACT_RECORDS = 1_000
+
+
+def journal_path_for(snapshot_path: Path) -> Path:
+    p = Path(snapshot_path)
+    return p.with_name(p.name + ".journal")
+
+
+def _atomic_write_bytes(path: Path, data: bytes) -> None:
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def encode_records(records: Iterable[tuple[float, float]]) -> bytes:
+    out = bytearray()
+    for t, s in records:
+        payload = _PAYLOAD.pack(float(t), float(s))
+        out += payload
+        out += _CRC.pack(zlib.crc32(payload))
+    return bytes(out)
+
+
+def read_journal(path: Path, generation: int) -> tuple[list[tuple[float, float]], bool]:
+    """
+    读取 journal，返回 (records, clean)
+
+    clean=False 表示文件不存在/generation不符/尾部有损坏记录（下次保存应写新快照）
+    """
+    try:
+        data = Path(path).read_bytes()
+    except FileNotFoundError:
+        return [], False
+    if len(data) < _HEADER.size:
+        return [], False
+    magic, gen = _HEADER.unpack_from(data, 0)
+    if magic != JOURNAL_MAGIC or gen != int(generation):
+        return [], False
+    records: list[tuple[float, float]] = []
+    pos = _HEADER.size
+    end = len(data)
+    while pos + RECORD_SIZE <= end:
+        payload = data[pos:pos + _PAYLOAD.size]
+        (crc,) = _CRC.unpack_from(data, pos + _PAYLOAD.size)
+        if zlib.crc32(payload) != crc:
+            return records, False
+        records.append(_PAYLOAD.unpack(payload))
+        pos += RECORD_SIZE
+    return records, pos == end
+
+
+class HistoryJournal:
+    """一个快照文件及其 journal 的读写状态"""
+
+    def __init__(self, snapshot_path: Path) -> None:
+        self.snapshot_path = Path(snapshot_path)
+        self.journal_path = journal_path_for(self.snapshot_path)
+        self.generation: Optional[int] = None
+        self.records = 0
+        # True: 下一次保存必须写完整快照
+        self.dirty = True
+
+    def load(self) -> Optional[dict[str, Any]]:
+        """读取快照并重放 journal；history 为合并后的 [(t, score), ...]"""
+        if not self.snapshot_path.exists():
+            return None
+        with open(self.snapshot_path, "rb") as f:
+            state = pickle.load(f)
+        history = list(state.get("history") or [])
+        gen = state.get("generation")
+        self.dirty = True
+        if gen is not None:
+            records, clean = read_journal(self.journal_path, int(gen))
+            history.extend(records)
+            if clean:
+                self.generation = int(gen)
+                self.records = len(records)
+                self.dirty = False
+        state["history"] = history
+        return state
+
+    def needs_compaction(self, n_history: int) -> bool:
+        return self.records >= max(int(n_history), MIN_COMPACT_RECORDS)
+
+    def write_snapshot(self, state: dict[str, Any]) -> None:
+        """写入完整快照（新 generation）并重置 journal"""
+        gen = int.from_bytes(os.urandom(8), "little")
+        state = dict(state, generation=gen)
+        self.snapshot_path.parent.mkdir(parents=True, exist_ok=True)
+        _atomic_write_bytes(self.snapshot_path, pickle.dumps(state))
+        _atomic_write_bytes(self.journal_path, _HEADER.pack(JOURNAL_MAGIC, gen))
+        self.generation = gen
+        self.records = 0
+        self.dirty = False
+
+    def append(self, records: list[tuple[float, float]]) -> bool:
+        """
+        追加记录；返回False时调用方应改写完整快照
+
+        journal 大小与预期不符（被其他进程改写/截断）时不追加。
+        """
+        if self.dirty or self.generation is None:
+            return False
+        if not records:
+            return True
+        expected = _HEADER.size + self.records * RECORD_SIZE
+        try:
+            if os.path.getsize(self.journal_path) != expected:
+                self.dirty = True
+                return False
+            with open(self.journal_path, "ab") as f:
+                f.write(encode_records(records))
+        except OSError:
+            self.dirty = True
+            return False
+        self.records += len(records)
+        return True
@@ -0,0 +1,281 @@
+#!/usr/bin/env python3
+"""
+采集器的异步写入线程
+
+采集循环只把记录（dict / CSV行）放入有界队列，序列化、write、flush 全部在
+写入线程中完成，磁盘或SSHFS卡顿不会拖慢1Hz采集节拍。
+
+- 批量flush：距上次flush超过 flush_interval_s 或累计 flush_every 条记录时flush
+- 队列满时的策略（overflow）：
+    drop_oldest  丢弃最旧的一条数据记录（默认，保证最新数据）
+    drop_newest  丢弃新提交的记录
+    block        阻塞采集循环直到有空位（不丢数据）
+  open/close 等控制操作不计入容量，也不会被丢弃。
+- 链式记录（write_json(..., chained=True)，如delta格式的增量帧）依赖同一文件的前一条
+  记录：某文件丢过记录后，其后排队中的链式记录一并丢弃，新的链式记录也会被拒绝，
+  直到该文件写入一条非链式记录（关键帧）为止；needs_keyframe(path) 供采集端判断。
+  每个文件丢弃的记录数在关闭该文件时输出到 stderr。
+- 可为JSONL文件挂一个索引构建器（open(..., index=...)）：写入线程知道每条记录的
+  字节偏移，按 write_json(..., meta=...) 调用 index.add(offset, nbytes, meta)，
+  关闭文件时调用 index.finish()（见 polymarket_window_index）。
+"""
+
+from __future__ import annotations
+
+import csv
+import io
+import json
+import sys
+import threading
+import time
+from collections import deque
+from pathlib import Path
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+OVERFLOW_POLICIES = ("drop_oldest", "drop_newest", "block")
+
+_DATA_OPS = ("json", "csv")
+
+
+def _is_chained(op: Tuple[Any, ...]) -> bool:
+    return op[0] == "json" and bool(op[4])
+
+
+class AsyncLineWriter:
+    """按文件路径管理句柄的后台写入器（线程安全）"""
+
+    def __init__(
+        self,
+        *,
+        max_queue: int = 10_000,
+        flush_interval_s: float = 1.0,
+        flush_every: int = 1_000,
+        overflow: str = "drop_oldest",
+    ) -> None:
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"overflow must be one of {OVERFLOW_POLICIES}")
+        self.max_queue = max(1, int(max_queue))
+        self.flush_interval_s = float(flush_interval_s)
+        self.flush_every = max(1, int(flush_every))
+        self.overflow = overflow
+
+        self._ops: Deque[Tuple[Any, ...]] = deque()
+        self._n_data = 0
+        self._cond = threading.Condition()
+        self._stopping = False
+        self._files: Dict[Path, Any] = {}
+        self._indexes: Dict[Path, Any] = {}
+        self._offsets: Dict[Path, int] = {}
+        self._dirty: set = set()
+        self._since_flush = 0
+        self._last_flush = time.time()
+
+        self._broken: set = set()
+        self._dropped_by_path: Dict[Path, int] = {}
+
+        self.written = 0
+        self.dropped = 0
+        self._thread = threading.Thread(target=self._run, name="poly-writer", daemon=True)
+        self._thread.start()
+
+    # ---- 采集线程调用 ----
+
+    def open(self, path: Path, *, csv_header: Optional[List[str]] = None, index: Any = None) -> None:
+        """打开（追加）文件；csv_header 仅在文件为空时写入；index 为可选的索引构建器"""
+        self._put(("open", Path(path), csv_header, index))
+
+    def write_json(
+        self,
+        path: Path,
+        obj: Any,
+        *,
+        meta: Optional[Dict[str, Any]] = None,
+        chained: bool = False,
+    ) -> bool:
+        """meta 非空且该文件挂了索引构建器时，写入后交给 index.add；chained 见模块说明"""
+        return self._put(("json", Path(path), obj, meta, bool(chained)))
+
+    def write_csv_rows(self, path: Path, rows: List[List[Any]]) -> bool:
+        return self._put(("csv", Path(path), rows))
+
+    def close(self, path: Path) -> None:
+        self._put(("close", Path(path)))
+
+    def queue_depth(self) -> int:
+        with self._cond:
+            return self._n_data
+
+    def needs_keyframe(self, path: Path) -> bool:
+        """该文件丢过记录且之后尚未写入非链式记录（链式记录会被拒绝）"""
+        with self._cond:
+            return Path(path) in self._broken
+
+    def dropped_for(self, path: Path) -> int:
+        """该文件（本次打开期间）被丢弃的记录数"""
+        with self._cond:
+            return self._dropped_by_path.get(Path(path), 0)
+
+    def stop(self, timeout: float = 10.0) -> None:
+        """写完队列中剩余的记录并关闭所有文件"""
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+        self._thread.join(timeout=timeout)
+
+    def _put(self, op: Tuple[Any, ...]) -> bool:
+        is_data = op[0] in _DATA_OPS
+        with self._cond:
+            if is_data and _is_chained(op) and op[1] in self._broken:
+                self._count_drop(op[1])
+                return False
+            if is_data and self._n_data >= self.max_queue:
+                if self.overflow == "drop_newest":
+                    self._count_drop(op[1])
+                    self._broken.add(op[1])
+                    return False
+                if self.overflow == "drop_oldest":
+                    for i, queued in enumerate(self._ops):
+                        if queued[0] in _DATA_OPS:
+                            del self._ops[i]
+                            self._n_data -= 1
+                            self._count_drop(queued[1])
+                            self._drop_chain(queued[1], i)
+                            break
+                else:
+                    while self._n_data >= self.max_queue and not self._stopping:
+                        self._cond.wait(0.1)
+            if op[0] == "json" and not _is_chained(op):
+                self._broken.discard(op[1])
+            self._ops.append(op)
+            if is_data:
+                self._n_data += 1
+            self._cond.notify_all()
+        return True
+
+    def _count_drop(self, path: Path) -> None:
+        self.dropped += 1
+        self._dropped_by_path[path] = self._dropped_by_path.get(path, 0) + 1
+
+    def _drop_chain(self, path: Path, start: int) -> None:
+        """丢弃 path 的一条记录后：移除其后排队中依赖它的链式记录（持锁调用）"""
+        i = start
+        while i < len(self._ops):
+            queued = self._ops[i]
+            if queued[1] == path and queued[0] in _DATA_OPS:
+                if not _is_chained(queued):
+                    return  # 后面已有关键帧，链条在此恢复
+                del self._ops[i]
+                self._n_data -= 1
+                self._count_drop(path)
+                continue
+            if queued[1] == path and queued[0] == "close":
+                return
+            i += 1
+        self._broken.add(path)
+
+    # ---- 写入线程 ----
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                if not self._ops and not self._stopping:
+                    self._cond.wait(self.flush_interval_s)
+                batch = list(self._ops)
+                self._ops.clear()
+                self._n_data = 0
+                stopping = self._stopping
+                self._cond.notify_all()
+            for op in batch:
+                try:
+                    self._apply(op)
+                except Exception as e:
+                    print(f"[ERROR] writer {op[0]} {op[1]}: {type(e).__name__}: {e}", file=sys.stderr)
+            if stopping or self._since_flush >= self.flush_every or (
+                self._dirty and time.time() - self._last_flush >= self.flush_interval_s
+            ):
+                self._flush_dirty()
+            if stopping:
+                with self._cond:
+                    if self._ops:
+                        continue
+                for path in list(self._files):
+                    self._close_file(path)
+                return
+
+    def _handle(self, path: Path) -> Any:
+        f = self._files.get(path)
+        if f is None:
+            f = path.open("a", encoding="utf-8", newline="")
+            self._files[path] = f
+        return f
+
+    def _apply(self, op: Tuple[Any, ...]) -> None:
+        kind, path = op[0], op[1]
+        if kind == "open":
+            f = self._handle(path)
+            header, index = op[2], op[3]
+            if header and f.tell() == 0:
+                csv.writer(f).writerow(header)
+                self._dirty.add(path)
+            if index is not None:
+                if f.tell() > 0:
+                    index.resume()
+                self._indexes[path] = index
+                self._offsets[path] = f.tell()
+        elif kind == "json":
+            f = self._handle(path)
+            line = json.dumps(op[2]) + "\n"
+            f.write(line)
+            self._mark_written(path, 1)
+            index = self._indexes.get(path)
+            if index is not None:
+                # json.dumps 默认 ensure_ascii，字符数即字节数
+                if op[3]:
+                    index.add(self._offsets[path], len(line), op[3])
+                self._offsets[path] += len(line)
+        elif kind == "csv":
+            f = self._handle(path)
+            buf = io.StringIO()
+            csv.writer(buf).writerows(op[2])
+            f.write(buf.getvalue())
+            self._mark_written(path, len(op[2]))
+        elif kind == "close":
+            self._close_file(path)
+
+    def _mark_written(self, path: Path, n: int) -> None:
+        self._dirty.add(path)
+        self._since_flush += n
+        self.written += n
+
+    def _flush_dirty(self) -> None:
+        for path in list(self._dirty):
+            f = self._files.get(path)
+            if f is not None:
+                try:
+                    f.flush()
+                except Exception as e:
+                    print(f"[ERROR] writer flush {path}: {e}", file=sys.stderr)
+        self._dirty.clear()
+        self._since_flush = 0
+        self._last_flush = time.time()
+
+    def _close_file(self, path: Path) -> None:
+        f = self._files.pop(path, None)
+        self._dirty.discard(path)
+        with self._cond:
+            n_dropped = self._dropped_by_path.pop(path, 0)
+            self._broken.discard(path)
+        if n_dropped:
+            print(f"[WARN] writer {path}: dropped {n_dropped} records ({self.overflow})", file=sys.stderr)
+        if f is not None:
+            try:
+                f.close()
+            except Exception as e:
+                print(f"[ERROR] writer close {path}: {e}", file=sys.stderr)
+        index = self._indexes.pop(path, None)
+        self._offsets.pop(path, None)
+        if index is not None:
+            try:
+                index.finish()
+            except Exception as e:
+                print(f"[ERROR] writer index {path}: {type(e).__name__}: {e}", file=sys.stderr)
@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+"""
+Polymarket orderbook JSONL 的增量编码（delta + 周期性关键帧）
+
+写入格式（每行一条JSON，与完整格式共存于同一个 {market_slug}.jsonl）：
+
+    关键帧: {"type": "key", "timestamp": ..., "market_key": ..., "market_slug": ...,
+             "question": ..., "tokens": [{"outcome", "token_id", "orderbook": {"bids", "asks"}}]}
+    增量帧: {"type": "delta", "timestamp": ..., "market_key": ..., "market_slug": ...,
+             "tokens": [{"token_id", "bids": [[p, s], ...], "asks": [[p, s], ...]}],
+             "absent": [token_id, ...]}   # 可选：本tick未取到的token
+
+增量帧只包含发生变化的价位，size=0 表示该价位被删除。
+每个文件从关键帧开始，之后每 keyframe_s 秒强制写一次关键帧，
+因此从任意关键帧开始都能还原完整订单簿。
+
+读取：
+    from polymarket_book_delta import iter_books, book_at
+    for tick in iter_books(path):      # 与完整格式相同的tick结构
+        ...
+    tick = book_at(path, timestamp_ms)
+"""
+
+from __future__ import annotations
+
+import json
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+# Polymarket /book 返回的价位顺序：bids 价格升序，asks 价格降序（最优价在末尾）
+_DEFAULT_ASCENDING = {"bids": True, "asks": False}
+
+
+def _level_map(levels: List[List[float]]) -> Dict[float, float]:
+    return {float(p): float(s) for p, s in levels}
+
+
+def _diff_levels(old: Dict[float, float], new: Dict[float, float]) -> List[List[float]]:
+    changes = []
+    for p, s in new.items():
+        if old.get(p) != s:
+            changes.append([p, s])
+    for p in old:
+        if p not in new:
+            changes.append([p, 0.0])
+    return changes
+
+
+class BookDeltaEncoder:
+    """
+    单个市场（单个窗口文件）的增量编码器
+
+    encode(tick) 接收完整格式的tick，返回要写入的记录（关键帧或增量帧）。
+    """
+
+    def __init__(self, keyframe_s: float = 60.0) -> None:
+        self.keyframe_ms = int(float(keyframe_s) * 1000)
+        self._books: Dict[str, Dict[str, Dict[float, float]]] = {}
+        self._token_ids: tuple = ()
+        self._last_key_ms: Optional[int] = None
+
+    def reset(self) -> None:
+        """丢弃基准订单簿，下一次 encode 必定输出关键帧（如写入端丢过记录后）"""
+        self._books.clear()
+        self._token_ids = ()
+        self._last_key_ms = None
+
+    def encode(self, tick: Dict[str, Any]) -> Dict[str, Any]:
+        ts = int(tick["timestamp"])
+        tokens = tick.get("tokens") or []
+        token_ids = tuple(str(t["token_id"]) for t in tokens)
+        need_key = (
+            self._last_key_ms is None
+            or ts - self._last_key_ms >= self.keyframe_ms
+            or any(tid not in self._books for tid in token_ids)
+        )
+        new_books = {
+            str(t["token_id"]): {
+                "bids": _level_map(t["orderbook"].get("bids") or []),
+                "asks": _level_map(t["orderbook"].get("asks") or []),
+            }
+            for t in tokens
+        }
+
+        if need_key:
+            self._books = new_books
+            self._token_ids = token_ids
+            self._last_key_ms = ts
+            record = dict(tick)
+            record["type"] = "key"
+            return record
+
+        delta_tokens = []
+        for tid in token_ids:
+            old = self._books[tid]
+            new = new_books[tid]
+            bids = _diff_levels(old["bids"], new["bids"])
+            asks = _diff_levels(old["asks"], new["asks"])
+            self._books[tid] = new
+            if bids or asks:
+                delta_tokens.append({"token_id": tid, "bids": bids, "asks": asks})
+
+        record = {
+            "type": "delta",
+            "timestamp": ts,
+            "market_key": tick.get("market_key"),
+            "market_slug": tick.get("market_slug"),
+            "tokens": delta_tokens,
+        }
+        absent = [tid for tid in self._token_ids if tid not in new_books]
+        if absent:
+            record["absent"] = absent
+        return record
+
+
+class BookReplayState:
+    """按顺序应用关键帧/增量帧，维护当前完整订单簿"""
+
+    def __init__(self) -> None:
+        self.header: Dict[str, Any] = {}
+        self.outcomes: Dict[str, str] = {}
+        self.order: List[str] = []
+        self.books: Dict[str, Dict[str, Dict[float, float]]] = {}
+        self.ascending: Dict[str, Dict[str, bool]] = {}
+
+    @staticmethod
+    def _infer_ascending(levels: List[List[float]], side: str) -> bool:
+        if len(levels) >= 2 and float(levels[0][0]) != float(levels[-1][0]):
+            return float(levels[0][0]) < float(levels[-1][0])
+        return _DEFAULT_ASCENDING[side]
+
+    def apply(self, record: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """应用一条记录，返回该时刻的完整tick（完整格式）；增量帧之前没有关键帧时返回None"""
+        rtype = record.get("type")
+        if rtype != "delta":
+            # 关键帧或旧的完整格式记录
+            self.header = {k: record.get(k) for k in ("market_key", "market_slug", "question")}
+            self.order = []
+            self.books = {}
+            self.outcomes = {}
+            for t in record.get("tokens") or []:
+                tid = str(t["token_id"])
+                ob = t.get("orderbook") or {}
+                self.order.append(tid)
+                self.outcomes[tid] = t.get("outcome")
+                self.books[tid] = {
+                    "bids": _level_map(ob.get("bids") or []),
+                    "asks": _level_map(ob.get("asks") or []),
+                }
+                self.ascending[tid] = {
+                    "bids": self._infer_ascending(ob.get("bids") or [], "bids"),
+                    "asks": self._infer_ascending(ob.get("asks") or [], "asks"),
+                }
+            out = dict(record)
+            out.pop("type", None)
+            return out
+
+        if not self.order:
+            return None
+        for t in record.get("tokens") or []:
+            book = self.books.get(str(t["token_id"]))
+            if book is None:
+                continue
+            for side in ("bids", "asks"):
+                levels = book[side]
+                for p, s in t.get(side) or []:
+                    if float(s) == 0.0:
+                        levels.pop(float(p), None)
+                    else:
+                        levels[float(p)] = float(s)
+        absent = set(record.get("absent") or [])
+        tokens = []
+        for tid in self.order:
+            if tid in absent:
+                continue
+            tokens.append({
+                "outcome": self.outcomes.get(tid),
+                "token_id": tid,
+                "orderbook": {
+                    side: [
+                        [p, s]
+                        for p, s in sorted(
+                            self.books[tid][side].items(),
+                            reverse=not self.ascending[tid][side],
+                        )
+                    ]
+                    for side in ("bids", "asks")
+                },
+            })
+        return {
+            "timestamp": record.get("timestamp"),
+            "market_key": self.header.get("market_key"),
+            "market_slug": self.header.get("market_slug"),
+            "question": self.header.get("question"),
+            "tokens": tokens,
+        }
+
+
+def iter_books(path: Path) -> Iterator[Dict[str, Any]]:
+    """逐条还原完整tick（同时兼容完整格式与增量格式的文件）"""
+    state = BookReplayState()
+    with Path(path).open("r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except Exception:
+                continue
+            tick = state.apply(record)
+            if tick is not None and tick.get("tokens"):
+                yield tick
+
+
+def book_at(path: Path, timestamp_ms: int) -> Optional[Dict[str, Any]]:
+    """返回时间戳 <= timestamp_ms 的最后一条完整tick"""
+    last = None
+    for tick in iter_books(path):
+        if int(tick["timestamp"]) > int(timestamp_ms):
+            break
+        last = tick
+    return last
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Polymarket 盘口摘要流（top-of-book summary）
+
+与完整深度的 {market_slug}.jsonl 并行，每个窗口写一个 {market_slug}.summary.csv，
+每个tick每个token一行，列固定：
+
+    timestamp,market_key,token_id,outcome,best_bid,best_ask,mid,spread,
+    bid_depth,ask_depth,implied_prob
+
+- bid_depth / ask_depth: mid 上下 depth_cents 美分以内的挂单数量
+- implied_prob: 该outcome的隐含概率（mid；单边盘口时取可用的一侧）
+
+大多数分析只需要这些字段，读取时无需对每行做 json.loads：
+
+    from polymarket_book_summary import load_summary
+    cols = load_summary(path)            # {列名: list}
+    cols = load_summary(path, numpy=True)  # {列名: np.ndarray}
+"""
+
+from __future__ import annotations
+
+import csv
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+SUMMARY_COLUMNS = [
+    "timestamp", "market_key", "token_id", "outcome",
+    "best_bid", "best_ask", "mid", "spread",
+    "bid_depth", "ask_depth", "implied_prob",
+]
+_STR_COLUMNS = {"market_key", "token_id", "outcome"}
+
+
+def summary_path_for(output_dir: Path, market_slug: str) -> Path:
+    return Path(output_dir) / f"{market_slug}.summary.csv"
+
+
+def summarize_book(
+    bids: List[List[float]],
+    asks: List[List[float]],
+    *,
+    depth_cents: float = 5.0,
+) -> Dict[str, Optional[float]]:
+    """从一侧为 [[price, size], ...] 的订单簿计算盘口摘要（不依赖价位排序）"""
+    best_bid = max((p for p, _ in bids), default=None)
+    best_ask = min((p for p, _ in asks), default=None)
+    if best_bid is not None and best_ask is not None:
+        mid = (best_bid + best_ask) / 2.0
+        spread = best_ask - best_bid
+    else:
+        mid = best_bid if best_bid is not None else best_ask
+        spread = None
+    bid_depth = ask_depth = None
+    if mid is not None:
+        band = float(depth_cents) / 100.0 + 1e-9
+        bid_depth = sum(s for p, s in bids if p >= mid - band)
+        ask_depth = sum(s for p, s in asks if p <= mid + band)
+    return {
+        "best_bid": best_bid,
+        "best_ask": best_ask,
+        "mid": mid,
+        "spread": spread,
+        "bid_depth": bid_depth,
+        "ask_depth": ask_depth,
+        "implied_prob": mid,
+    }
+
+
+def summary_rows(tick: Dict[str, Any], *, depth_cents: float = 5.0) -> List[List[Any]]:
+    """把一条完整tick转换为摘要行（每个token一行，列顺序同 SUMMARY_COLUMNS）"""
+    rows = []
+    for t in tick.get("tokens") or []:
+        ob = t.get("orderbook") or {}
+        s = summarize_book(ob.get("bids") or [], ob.get("asks") or [], depth_cents=depth_cents)
+        rows.append([
+            tick.get("timestamp"), tick.get("market_key"), t.get("token_id"), t.get("outcome"),
+            *("" if s[c] is None else round(float(s[c]), 6) for c in SUMMARY_COLUMNS[4:]),
+        ])
+    return rows
+
+
+def load_summary(path: Path, *, numpy: bool = False) -> Dict[str, Any]:
+    """按列读取摘要CSV；数值列缺失值为 NaN"""
+    cols: Dict[str, list] = {c: [] for c in SUMMARY_COLUMNS}
+    nan = float("nan")
+    with Path(path).open("r", encoding="utf-8", newline="") as f:
+        reader = csv.reader(f)
+        header = next(reader, None)
+        if header is None:
+            return cols
+        idx = [header.index(c) for c in SUMMARY_COLUMNS]
+        for row in reader:
+            if len(row) < len(header):
+                continue
+            for c, i in zip(SUMMARY_COLUMNS, idx):
+                v = row[i]
+                if c in _STR_COLUMNS:
+                    cols[c].append(v)
+                elif c == "timestamp":
+                    cols[c].append(int(v))
+                else:
+                    cols[c].append(float(v) if v else nan)
+    if numpy:
+        import numpy as np
+
+        return {
+            c: (np.asarray(v, dtype=object) if c in _STR_COLUMNS
+                else np.asarray(v, dtype=np.int64 if c == "timestamp" else np.float64))
+            for c, v in cols.items()
+        }
+    return cols
@@ -0,0 +1,306 @@
+#!/usr/bin/env python3
+"""
+Polymarket 市场注册表（配置驱动）
+
+每个市场族（family）由配置描述：资产、周期、slug模板和时区，例如
+
+    {
+      "families": [
+        {"key": "btc_15m", "asset": "btc", "cadence": "15m",
+         "slug_template": "btc-updown-15m-{window_start}"},
+        {"key": "btc_1h", "asset": "btc", "cadence": "1h",
+         "slug_template": "bitcoin-up-or-down-{month}-{day}-{hour12}{ampm}-et",
+         "timezone": "America/New_York"}
+      ]
+    }
+
+slug模板可用字段（均为 timezone 下的本地时间）：
+    {window_start}  窗口起始 epoch 秒
+    {asset}         资产代码
+    {year} {month} {month_num} {day} {hour} {hour12} {ampm}
+
+时区使用 zoneinfo，夏令时切换自动处理（ET 不再固定为 UTC-5）。
+
+4h/1d 窗口按本地墙上时间对齐：窗口结束 = 本地起始 + 周期（切换日的窗口实际为23h/25h等），
+可用 `python polymarket_market_registry.py --check-dst` 自检夏令时切换日的窗口。
+
+可选的发现（discovery）：按批次查询 Gamma /events（每次请求带多个slug），
+把当前及接下来几个窗口中已上线的市场一次性解析出来，避免逐个slug查询。
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from zoneinfo import ZoneInfo
+
+import requests
+
+DEFAULT_CONFIG_PATH = Path(__file__).parent / "polymarket_markets.json"
+
+CADENCE_SECONDS = {
+    "5m": 300,
+    "15m": 900,
+    "1h": 3600,
+    "4h": 14400,
+    "1d": 86400,
+}
+
+DEFAULT_FAMILIES: List[Dict[str, Any]] = [
+    {"key": "btc_15m", "asset": "btc", "cadence": "15m", "slug_template": "btc-updown-15m-{window_start}"},
+    {"key": "eth_15m", "asset": "eth", "cadence": "15m", "slug_template": "eth-updown-15m-{window_start}"},
+    {
+        "key": "btc_1h",
+        "asset": "btc",
+        "cadence": "1h",
+        "slug_template": "bitcoin-up-or-down-{month}-{day}-{hour12}{ampm}-et",
+        "timezone": "America/New_York",
+    },
+    {
+        "key": "eth_1h",
+        "asset": "eth",
+        "cadence": "1h",
+        "slug_template": "ethereum-up-or-down-{month}-{day}-{hour12}{ampm}-et",
+        "timezone": "America/New_York",
+    },
+]
+
+
+@dataclass(frozen=True)
+class MarketFamily:
+    """一类按固定周期滚动的市场"""
+    key: str
+    asset: str
+    cadence: str
+    slug_template: str
+    timezone: str = "UTC"
+
+    @property
+    def window_seconds(self) -> int:
+        return CADENCE_SECONDS[self.cadence]
+
+    @property
+    def tz(self) -> ZoneInfo:
+        return ZoneInfo(self.timezone)
+
+    def _wall_aligned(self) -> bool:
+        """4h/1d等不整除1小时的周期：窗口边界按本地墙上时间对齐"""
+        size = self.window_seconds
+        return not (size <= 3600 and 3600 % size == 0)
+
+    def window_start(self, epoch: float) -> int:
+        """epoch所在窗口的起始时间（4h/1d按本地时区墙上时间对齐，夏令时切换日也落在本地整点）"""
+        size = self.window_seconds
+        if self._wall_aligned():
+            local = datetime.fromtimestamp(int(epoch), tz=self.tz)
+            slot = (local.hour * 3600 + local.minute * 60 + local.second) // size * size
+            start = local.replace(hour=slot // 3600, minute=slot % 3600 // 60, second=0, microsecond=0, fold=0)
+            return int(start.timestamp())
+        return int(epoch) // size * size
+
+    def next_window_start(self, window_start: int) -> int:
+        """下一个窗口的起始 = 本地墙上时间 + 周期（切换日的窗口实际时长为23h/25h等）"""
+        if self._wall_aligned():
+            local = datetime.fromtimestamp(int(window_start), tz=self.tz).replace(tzinfo=None)
+            nxt = (local + timedelta(seconds=self.window_seconds)).replace(tzinfo=self.tz, fold=0)
+            return int(nxt.timestamp())
+        return int(window_start) + self.window_seconds
+
+    def window_bounds(self, epoch: float) -> Tuple[int, int]:
+        start = self.window_start(epoch)
+        return start, self.next_window_start(start)
+
+    def slug_for(self, window_start: int) -> str:
+        local = datetime.fromtimestamp(int(window_start), tz=self.tz)
+        hour12 = local.hour % 12 or 12
+        return self.slug_template.format(
+            window_start=int(window_start),
+            asset=self.asset,
+            year=local.year,
+            month=local.strftime("%B").lower(),
+            month_num=local.month,
+            day=local.day,
+            hour=local.hour,
+            hour12=hour12,
+            ampm="am" if local.hour < 12 else "pm",
+        )
+
+    def upcoming_windows(self, epoch: float, count: int = 2) -> Dict[str, Tuple[int, int]]:
+        """当前窗口及之后 count-1 个窗口：{slug: (start, end)}"""
+        out: Dict[str, Tuple[int, int]] = {}
+        start, end = self.window_bounds(epoch)
+        for _ in range(max(1, int(count))):
+            out[self.slug_for(start)] = (start, end)
+            start, end = self.window_bounds(end)
+        return out
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "MarketFamily":
+        cadence = str(data["cadence"])
+        if cadence not in CADENCE_SECONDS:
+            raise ValueError(f"unsupported cadence {cadence!r} (expected one of {list(CADENCE_SECONDS)})")
+        family = cls(
+            key=str(data["key"]),
+            asset=str(data.get("asset") or ""),
+            cadence=cadence,
+            slug_template=str(data["slug_template"]),
+            timezone=str(data.get("timezone") or "UTC"),
+        )
+        family.tz  # 尽早校验时区名
+        return family
+
+
+def load_registry(path: Optional[Path] = None) -> List[MarketFamily]:
+    """
+    加载市场族配置
+
+    path为None时使用 polymarket_markets.json（若不存在则用内置默认的4个市场）。
+    配置中 "enabled": false 的条目被跳过。
+    """
+    p = Path(path) if path else DEFAULT_CONFIG_PATH
+    entries: List[Dict[str, Any]] = DEFAULT_FAMILIES
+    if p.exists():
+        with p.open("r", encoding="utf-8") as f:
+            payload = json.load(f)
+        entries = payload.get("families") if isinstance(payload, dict) else payload
+    elif path:
+        raise FileNotFoundError(f"markets config not found: {p}")
+    families = []
+    seen = set()
+    for entry in entries or []:
+        if not entry.get("enabled", True):
+            continue
+        family = MarketFamily.from_dict(entry)
+        if family.key in seen:
+            raise ValueError(f"duplicate market family key: {family.key}")
+        seen.add(family.key)
+        families.append(family)
+    return families
+
+
+def discover_active_markets(
+    families: Iterable[MarketFamily],
+    *,
+    gamma_api: str,
+    now: float,
+    windows_ahead: int = 2,
+    batch_size: int = 40,
+    session: Optional[requests.Session] = None,
+    timeout: float = 10,
+) -> Dict[str, Tuple[MarketFamily, Dict[str, Any], Tuple[int, int]]]:
+    """
+    通过 Gamma /events 批量查询（每次请求带多个 slug 参数），找出注册表中
+    当前及接下来 windows_ahead-1 个窗口已上线的市场。
+
+    这些滚动市场的 event slug 与 market slug 相同；也按 market slug 匹配。
+    返回 {slug: (family, market_info, (window_start, window_end))}
+    """
+    wanted: Dict[str, Tuple[MarketFamily, Tuple[int, int]]] = {}
+    for family in families:
+        for slug, bounds in family.upcoming_windows(now, windows_ahead).items():
+            wanted[slug] = (family, bounds)
+    if not wanted:
+        return {}
+
+    http = session if session is not None else requests
+    slugs = list(wanted)
+    found: Dict[str, Tuple[MarketFamily, Dict[str, Any], Tuple[int, int]]] = {}
+    for i in range(0, len(slugs), max(1, int(batch_size))):
+        chunk = slugs[i:i + max(1, int(batch_size))]
+        try:
+            resp = http.get(
+                f"{gamma_api}/events",
+                params=[("slug", s) for s in chunk] + [("closed", "false")],
+                timeout=timeout,
+            )
+            resp.raise_for_status()
+            events = resp.json()
+        except Exception as e:
+            print(f"[WARN] Gamma events discovery failed ({len(chunk)} slugs): {e}", file=sys.stderr)
+            continue
+        if not isinstance(events, list):
+            continue
+        for event in events:
+            if not isinstance(event, dict):
+                continue
+            markets = [m for m in event.get("markets") or [] if isinstance(m, dict)]
+            for m in markets:
+                slug = m.get("slug")
+                if slug not in wanted and len(markets) == 1:
+                    slug = event.get("slug")
+                if slug in wanted and slug not in found:
+                    family, bounds = wanted[slug]
+                    info = dict(m, slug=slug)
+                    info.setdefault("question", event.get("title"))
+                    found[slug] = (family, info, bounds)
+    return found
+
+
+def check_dst_windows(
+    timezone: str = "America/New_York",
+    days: Iterable[str] = ("2026-03-08", "2026-11-01"),
+    cadences: Iterable[str] = ("4h", "1d"),
+) -> List[str]:
+    """
+    夏令时切换日的窗口自检：窗口首尾相接、起点落在本地整点边界、slug 各不相同。
+    返回问题列表（为空表示通过）。
+    """
+    tz = ZoneInfo(timezone)
+    problems: List[str] = []
+    for cadence in cadences:
+        family = MarketFamily(
+            key=f"check_{cadence}",
+            asset="btc",
+            cadence=cadence,
+            slug_template="check-{year}-{month_num}-{day}-{hour}",
+            timezone=timezone,
+        )
+        size_h = family.window_seconds // 3600
+        for day in days:
+            begin = datetime.fromisoformat(day).replace(tzinfo=tz)
+            count = 48 // size_h + 1
+            windows = family.upcoming_windows(begin.timestamp() - 1, count + 1)
+            if len(windows) != count + 1:
+                problems.append(f"{cadence} {day}: {count + 1} windows requested, {len(windows)} distinct slugs")
+            prev_end = None
+            for slug, (start, end) in windows.items():
+                local = datetime.fromtimestamp(start, tz=tz)
+                if local.minute or local.second or local.hour % size_h:
+                    problems.append(f"{cadence} {day}: {slug} starts at local {local:%H:%M}")
+                if prev_end is not None and start != prev_end:
+                    problems.append(f"{cadence} {day}: gap/overlap before {slug}")
+                if family.window_bounds(start) != (start, end) or family.window_bounds(end - 1) != (start, end):
+                    problems.append(f"{cadence} {day}: window_bounds inconsistent for {slug}")
+                prev_end = end
+    return problems
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Polymarket 市场注册表")
+    ap.add_argument("--config", type=str, default="", help=f"市场族配置文件（默认 {DEFAULT_CONFIG_PATH.name}）")
+    ap.add_argument("--windows", type=int, default=2, help="打印每个市场族当前及之后的窗口数")
+    ap.add_argument("--check-dst", action="store_true", help="自检夏令时切换日的 4h/1d 窗口")
+    ap.add_argument("--timezone", type=str, default="America/New_York", help="--check-dst 使用的时区")
+    args = ap.parse_args()
+
+    if args.check_dst:
+        problems = check_dst_windows(str(args.timezone))
+        for msg in problems:
+            print(f"[FAIL] {msg}", file=sys.stderr)
+        print(f"[INFO] DST window check: {'OK' if not problems else f'{len(problems)} problems'}")
+        sys.exit(1 if problems else 0)
+
+    now = datetime.now().timestamp()
+    for family in load_registry(Path(args.config) if args.config else None):
+        for slug, (start, end) in family.upcoming_windows(now, int(args.windows)).items():
+            local = datetime.fromtimestamp(start, tz=family.tz)
+            print(f"{family.key}\t{slug}\t{local.isoformat()}\t{(end - start) / 3600:.2f}h")
+
+
+if __name__ == "__main__":
+    main()
@@ -8,6 +8,8 @@ Polymarket多市场实时数据采集器
 - BTC 1小时市场: bitcoin-up-or-down-{date}-{hour}pm-et
 - ETH 1小时市场: ethereum-up-or-down-{date}-{hour}pm-et
 
+市场列表由 polymarket_markets.json 配置（--markets-config），新增资产/周期无需改代码。
+
 输出格式：每15分钟一个JSONL文件
 输出路径：../real_hot/{market_slug}_{timestamp}.jsonl
 """
@@ -16,87 +18,248 @@ import os
 import sys
 import time
 import json
+import argparse
+import threading
+import zlib
 import requests
-from datetime import datetime, timezone, timedelta
-from typing import Dict, List, Optional, Tuple
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from dataclasses import asdict, dataclass
+from requests.adapters import HTTPAdapter
+
+from polymarket_async_writer import OVERFLOW_POLICIES, AsyncLineWriter
+from polymarket_book_delta import BookDeltaEncoder
+from polymarket_book_summary import SUMMARY_COLUMNS, summary_path_for, summary_rows
+from polymarket_market_registry import DEFAULT_CONFIG_PATH, discover_active_markets, load_registry
+from polymarket_window_index import MANIFEST_NAME, WindowIndexBuilder, tick_meta
+from polymarket_ws_stream import WS_MARKET_URL, MarketChannelStream
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
 from pathlib import Path
 
-# API endpoints
-GAMMA_API = "https://gamma-api.polymarket.com"
-CLOB_API = "https://clob.polymarket.com"
+# API endpoints（可用环境变量或命令行覆盖，便于指向本地替身服务测试）
+GAMMA_API = os.environ.get("POLYMARKET_GAMMA_API", "https://gamma-api.polymarket.com").rstrip("/")
+CLOB_API = os.environ.get("POLYMARKET_CLOB_API", "https://clob.polymarket.com").rstrip("/")
+
+# POST /books 单次请求的最大token数
+BOOKS_BATCH_SIZE = 50
+
+# 距离窗口切换不足该秒数时，后台预先解析下一个窗口的市场
+PRERESOLVE_LEAD_S = 180
+
+# 共享HTTP连接池（见 get_session）
+_SESSION: Optional[requests.Session] = None
 
 # 输出目录
 OUTPUT_DIR = Path(__file__).parent / "real_hot"
 
-# 市场配置
-MARKETS = {
-    "btc_15m": {
-        "type": "15min",
-        "asset": "btc",
-        "slug_prefix": "btc-updown-15m"
-    },
-    "eth_15m": {
-        "type": "15min",
-        "asset": "eth",
-        "slug_prefix": "eth-updown-15m"
-    },
-    "btc_1h": {
-        "type": "1hour",
-        "asset": "btc",
-        "slug_prefix": "bitcoin-up-or-down"
-    },
-    "eth_1h": {
-        "type": "1hour",
-        "asset": "eth",
-        "slug_prefix": "ethereum-up-or-down"
-    }
-}
+# 已解析市场计划的持久化缓存（重启后无需再请求Gamma）
+PLAN_CACHE_FILE = Path(__file__).parent / ".cache" / "polymarket_market_plans.json"
+
+# 市场族配置文件（不存在时使用内置默认的4个市场，见 polymarket_market_registry）
+MARKETS_CONFIG_FILE = DEFAULT_CONFIG_PATH
 
 
-def get_15min_window_slug(asset: str, epoch: Optional[int] = None) -> str:
-    """计算15分钟窗口的slug"""
-    if epoch is None:
-        epoch = int(time.time())
-    window_start = (epoch // 900) * 900
-    return f"{asset}-updown-15m-{window_start}"
+@dataclass(frozen=True)
+class MarketPlan:
+    """
+    已解析好的市场采集计划（每个窗口解析一次，tick循环中不再解析metadata）
+    """
+    slug: str
+    question: str
+    token_ids: Tuple[str, ...]
+    outcomes: Tuple[str, ...]
+    window_start: int
+    window_end: int
+    
+    @classmethod
+    def from_market_info(cls, market_info: Dict, window_start: int, window_end: int) -> Optional["MarketPlan"]:
+        token_ids, outcomes = extract_token_ids(market_info)
+        if not token_ids:
+            print(f"[DEBUG] {market_info.get('slug')} - Failed to extract token_ids", file=sys.stderr)
+            print(f"[DEBUG] {market_info.get('slug')} - clobTokenIds: {market_info.get('clobTokenIds')}", file=sys.stderr)
+            return None
+        token_ids = token_ids[:2]  # 通常只有Yes/No两个
+        outcomes = [
+            str(outcomes[i]) if i < len(outcomes) else f"Token{i}"
+            for i in range(len(token_ids))
+        ]
+        return cls(
+            slug=str(market_info.get("slug") or ""),
+            question=str(market_info.get("question") or ""),
+            token_ids=tuple(token_ids),
+            outcomes=tuple(outcomes),
+            window_start=int(window_start),
+            window_end=int(window_end),
+        )
+    
+    def to_dict(self) -> Dict:
+        return asdict(self)
+    
+    @classmethod
+    def from_dict(cls, data: Dict) -> "MarketPlan":
+        return cls(
+            slug=str(data["slug"]),
+            question=str(data.get("question") or ""),
+            token_ids=tuple(str(t) for t in data["token_ids"]),
+            outcomes=tuple(str(o) for o in data.get("outcomes") or []),
+            window_start=int(data["window_start"]),
+            window_end=int(data["window_end"]),
+        )
 
 
-def get_1hour_market_slug(asset: str, target_time: Optional[datetime] = None) -> str:
+class MarketPlanCache:
     """
-    计算1小时市场的slug
+    MarketPlan的内存+磁盘缓存（JSON，按slug索引）
     
-    格式: {asset}-up-or-down-{month}-{day}-{hour}pm-et
-    例如: bitcoin-up-or-down-january-10-9pm-et
+    写入采用临时文件+rename，进程崩溃不会留下半个文件；
+    窗口结束超过keep_s秒的计划在保存时被清理。
     """
-    if target_time is None:
-        # 使用UTC时间转换为ET时间（UTC-5）
-        target_time = datetime.now(timezone.utc) - timedelta(hours=5)
     
-    # 向下取整到当前小时
-    target_time = target_time.replace(minute=0, second=0, microsecond=0)
+    def __init__(self, path: Optional[Path], *, keep_s: int = 86400):
+        self.path = Path(path) if path else None
+        self.keep_s = int(keep_s)
+        self._lock = threading.Lock()
+        self._plans: Dict[str, MarketPlan] = {}
+        self._load()
     
-    month = target_time.strftime('%B').lower()  # january
-    day = target_time.day
-    hour = target_time.hour
+    def _load(self) -> None:
+        if self.path is None or not self.path.exists():
+            return
+        try:
+            with self.path.open("r", encoding="utf-8") as f:
+                payload = json.load(f)
+            for slug, data in (payload.get("plans") or {}).items():
+                try:
+                    self._plans[slug] = MarketPlan.from_dict(data)
+                except Exception:
+                    continue
+            print(f"[INFO] Loaded {len(self._plans)} cached market plans from {self.path}")
+        except Exception as e:
+            print(f"[WARN] Failed to load market plan cache {self.path}: {e}", file=sys.stderr)
     
-    # 转换为12小时制
-    ampm = 'am' if hour < 12 else 'pm'
-    hour_12 = hour % 12
-    if hour_12 == 0:
-        hour_12 = 12
+    def get(self, slug: str) -> Optional[MarketPlan]:
+        with self._lock:
+            return self._plans.get(slug)
     
-    asset_name = "bitcoin" if asset == "btc" else "ethereum"
-    slug = f"{asset_name}-up-or-down-{month}-{day}-{hour_12}{ampm}-et"
+    def put(self, plan: MarketPlan) -> None:
+        with self._lock:
+            self._plans[plan.slug] = plan
+            cutoff = time.time() - self.keep_s
+            for slug in [k for k, v in self._plans.items() if v.window_end < cutoff]:
+                self._plans.pop(slug, None)
+            snapshot = {slug: p.to_dict() for slug, p in self._plans.items()}
+        self._save(snapshot)
     
-    return slug
+    def _save(self, snapshot: Dict[str, Dict]) -> None:
+        if self.path is None:
+            return
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.path.with_suffix(self.path.suffix + ".tmp")
+            with tmp.open("w", encoding="utf-8") as f:
+                json.dump({"saved_at": time.time(), "plans": snapshot}, f)
+            os.replace(tmp, self.path)
+        except Exception as e:
+            print(f"[WARN] Failed to save market plan cache {self.path}: {e}", file=sys.stderr)
+
+
+def resolve_market_plan(slug: str, window_start: int, window_end: int) -> Optional[MarketPlan]:
+    """通过Gamma解析slug并生成MarketPlan"""
+    market_info = fetch_market_info(slug)
+    if not market_info:
+        return None
+    if not market_info.get("slug"):
+        market_info = dict(market_info, slug=slug)
+    return MarketPlan.from_market_info(market_info, window_start, window_end)
+
+
+class MarketResolver:
+    """
+    后台解析市场计划（slug -> MarketPlan），带内存/磁盘缓存
+    
+    - prefetch(slug, window): 提前在后台线程解析（例如窗口切换前几分钟）
+    - get(slug, window): 非阻塞获取；未就绪时返回None并确保后台正在解析
+    解析失败的slug在retry_s秒后才会重试。
+    """
+    
+    def __init__(
+        self,
+        executor: ThreadPoolExecutor,
+        *,
+        plan_cache: Optional[MarketPlanCache] = None,
+        retry_s: float = 5.0,
+    ):
+        self._executor = executor
+        self._plan_cache = plan_cache or MarketPlanCache(None)
+        self._retry_s = float(retry_s)
+        self._lock = threading.Lock()
+        self._pending: Dict[str, Future] = {}
+        self._failed_at: Dict[str, float] = {}
+    
+    def prefetch(self, slug: str, window: Tuple[int, int]) -> None:
+        with self._lock:
+            self._submit_locked(slug, window)
+    
+    def _submit_locked(self, slug: str, window: Tuple[int, int]) -> None:
+        if slug in self._pending or self._plan_cache.get(slug) is not None:
+            return
+        failed_at = self._failed_at.get(slug)
+        if failed_at is not None and time.time() - failed_at < self._retry_s:
+            return
+        print(f"[INFO] Resolving market in background: {slug}")
+        self._pending[slug] = self._executor.submit(resolve_market_plan, slug, window[0], window[1])
+    
+    def _collect_locked(self, slug: str) -> Optional[MarketPlan]:
+        fut = self._pending.get(slug)
+        if fut is None or not fut.done():
+            return None
+        self._pending.pop(slug, None)
+        try:
+            plan = fut.result()
+        except Exception:
+            plan = None
+        if plan:
+            self._plan_cache.put(plan)
+            self._failed_at.pop(slug, None)
+        else:
+            self._failed_at[slug] = time.time()
+            print(f"[WARN] Market not found: {slug}", file=sys.stderr)
+        return plan
+    
+    def get(self, slug: str, window: Tuple[int, int], *, wait_s: float = 0.0) -> Optional[MarketPlan]:
+        with self._lock:
+            plan = self._plan_cache.get(slug) or self._collect_locked(slug)
+            if plan:
+                return plan
+            self._submit_locked(slug, window)
+            fut = self._pending.get(slug)
+        if fut is not None and wait_s > 0:
+            wait([fut], timeout=wait_s)
+            with self._lock:
+                return self._collect_locked(slug)
+        return None
+    
+    def seed(self, plan: MarketPlan) -> None:
+        """直接放入已解析的计划（例如发现流程批量拿到的市场）"""
+        with self._lock:
+            self._plan_cache.put(plan)
+            self._failed_at.pop(plan.slug, None)
+    
+    def retain(self, slugs: set) -> None:
+        """丢弃不再需要的失败记录"""
+        with self._lock:
+            for slug in list(self._failed_at):
+                if slug not in slugs:
+                    self._failed_at.pop(slug, None)
 
 
 def fetch_market_info(slug: str) -> Optional[Dict]:
-    """通过slug获取市场信息"""
+    """通过slug获取市场信息（复用共享连接池）"""
+    http = get_session()
     # 方法1: 使用 /markets/slug/{slug} (推荐)
     try:
         url = f"{GAMMA_API}/markets/slug/{slug}"
-        resp = requests.get(url, timeout=10)
+        resp = http.get(url, timeout=10)
         resp.raise_for_status()
         data = resp.json()
         
@@ -111,7 +274,7 @@ def fetch_market_info(slug: str) -> Optional[Dict]:
     # 方法2: 兜底，使用search
     try:
         url = f"{GAMMA_API}/markets"
-        resp = requests.get(url, params={"limit": 50, "search": slug}, timeout=10)
+        resp = http.get(url, params={"limit": 50, "search": slug}, timeout=10)
         resp.raise_for_status()
         markets = resp.json()
         
@@ -125,11 +288,29 @@ def fetch_market_info(slug: str) -> Optional[Dict]:
     return None
 
 
-def fetch_orderbook(token_id: str) -> Optional[Dict]:
+def get_session(pool_size: int = 32) -> requests.Session:
+    """共享的keep-alive连接池（所有市场/token复用）"""
+    global _SESSION
+    if _SESSION is None:
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=int(pool_size))
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        _SESSION = session
+    return _SESSION
+
+
+def fetch_orderbook(
+    token_id: str,
+    *,
+    session: Optional[requests.Session] = None,
+    timeout: float = 10,
+) -> Optional[Dict]:
     """获取orderbook数据"""
     try:
         url = f"{CLOB_API}/book"
-        resp = requests.get(url, params={"token_id": token_id}, timeout=10)
+        http = session if session is not None else requests
+        resp = http.get(url, params={"token_id": token_id}, timeout=timeout)
         resp.raise_for_status()
         return resp.json()
     except Exception as e:
@@ -137,134 +318,257 @@ def fetch_orderbook(token_id: str) -> Optional[Dict]:
         return None
 
 
-def collect_market_tick(market_info: Dict, market_key: str) -> Optional[Dict]:
+def fetch_orderbooks_batch(
+    token_ids: List[str],
+    *,
+    session: Optional[requests.Session] = None,
+    timeout: float = 10,
+) -> Optional[Dict[str, Dict]]:
     """
-    采集单个市场的tick数据
-    
-    返回格式：
-    {
-        "timestamp": epoch_ms,
-        "market_key": "btc_15m",
-        "market_slug": "btc-updown-15m-xxx",
-        "tokens": [
-            {
-                "outcome": "Yes",
-                "token_id": "xxx",
-                "orderbook": {...}
-            },
-            ...
-        ]
+    通过 POST /books 一次获取多个token的orderbook
+    
+    按 BOOKS_BATCH_SIZE 分块请求；单个分块失败时跳过该块，返回已成功分块的
+    {token_id: orderbook}（缺失的token由调用方回退到逐个 GET /book）。
+    所有分块都失败时返回None。
+    """
+    if not token_ids:
+        return {}
+    http = session if session is not None else requests
+    out: Dict[str, Dict] = {}
+    failed = 0
+    for i in range(0, len(token_ids), BOOKS_BATCH_SIZE):
+        chunk = token_ids[i:i + BOOKS_BATCH_SIZE]
+        try:
+            resp = http.post(
+                f"{CLOB_API}/books",
+                json=[{"token_id": tid} for tid in chunk],
+                timeout=timeout,
+            )
+            resp.raise_for_status()
+            data = resp.json()
+            if not isinstance(data, list):
+                raise ValueError(f"unexpected /books payload: {type(data).__name__}")
+        except Exception as e:
+            failed += 1
+            print(f"[WARN] Batch orderbook request failed ({len(chunk)} tokens): {e}", file=sys.stderr)
+            continue
+        for book in data:
+            if isinstance(book, dict) and book.get("asset_id"):
+                out[str(book["asset_id"])] = book
+    n_chunks = (len(token_ids) + BOOKS_BATCH_SIZE - 1) // BOOKS_BATCH_SIZE
+    if failed == n_chunks:
+        return None
+    return out
+
+
+def extract_token_ids(market_info: Dict) -> Tuple[List[str], List[str]]:
+    """从market_info中提取 (token_ids, outcomes)，长度对齐"""
+    token_ids = []
+    outcomes = []
+    
+    # 方法1: 从clobTokenIds提取
+    clob_ids = market_info.get("clobTokenIds")
+    if clob_ids:
+        # 可能是字符串 '["id1","id2"]' 或列表 ["id1","id2"]
+        if isinstance(clob_ids, str):
+            try:
+                token_ids = json.loads(clob_ids)
+            except:
+                pass
+        elif isinstance(clob_ids, list):
+            token_ids = clob_ids
+    
+    # 方法2: 从tokens字段提取（旧格式）
+    if not token_ids:
+        tokens_field = market_info.get("tokens", [])
+        for token in tokens_field:
+            tid = (token.get("token_id") or 
+                  token.get("clobTokenId") or 
+                  token.get("clob_token_id") or 
+                  token.get("tokenId"))
+            if tid:
+                token_ids.append(str(tid))
+                outcomes.append(token.get("outcome") or token.get("name") or "")
+    
+    # 提取outcomes
+    if not outcomes:
+        outcomes_field = market_info.get("outcomes")
+        if isinstance(outcomes_field, str):
+            try:
+                outcomes = json.loads(outcomes_field)
+            except:
+                outcomes = outcomes_field.split(",") if outcomes_field else []
+        elif isinstance(outcomes_field, list):
+            outcomes = outcomes_field
+    
+    # 确保outcomes和token_ids长度一致
+    while len(outcomes) < len(token_ids):
+        outcomes.append(f"Outcome {len(outcomes)}")
+    
+    return [str(t) for t in token_ids if t], list(outcomes)
+
+
+def format_levels(levels: List) -> List[List[float]]:
+    """转换格式：[{"price": "0.5", "size": "100"}] -> [[0.5, 100]]"""
+    out = []
+    for level in levels or []:
+        try:
+            if isinstance(level, dict):
+                p = float(level.get("price", 0))
+                s = float(level.get("size", 0))
+                out.append([p, s])
+            elif isinstance(level, list) and len(level) >= 2:
+                out.append([float(level[0]), float(level[1])])
+        except:
+            continue
+    return out
+
+
+def build_tick(
+    plan: MarketPlan,
+    market_key: str,
+    books: Dict[str, Optional[Dict]],
+    timestamp_ms: int,
+) -> Optional[Dict]:
+    """用已获取的orderbook组装一条tick记录（无网络请求、无metadata解析）"""
+    tick = {
+        "timestamp": int(timestamp_ms),
+        "market_key": market_key,
+        "market_slug": plan.slug,
+        "question": plan.question,
+        "tokens": []
     }
+    for token_id, outcome in zip(plan.token_ids, plan.outcomes):
+        orderbook = books.get(token_id)
+        if not orderbook:
+            continue
+        tick["tokens"].append({
+            "outcome": outcome,
+            "token_id": token_id,
+            "orderbook": {
+                "bids": format_levels(orderbook.get("bids", [])),
+                "asks": format_levels(orderbook.get("asks", []))
+            }
+        })
+    return tick if tick["tokens"] else None
+
+
+def fetch_books_with_deadline(
+    token_ids: List[str],
+    *,
+    executor: ThreadPoolExecutor,
+    session: requests.Session,
+    deadline_s: float,
+    use_batch: bool = True,
+) -> Dict[str, Optional[Dict]]:
     """
-    try:
-        tick = {
-            "timestamp": int(time.time() * 1000),
-            "market_key": market_key,
-            "market_slug": market_info.get("slug"),
-            "question": market_info.get("question"),
-            "tokens": []
+    在deadline_s内获取一组token的orderbook
+    
+    use_batch=True时先走一次 POST /books；失败或缺失的token在剩余时间内
+    回退为并发的逐个 GET /book。
+    """
+    t_end = time.time() + max(0.0, float(deadline_s))
+    books: Dict[str, Optional[Dict]] = {}
+    pending = list(dict.fromkeys(token_ids))
+    
+    if use_batch and pending:
+        fut = executor.submit(fetch_orderbooks_batch, pending, session=session, timeout=deadline_s)
+        done, _ = wait([fut], timeout=max(0.0, t_end - time.time()))
+        batch = fut.result() if done else None
+        if batch:
+            books.update(batch)
+        elif not done:
+            print(f"[WARN] Batch orderbook request missed tick deadline", file=sys.stderr)
+        pending = [tid for tid in pending if tid not in books]
+    
+    remaining = t_end - time.time()
+    if pending and remaining > 0:
+        futures = {
+            executor.submit(fetch_orderbook, tid, session=session, timeout=remaining): tid
+            for tid in pending
         }
-        
-        # 获取token IDs - 优先从clobTokenIds提取
-        token_ids = []
-        outcomes = []
-        
-        # 方法1: 从clobTokenIds提取
-        clob_ids = market_info.get("clobTokenIds")
-        if clob_ids:
-            # 可能是字符串 '["id1","id2"]' 或列表 ["id1","id2"]
-            if isinstance(clob_ids, str):
-                try:
-                    import json as json_module
-                    token_ids = json_module.loads(clob_ids)
-                except:
-                    pass
-            elif isinstance(clob_ids, list):
-                token_ids = clob_ids
-        
-        # 方法2: 从tokens字段提取（旧格式）
-        if not token_ids:
-            tokens_field = market_info.get("tokens", [])
-            for token in tokens_field:
-                tid = (token.get("token_id") or 
-                      token.get("clobTokenId") or 
-                      token.get("clob_token_id") or 
-                      token.get("tokenId"))
-                if tid:
-                    token_ids.append(str(tid))
-                    outcomes.append(token.get("outcome") or token.get("name") or "")
-        
-        # 提取outcomes
-        if not outcomes:
-            outcomes_field = market_info.get("outcomes")
-            if isinstance(outcomes_field, str):
-                try:
-                    import json as json_module
-                    outcomes = json_module.loads(outcomes_field)
-                except:
-                    outcomes = outcomes_field.split(",") if outcomes_field else []
-            elif isinstance(outcomes_field, list):
-                outcomes = outcomes_field
-        
-        # 确保outcomes和token_ids长度一致
-        while len(outcomes) < len(token_ids):
-            outcomes.append(f"Outcome {len(outcomes)}")
-        
-        # DEBUG: 如果还是没有token_ids
-        if not token_ids:
-            print(f"[DEBUG] {market_key} - Failed to extract token_ids", file=sys.stderr)
-            print(f"[DEBUG] {market_key} - clobTokenIds: {market_info.get('clobTokenIds')}", file=sys.stderr)
-        
-        for i, token_id in enumerate(token_ids[:2]):  # 通常只有Yes/No两个
-            if not token_id:
-                continue
-            
-            orderbook = fetch_orderbook(str(token_id))
-            if orderbook:
-                # 提取bids和asks
-                bids = orderbook.get("bids", [])
-                asks = orderbook.get("asks", [])
-                
-                # 转换格式：[{"price": "0.5", "size": "100"}] -> [[0.5, 100]]
-                bids_formatted = []
-                asks_formatted = []
-                
-                for bid in bids:
-                    try:
-                        if isinstance(bid, dict):
-                            p = float(bid.get("price", 0))
-                            s = float(bid.get("size", 0))
-                            bids_formatted.append([p, s])
-                        elif isinstance(bid, list) and len(bid) >= 2:
-                            bids_formatted.append([float(bid[0]), float(bid[1])])
-                    except:
-                        continue
-                
-                for ask in asks:
-                    try:
-                        if isinstance(ask, dict):
-                            p = float(ask.get("price", 0))
-                            s = float(ask.get("size", 0))
-                            asks_formatted.append([p, s])
-                        elif isinstance(ask, list) and len(ask) >= 2:
-                            asks_formatted.append([float(ask[0]), float(ask[1])])
-                    except:
-                        continue
-                
-                tick["tokens"].append({
-                    "outcome": outcomes[i] if i < len(outcomes) else f"Token{i}",
-                    "token_id": str(token_id),
-                    "orderbook": {
-                        "bids": bids_formatted,
-                        "asks": asks_formatted
-                    }
-                })
-        
-        return tick if tick["tokens"] else None
-        
-    except Exception as e:
-        print(f"[ERROR] Failed to collect tick for {market_key}: {e}", file=sys.stderr)
-        return None
+        done, not_done = wait(futures, timeout=remaining)
+        for fut in done:
+            try:
+                books[futures[fut]] = fut.result()
+            except Exception:
+                books[futures[fut]] = None
+        if not_done:
+            print(f"[WARN] {len(not_done)} orderbook requests missed tick deadline", file=sys.stderr)
+    return books
+
+
+def collect_ticks_concurrently(
+    current_markets: Dict[str, Dict],
+    *,
+    executor: ThreadPoolExecutor,
+    session: requests.Session,
+    timestamp_ms: int,
+    deadline_s: float,
+    use_batch: bool = True,
+) -> Dict[str, Dict]:
+    """
+    获取所有市场所有token的orderbook，所有市场共用同一个timestamp。
+    
+    默认一次 POST /books 取回全部token；超过deadline_s仍未返回的请求
+    本tick直接放弃（对应token缺失），不会拖慢其他市场。
+    """
+    all_token_ids: List[str] = []
+    for state in current_markets.values():
+        all_token_ids.extend(state["plan"].token_ids)
+    
+    books = fetch_books_with_deadline(
+        all_token_ids,
+        executor=executor,
+        session=session,
+        deadline_s=deadline_s,
+        use_batch=use_batch,
+    )
+    
+    return build_ticks(current_markets, books, timestamp_ms)
+
+
+def build_ticks(
+    current_markets: Dict[str, Dict],
+    books: Dict[str, Optional[Dict]],
+    timestamp_ms: int,
+) -> Dict[str, Dict]:
+    """为每个市场组装tick（books 可来自REST或WebSocket本地订单簿）"""
+    ticks = {}
+    for market_key, state in current_markets.items():
+        tick = build_tick(state["plan"], market_key, books, timestamp_ms)
+        if tick:
+            ticks[market_key] = tick
+    return ticks
+
+
+def write_stream_events(
+    writer: AsyncLineWriter,
+    current_markets: Dict[str, Dict],
+    events: List[Tuple[int, Dict]],
+) -> None:
+    """把WebSocket原始事件按token归属写入各市场的 events 文件"""
+    if not events:
+        return
+    owner = {}
+    for state in current_markets.values():
+        for tid in state["plan"].token_ids:
+            owner[tid] = state
+    for recv_ms, event in events:
+        asset_ids = [event.get("asset_id")] + [
+            c.get("asset_id") for c in event.get("price_changes") or [] if isinstance(c, dict)
+        ]
+        state = next((owner[a] for a in asset_ids if a in owner), None)
+        if state is None or not state.get("events_path"):
+            continue
+        writer.write_json(state["events_path"], {"recv_ts": recv_ms, "event": event})
+
+
+def close_market_outputs(writer: AsyncLineWriter, state: Dict) -> None:
+    """窗口结束：让写入线程关闭该市场的所有输出文件"""
+    for key in ("file_path", "summary_path", "events_path"):
+        if state.get(key):
+            writer.close(state[key])
 
 
 def get_output_file(market_slug: str) -> Path:
@@ -273,91 +577,382 @@ def get_output_file(market_slug: str) -> Path:
     return OUTPUT_DIR / filename
 
 
+def _stand_in_book(token_id: str, now: float) -> Dict:
+    """本地替身的orderbook：按token哈希和时间确定性生成，格式与 REST /book 一致"""
+    h = zlib.crc32(token_id.encode("utf-8"))
+    mid = round(0.5 + 0.3 * ((h % 100) / 100.0 - 0.5) + 0.02 * ((int(now) // 5 + h) % 5 - 2), 2)
+    mid = min(0.95, max(0.05, mid))
+    bids = [{"price": f"{mid - 0.01 * (i + 1):.2f}", "size": str(10 * (i + 1) + h % 7)} for i in range(5)]
+    asks = [{"price": f"{mid + 0.01 * (i + 1):.2f}", "size": str(12 * (i + 1) + h % 5)} for i in range(5)]
+    return {
+        "market": f"0x{h:08x}",
+        "asset_id": token_id,
+        "timestamp": str(int(now * 1000)),
+        "hash": f"{h:08x}{int(now)}",
+        # 与 REST 一致：bids 价格升序，asks 价格降序（最优价在末尾）
+        "bids": bids[::-1],
+        "asks": asks[::-1],
+    }
+
+
+def _clob_stand_in_handler(*, missing_every: int = 0, max_batch: int = BOOKS_BATCH_SIZE):
+    """
+    本地替身：GET /book?token_id=、POST /books（超过 max_batch 个token返回400），
+    missing_every>0 时 /books 省略 crc32(token_id) % missing_every == 0 的token（模拟部分返回）；
+    GET /stats 返回各接口的请求计数
+    """
+    stats: Dict[str, Any] = {"book": 0, "books": 0, "books_tokens": 0, "books_rejected": 0}
+    lock = threading.Lock()
+
+    def omitted(token_id: str) -> bool:
+        return missing_every > 0 and zlib.crc32(token_id.encode("utf-8")) % missing_every == 0
+
+    class Handler(BaseHTTPRequestHandler):
+        def _send_json(self, code: int, obj: Any) -> None:
+            body = json.dumps(obj).encode("utf-8")
+            self.send_response(code)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self) -> None:
+            path, _, query = self.path.partition("?")
+            if path == "/stats":
+                with lock:
+                    self._send_json(200, dict(stats))
+                return
+            if path != "/book":
+                self._send_json(404, {"error": "not found"})
+                return
+            params = dict(kv.split("=", 1) for kv in query.split("&") if "=" in kv)
+            token_id = params.get("token_id", "")
+            with lock:
+                stats["book"] += 1
+            if not token_id:
+                self._send_json(400, {"error": "token_id required"})
+                return
+            self._send_json(200, _stand_in_book(token_id, time.time()))
+
+        def do_POST(self) -> None:
+            if self.path.partition("?")[0] != "/books":
+                self._send_json(404, {"error": "not found"})
+                return
+            try:
+                payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)) or b"[]")
+                token_ids = [str(x["token_id"]) for x in payload]
+            except Exception:
+                self._send_json(400, {"error": "invalid payload"})
+                return
+            with lock:
+                stats["books"] += 1
+                stats["books_tokens"] += len(token_ids)
+                if len(token_ids) > max_batch:
+                    stats["books_rejected"] += 1
+            if len(token_ids) > max_batch:
+                self._send_json(400, {"error": f"too many tokens ({len(token_ids)} > {max_batch})"})
+                return
+            now = time.time()
+            self._send_json(200, [_stand_in_book(tid, now) for tid in token_ids if not omitted(tid)])
+
+        def log_message(self, format: str, *args: Any) -> None:
+            return
+
+    Handler.stats = stats
+    return Handler
+
+
 def main():
-    """主循环：每秒采集一次所有市场"""
+    """主循环：每秒并发采集一次所有市场"""
+    ap = argparse.ArgumentParser(description="Polymarket multi-market recorder")
+    ap.add_argument("--hz", type=float, default=1.0, help="采集频率")
+    ap.add_argument("--tick-deadline-s", type=float, default=0.8, help="单个tick内orderbook请求的截止时间")
+    ap.add_argument("--max-workers", type=int, default=16, help="并发请求线程数")
+    ap.add_argument("--no-batch", action="store_true", help="禁用 POST /books 批量请求，逐个token获取")
+    ap.add_argument("--clob-api", type=str, default="", help="覆盖CLOB API地址（如本地替身服务）")
+    ap.add_argument("--gamma-api", type=str, default="", help="覆盖Gamma API地址")
+    ap.add_argument(
+        "--mode",
+        type=str,
+        default="rest",
+        choices=["rest", "ws"],
+        help="rest=每tick轮询orderbook; ws=订阅market WebSocket频道，本地维护订单簿并按tick采样",
+    )
+    ap.add_argument("--ws-url", type=str, default=WS_MARKET_URL, help="market频道WebSocket地址")
+    ap.add_argument(
+        "--ws-max-age-s",
+        type=float,
+        default=0.0,
+        help="ws模式下本地订单簿超过N秒未更新即视为过期、改用REST（0=仅在断线后回退）",
+    )
+    ap.add_argument(
+        "--ws-record-events",
+        action="store_true",
+        help="ws模式下另外把原始事件写入 {market_slug}.events.jsonl",
+    )
+    ap.add_argument(
+        "--book-format",
+        type=str,
+        default="full",
+        choices=["full", "delta"],
+        help="full=每tick写完整orderbook; delta=周期关键帧+仅写变化价位",
+    )
+    ap.add_argument("--keyframe-s", type=float, default=60.0, help="delta格式下关键帧间隔（秒）")
+    ap.add_argument("--no-summary", action="store_true", help="不写 {market_slug}.summary.csv 盘口摘要")
+    ap.add_argument("--depth-cents", type=float, default=5.0, help="摘要中的深度统计范围（mid上下N美分）")
+    ap.add_argument(
+        "--no-index",
+        action="store_true",
+        help=f"窗口关闭时不写 {{market_slug}}.index.json，也不更新 {MANIFEST_NAME}",
+    )
+    ap.add_argument("--writer-queue", type=int, default=10_000, help="写入线程队列容量（记录数）")
+    ap.add_argument("--writer-flush-s", type=float, default=1.0, help="写入线程批量flush间隔（秒）")
+    ap.add_argument("--status-s", type=float, default=10.0, help="每N秒输出一行各市场最优买卖价与写入队列状态（0=不输出）")
+    ap.add_argument(
+        "--writer-overflow",
+        type=str,
+        default="drop_oldest",
+        choices=list(OVERFLOW_POLICIES),
+        help="写入队列满时的策略（delta格式下丢弃会连带丢掉其后的增量帧，并在下一tick补写关键帧）",
+    )
+    ap.add_argument("--plan-cache", type=str, default=str(PLAN_CACHE_FILE), help="市场计划缓存文件（空字符串=不持久化）")
+    ap.add_argument("--markets-config", type=str, default="", help=f"市场族配置文件（默认 {MARKETS_CONFIG_FILE.name}）")
+    ap.add_argument(
+        "--discover",
+        action="store_true",
+        help="定期通过Gamma /events批量发现当前及下一个窗口的市场（市场较多时减少逐个slug查询）",
+    )
+    ap.add_argument("--discover-interval-s", type=float, default=60.0, help="发现流程的执行间隔（秒）")
+    ap.add_argument("--serve-clob", type=int, default=0, help="不采集，在该端口启动 CLOB 本地替身（/book, /books, /stats）")
+    ap.add_argument("--serve-missing-every", type=int, default=0, help="替身 /books 省略约 1/N 的token（模拟部分返回）")
+    args = ap.parse_args()
+
+    if args.serve_clob:
+        handler = _clob_stand_in_handler(missing_every=int(args.serve_missing_every))
+        server = ThreadingHTTPServer(("127.0.0.1", int(args.serve_clob)), handler)
+        print(f"[INFO] CLOB stand-in on http://127.0.0.1:{int(args.serve_clob)}", file=sys.stderr)
+        server.serve_forever()
+        return
+    
+    global CLOB_API, GAMMA_API
+    if args.clob_api:
+        CLOB_API = str(args.clob_api).rstrip("/")
+    if args.gamma_api:
+        GAMMA_API = str(args.gamma_api).rstrip("/")
+    use_batch = not bool(args.no_batch)
+    use_delta = args.book_format == "delta"
+    use_ws = args.mode == "ws"
+    ws_max_age_s = float(args.ws_max_age_s) or None
+    write_summary = not bool(args.no_summary)
+    write_index = not bool(args.no_index)
+    depth_cents = float(args.depth_cents)
+    
+    interval = 1.0 / float(args.hz) if float(args.hz) > 0 else 1.0
+    deadline_s = max(0.05, min(float(args.tick_deadline_s), interval))
+    
     print(f"[INFO] Polymarket多市场采集器启动")
     print(f"[INFO] 输出目录: {OUTPUT_DIR}")
-    print(f"[INFO] 采集市场: {', '.join(MARKETS.keys())}")
+    families = load_registry(Path(args.markets_config) if args.markets_config else MARKETS_CONFIG_FILE)
+    if not families:
+        print("[ERROR] 市场配置为空", file=sys.stderr)
+        return
+    print(f"[INFO] 采集市场: {', '.join(f.key for f in families)}")
+    print(f"[INFO] 采集频率: {1.0 / interval:.2f} Hz, tick截止: {deadline_s:.2f}s, 批量请求: {use_batch}")
+    print(f"[INFO] CLOB: {CLOB_API}  Gamma: {GAMMA_API}")
+    if use_ws:
+        print(f"[INFO] 模式: WebSocket market频道 {args.ws_url} (记录原始事件: {bool(args.ws_record_events)})")
+    if use_delta:
+        print(f"[INFO] 输出格式: delta（关键帧间隔 {float(args.keyframe_s):.0f}s）")
     
     # 确保输出目录存在
     OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
     
+    session = get_session(pool_size=max(4, int(args.max_workers)))
+    executor = ThreadPoolExecutor(max_workers=max(1, int(args.max_workers)))
+    # 市场解析使用独立线程池，不与orderbook请求抢线程
+    resolve_executor = ThreadPoolExecutor(max_workers=2)
+    plan_cache = MarketPlanCache(Path(args.plan_cache) if args.plan_cache else None)
+    resolver = MarketResolver(resolve_executor, plan_cache=plan_cache)
+    
+    writer = AsyncLineWriter(
+        max_queue=int(args.writer_queue),
+        flush_interval_s=float(args.writer_flush_s),
+        overflow=str(args.writer_overflow),
+    )
+    last_dropped = 0
+    status_s = float(args.status_s)
+    status: Dict[str, Tuple[str, str]] = {}
+    last_status = 0.0
+    
+    discovery: Optional[Future] = None
+    next_discover_at = 0.0
+    
+    stream = None
+    if use_ws:
+        stream = MarketChannelStream(args.ws_url, keep_events=bool(args.ws_record_events))
+        stream.start()
+    
     # 当前市场状态
-    current_markets = {}  # {market_key: {"info": ..., "file": ...}}
+    current_markets = {}  # {market_key: {"plan": MarketPlan, "file_path": ...}}
     
     while True:
         try:
-            now = int(time.time())
+            t0 = time.time()
+            now = int(t0)
+            
+            # 发现流程：后台批量查询Gamma，结果直接放入计划缓存
+            if args.discover:
+                first = next_discover_at == 0.0
+                if discovery is None and t0 >= next_discover_at:
+                    next_discover_at = t0 + max(1.0, float(args.discover_interval_s))
+                    discovery = resolve_executor.submit(
+                        discover_active_markets, families, gamma_api=GAMMA_API, now=now, session=session
+                    )
+                # 首次发现同步等待，避免启动时再逐个slug查询
+                if discovery is not None and (first or discovery.done()):
+                    try:
+                        for _, info, bounds in discovery.result(timeout=15).values():
+                            plan = MarketPlan.from_market_info(info, bounds[0], bounds[1])
+                            if plan:
+                                resolver.seed(plan)
+                    except Exception as e:
+                        print(f"[WARN] Market discovery failed: {e}", file=sys.stderr)
+                    discovery = None
             
             # 检查并更新每个市场
-            for market_key, config in MARKETS.items():
-                market_type = config["type"]
-                asset = config["asset"]
-                
+            wanted_slugs = set()
+            for family in families:
+                market_key = family.key
                 # 计算当前窗口的slug
-                if market_type == "15min":
-                    slug = get_15min_window_slug(asset, now)
-                elif market_type == "1hour":
-                    slug = get_1hour_market_slug(asset)
-                else:
+                window = family.window_bounds(now)
+                slug = family.slug_for(window[0])
+                wanted_slugs.add(slug)
+                
+                # 临近窗口切换：后台预解析下一个窗口
+                if window[1] - now <= PRERESOLVE_LEAD_S:
+                    next_window = family.window_bounds(window[1])
+                    next_slug = family.slug_for(next_window[0])
+                    wanted_slugs.add(next_slug)
+                    resolver.prefetch(next_slug, next_window)
+                
+                state = current_markets.get(market_key)
+                if state is not None and state.get("slug") == slug:
                     continue
                 
-                # 检查是否需要更新市场信息
-                need_update = False
-                if market_key not in current_markets:
-                    need_update = True
-                elif current_markets[market_key].get("slug") != slug:
-                    # 窗口切换，关闭旧文件
-                    old_file = current_markets[market_key].get("file")
-                    if old_file:
-                        old_file.close()
-                    need_update = True
+                # 窗口切换（或首次启动）：从缓存取新市场，未就绪则本tick跳过该市场
+                plan = resolver.get(slug, window)
+                if state is not None:
+                    # 关闭旧文件
+                    close_market_outputs(writer, state)
+                    current_markets.pop(market_key, None)
+                    status.pop(market_key, None)
+                if not plan:
+                    continue
+                
+                output_file = get_output_file(slug)
+                index = None
+                if write_index:
+                    index = WindowIndexBuilder(
+                        output_file,
+                        market_key=market_key,
+                        market_slug=slug,
+                        window_start=window[0],
+                        window_end=window[1],
+                        book_format=args.book_format,
+                        gap_ms=int(2500 * interval),
+                        manifest_path=OUTPUT_DIR / MANIFEST_NAME,
+                    )
+                writer.open(output_file, index=index)
+                summary_path = None
+                if write_summary:
+                    summary_path = summary_path_for(OUTPUT_DIR, slug)
+                    writer.open(summary_path, csv_header=SUMMARY_COLUMNS)
+                events_path = None
+                if use_ws and args.ws_record_events:
+                    events_path = OUTPUT_DIR / f"{slug}.events.jsonl"
+                    writer.open(events_path)
+                
+                current_markets[market_key] = {
+                    "plan": plan,
+                    "slug": slug,
+                    "file_path": output_file,
+                    "summary_path": summary_path,
+                    "events_path": events_path,
+                    "encoder": BookDeltaEncoder(float(args.keyframe_s)) if use_delta else None,
+                }
+                
+                print(f"[INFO] {market_key}: {plan.question}")
+                print(f"[INFO] Output: {output_file}")
+            resolver.retain(wanted_slugs)
+            
+            # 所有市场共用同一个tick时间戳，并发采集
+            tick_ts_ms = int(time.time() * 1000)
+            if stream is not None:
+                # WebSocket模式：从本地订单簿采样
+                token_ids = [tid for st in current_markets.values() for tid in st["plan"].token_ids]
+                stream.set_assets(token_ids)
+                books = {tid: stream.store.snapshot(tid, max_age_s=ws_max_age_s) for tid in token_ids}
+                # 尚无快照、断线后未重新收到快照或已过期的token，本tick回退到REST
+                stale = [tid for tid, book in books.items() if book is None]
+                if stale:
+                    books.update(fetch_books_with_deadline(
+                        stale,
+                        executor=executor,
+                        session=session,
+                        deadline_s=deadline_s,
+                        use_batch=use_batch,
+                    ))
+                ticks = build_ticks(current_markets, books, tick_ts_ms)
+                if args.ws_record_events:
+                    write_stream_events(writer, current_markets, stream.drain_events())
+            else:
+                ticks = collect_ticks_concurrently(
+                    current_markets,
+                    executor=executor,
+                    session=session,
+                    timestamp_ms=tick_ts_ms,
+                    deadline_s=deadline_s,
+                    use_batch=use_batch,
+                )
+            
+            for market_key, tick in ticks.items():
+                market_state = current_markets[market_key]
+                # 交给写入线程（delta模式下写关键帧/增量帧）
+                # 写入队列丢过该文件的记录时，增量链已断，下一条必须是关键帧
+                encoder = market_state.get("encoder")
+                if encoder is not None and writer.needs_keyframe(market_state["file_path"]):
+                    encoder.reset()
+                record = encoder.encode(tick) if encoder is not None else tick
+                is_delta = record.get("type") == "delta"
+                rows = summary_rows(tick, depth_cents=depth_cents)
+                meta = None
+                if write_index:
+                    meta = tick_meta(tick["timestamp"], rows, keyframe=not is_delta)
+                if not writer.write_json(market_state["file_path"], record, meta=meta, chained=is_delta) and encoder is not None:
+                    encoder.reset()
                 
-                if need_update:
-                    print(f"[INFO] Fetching new market: {market_key} -> {slug}")
-                    market_info = fetch_market_info(slug)
-                    
-                    if market_info:
-                        output_file = get_output_file(slug)
-                        file_handle = open(output_file, "a")
-                        
-                        current_markets[market_key] = {
-                            "info": market_info,
-                            "slug": slug,
-                            "file": file_handle,
-                            "file_path": output_file
-                        }
-                        
-                        print(f"[INFO] {market_key}: {market_info.get('question')}")
-                        print(f"[INFO] Output: {output_file}")
-                    else:
-                        print(f"[WARN] Market not found: {slug}", file=sys.stderr)
-                        # 保留旧的市场信息继续采集
-                        continue
+                if market_state.get("summary_path"):
+                    writer.write_csv_rows(market_state["summary_path"], rows)
                 
-                # 采集tick数据
-                if market_key in current_markets:
-                    market_state = current_markets[market_key]
-                    tick = collect_market_tick(market_state["info"], market_key)
-                    
-                    if tick:
-                        # 写入JSONL
-                        file_handle = market_state["file"]
-                        file_handle.write(json.dumps(tick) + "\n")
-                        file_handle.flush()
-                        
-                        # 输出状态
-                        if len(tick["tokens"]) >= 1:
-                            token_book = tick["tokens"][0]["orderbook"]
-                            bids = token_book.get("bids", [])
-                            asks = token_book.get("asks", [])
-                            best_bid = bids[0][0] if bids and len(bids[0]) > 0 else None
-                            best_ask = asks[0][0] if asks and len(asks[0]) > 0 else None
-                            print(f"[{market_key}] bid={best_bid if best_bid else 'N/A'} "
-                                  f"ask={best_ask if best_ask else 'N/A'}", flush=True)
+                # 记下状态（第一个token的最优买卖价），按 --status-s 抽样输出
+                if rows:
+                    best_bid, best_ask = rows[0][4], rows[0][5]
+                    status[market_key] = (best_bid if best_bid != '' else 'N/A', best_ask if best_ask != '' else 'N/A')
             
-            # 每秒采集一次
-            time.sleep(1)
+            # 状态行抽样输出：采集循环内不逐tick写stdout
+            if status_s > 0 and t0 - last_status >= status_s:
+                last_status = t0
+                markets_text = " ".join(f"[{k}] bid={b} ask={a}" for k, (b, a) in sorted(status.items()))
+                print(f"{markets_text or '[no markets]'} queue={writer.queue_depth()} written={writer.written}", flush=True)
+                if writer.dropped != last_dropped:
+                    print(f"[WARN] writer queue overflow ({args.writer_overflow}): "
+                          f"dropped {writer.dropped - last_dropped} records", file=sys.stderr)
+                    last_dropped = writer.dropped
+            
+            # 按固定节拍采集（扣除本轮耗时）
+            to_sleep = interval - (time.time() - t0)
+            if to_sleep > 0:
+                time.sleep(to_sleep)
             
         except KeyboardInterrupt:
             print("\n[INFO] Shutting down...")
@@ -366,11 +961,16 @@ def main():
             print(f"[ERROR] Main loop error: {e}", file=sys.stderr)
             time.sleep(5)  # 出错后等待5秒
     
-    # 关闭所有文件
+    executor.shutdown(wait=False)
+    resolve_executor.shutdown(wait=False)
+    if stream is not None:
+        stream.stop()
+    
+    # 写完剩余记录并关闭所有文件
     for market_key, state in current_markets.items():
-        if "file" in state and state["file"]:
-            state["file"].close()
-            print(f"[INFO] Closed {market_key}: {state['file_path']}")
+        close_market_outputs(writer, state)
+        print(f"[INFO] Closed {market_key}: {state['file_path']}")
+    writer.stop()
     
     print("[INFO] Recorder stopped")
 
@@ -0,0 +1,329 @@
+#!/usr/bin/env python3
+"""
+Polymarket 窗口数据文件的索引与目录清单（manifest）
+
+每个窗口文件 {market_slug}.jsonl 关闭时写一个 {market_slug}.index.json：
+
+    {
+      "market_slug", "market_key", "file", "book_format",
+      "window_start", "window_end",          # 秒（回填旧文件时可能为null）
+      "first_ts", "last_ts", "ticks", "bytes",
+      "gaps": [[prev_ts, ts], ...],          # 相邻tick间隔超过 gap_ms 的位置
+      "minutes": [[minute_ts, offset], ...], # 每分钟的seek位置（字节偏移）
+      "open":  {outcome: {"best_bid", "best_ask", "mid"}},
+      "close": {outcome: {"best_bid", "best_ask", "mid"}}
+    }
+
+minutes 中的偏移是“可直接开始读取”的位置：full格式为该分钟第一条记录，
+delta格式为该分钟第一条记录之前最近的关键帧（从该处起用 iter_books 还原）。
+
+同时向目录下的 manifest.jsonl 追加一行（不含 minutes/gaps 明细），
+研究查询只需读清单即可，例如：
+
+    from polymarket_window_index import query_manifest, close_mid
+    rows = query_manifest(OUTPUT_DIR, lambda w: (close_mid(w, "Up") or 0) > 0.9)
+
+旧数据可用 `python polymarket_window_index.py DIR --rebuild` 回填索引和清单。
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import sys
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from polymarket_book_delta import BookReplayState
+from polymarket_book_summary import summary_rows
+
+MANIFEST_NAME = "manifest.jsonl"
+
+# 默认按1Hz采集：相邻tick间隔超过2.5秒记为缺口
+DEFAULT_GAP_MS = 2500
+
+
+def index_path_for(data_path: Path) -> Path:
+    p = Path(data_path)
+    stem = p.name[: -len(".jsonl")] if p.name.endswith(".jsonl") else p.name
+    return p.with_name(stem + ".index.json")
+
+
+def tick_meta(timestamp_ms: int, rows: List[List[Any]], *, keyframe: bool = True) -> Dict[str, Any]:
+    """
+    由摘要行（polymarket_book_summary.summary_rows）生成写入索引所需的信息
+
+    keyframe=False 表示该记录是delta增量帧（不能作为seek起点）
+    """
+    prices = {}
+    for row in rows:
+        prices[str(row[3])] = {
+            "best_bid": None if row[4] == "" else row[4],
+            "best_ask": None if row[5] == "" else row[5],
+            "mid": None if row[6] == "" else row[6],
+        }
+    return {"ts": int(timestamp_ms), "key": bool(keyframe), "prices": prices}
+
+
+class WindowIndexBuilder:
+    """
+    单个窗口文件的索引构建器
+
+    add(offset, nbytes, meta) 按写入顺序调用（由写入线程调用，记录的字节偏移在那里已知），
+    finish() 写出 index.json 并向 manifest 追加一行。
+    """
+
+    def __init__(
+        self,
+        data_path: Path,
+        *,
+        market_key: Optional[str] = None,
+        market_slug: Optional[str] = None,
+        window_start: Optional[int] = None,
+        window_end: Optional[int] = None,
+        book_format: str = "full",
+        gap_ms: int = DEFAULT_GAP_MS,
+        manifest_path: Optional[Path] = None,
+    ) -> None:
+        self.data_path = Path(data_path)
+        self.market_key = market_key
+        self.market_slug = market_slug or self.data_path.name[: -len(".jsonl")]
+        self.window_start = window_start
+        self.window_end = window_end
+        self.book_format = book_format
+        self.gap_ms = int(gap_ms)
+        self.manifest_path = manifest_path
+        self.reset()
+
+    def reset(self) -> None:
+        self.first_ts: Optional[int] = None
+        self.last_ts: Optional[int] = None
+        self.ticks = 0
+        self.bytes = 0
+        self.gaps: List[List[int]] = []
+        self.minutes: List[List[int]] = []
+        self.open: Dict[str, Any] = {}
+        self.close: Dict[str, Any] = {}
+        self._last_key_offset: Optional[int] = None
+        self._last_minute: Optional[int] = None
+
+    def add(self, offset: int, nbytes: int, meta: Dict[str, Any]) -> None:
+        ts = int(meta["ts"])
+        if meta.get("key", True):
+            self._last_key_offset = int(offset)
+        if self.first_ts is None:
+            self.first_ts = ts
+            self.open = meta.get("prices") or {}
+        elif self.last_ts is not None and ts - self.last_ts > self.gap_ms:
+            self.gaps.append([self.last_ts, ts])
+        minute = ts // 60_000 * 60_000
+        if minute != self._last_minute:
+            seek = self._last_key_offset if self._last_key_offset is not None else int(offset)
+            self.minutes.append([minute, seek])
+            self._last_minute = minute
+        self.last_ts = ts
+        self.close = meta.get("prices") or self.close
+        self.ticks += 1
+        self.bytes = int(offset) + int(nbytes)
+
+    def resume(self) -> None:
+        """数据文件已有内容（重启后追加写入）：先扫描已有记录"""
+        build_index_from_file(self.data_path, builder=self)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "market_slug": self.market_slug,
+            "market_key": self.market_key,
+            "file": self.data_path.name,
+            "book_format": self.book_format,
+            "window_start": self.window_start,
+            "window_end": self.window_end,
+            "first_ts": self.first_ts,
+            "last_ts": self.last_ts,
+            "ticks": self.ticks,
+            "bytes": self.bytes,
+            "gaps": self.gaps,
+            "minutes": self.minutes,
+            "open": self.open,
+            "close": self.close,
+        }
+
+    def finish(self) -> Optional[Dict[str, Any]]:
+        """写出索引文件并追加manifest；没有任何tick时不写"""
+        if not self.ticks:
+            return None
+        index = self.to_dict()
+        _atomic_write_json(index_path_for(self.data_path), index)
+        if self.manifest_path is not None:
+            with Path(self.manifest_path).open("a", encoding="utf-8") as f:
+                f.write(json.dumps(manifest_entry(index)) + "\n")
+        return index
+
+
+def manifest_entry(index: Dict[str, Any]) -> Dict[str, Any]:
+    """清单中的一行：索引去掉分钟偏移和缺口明细"""
+    entry = {k: v for k, v in index.items() if k not in ("minutes", "gaps")}
+    gaps = index.get("gaps") or []
+    entry["gap_count"] = len(gaps)
+    entry["max_gap_ms"] = max((b - a for a, b in gaps), default=0)
+    return entry
+
+
+def _atomic_write_json(path: Path, obj: Any) -> None:
+    tmp = path.with_name(path.name + ".tmp")
+    with tmp.open("w", encoding="utf-8") as f:
+        json.dump(obj, f)
+    os.replace(tmp, path)
+
+
+def _iter_records_with_offsets(path: Path) -> Iterator[tuple]:
+    offset = 0
+    with Path(path).open("rb") as f:
+        for raw in f:
+            start = offset
+            offset += len(raw)
+            if not raw.endswith(b"\n"):
+                # 尚未写完的最后一行
+                break
+            try:
+                yield start, len(raw), json.loads(raw)
+            except Exception:
+                continue
+
+
+def build_index_from_file(
+    data_path: Path,
+    *,
+    builder: Optional[WindowIndexBuilder] = None,
+    depth_cents: float = 5.0,
+) -> WindowIndexBuilder:
+    """扫描已有的窗口文件（full或delta格式）生成索引；用于回填或重启后续写"""
+    if builder is None:
+        builder = WindowIndexBuilder(data_path)
+    builder.reset()
+    state = BookReplayState()
+    saw_delta = False
+    for offset, nbytes, record in _iter_records_with_offsets(data_path):
+        if not isinstance(record, dict) or "timestamp" not in record:
+            continue
+        is_delta = record.get("type") == "delta"
+        saw_delta = saw_delta or is_delta or record.get("type") == "key"
+        tick = state.apply(record)
+        if tick is None:
+            continue
+        if builder.market_key is None:
+            builder.market_key = tick.get("market_key")
+        rows = summary_rows(tick, depth_cents=depth_cents)
+        builder.add(offset, nbytes, tick_meta(tick["timestamp"], rows, keyframe=not is_delta))
+    if saw_delta:
+        builder.book_format = "delta"
+    return builder
+
+
+def load_manifest(directory: Path) -> Dict[str, Dict[str, Any]]:
+    """读取清单 {market_slug: entry}；同一窗口出现多次时以最后一行为准"""
+    path = Path(directory) / MANIFEST_NAME
+    out: Dict[str, Dict[str, Any]] = {}
+    if not path.exists():
+        return out
+    with path.open("r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except Exception:
+                continue
+            if isinstance(entry, dict) and entry.get("market_slug"):
+                out[entry["market_slug"]] = entry
+    return out
+
+
+def query_manifest(
+    directory: Path,
+    where: Optional[Callable[[Dict[str, Any]], bool]] = None,
+) -> List[Dict[str, Any]]:
+    """按条件筛选窗口（只读清单，不打开数据文件），按 first_ts 排序"""
+    entries = [e for e in load_manifest(directory).values() if where is None or where(e)]
+    entries.sort(key=lambda e: e.get("first_ts") or 0)
+    return entries
+
+
+def close_mid(entry: Dict[str, Any], outcome: str = "Up") -> Optional[float]:
+    """窗口最后一个tick中某个outcome的mid"""
+    return ((entry.get("close") or {}).get(outcome) or {}).get("mid")
+
+
+def rebuild_manifest(directory: Path, *, force: bool = False) -> int:
+    """
+    为目录下所有窗口文件补建索引（索引缺失或早于数据文件时重建），并重写manifest
+
+    返回清单中的窗口数
+    """
+    directory = Path(directory)
+    entries = []
+    for data_path in sorted(directory.glob("*.jsonl")):
+        if data_path.name.endswith(".events.jsonl") or data_path.name == MANIFEST_NAME:
+            continue
+        idx_path = index_path_for(data_path)
+        old = None
+        if idx_path.exists():
+            try:
+                with idx_path.open("r", encoding="utf-8") as f:
+                    old = json.load(f)
+            except Exception:
+                old = None
+        index = old
+        if force or old is None or idx_path.stat().st_mtime < data_path.stat().st_mtime:
+            # 重建时保留旧索引中的窗口边界（数据文件本身不含）
+            builder = WindowIndexBuilder(
+                data_path,
+                window_start=(old or {}).get("window_start"),
+                window_end=(old or {}).get("window_end"),
+            )
+            index = build_index_from_file(data_path, builder=builder).finish()
+        if index:
+            entries.append(manifest_entry(index))
+    tmp = directory / (MANIFEST_NAME + ".tmp")
+    with tmp.open("w", encoding="utf-8") as f:
+        for entry in entries:
+            f.write(json.dumps(entry) + "\n")
+    os.replace(tmp, directory / MANIFEST_NAME)
+    return len(entries)
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Polymarket window index / manifest")
+    ap.add_argument("directory", nargs="?", default=str(Path(__file__).parent / "real_hot"))
+    ap.add_argument("--rebuild", action="store_true", help="补建缺失的索引并重写manifest")
+    ap.add_argument("--force", action="store_true", help="配合--rebuild：重建所有索引")
+    ap.add_argument("--outcome", type=str, default="Up")
+    ap.add_argument("--close-mid-above", type=float, default=None)
+    ap.add_argument("--close-mid-below", type=float, default=None)
+    ap.add_argument("--market-key", type=str, default="")
+    args = ap.parse_args()
+
+    if args.rebuild:
+        n = rebuild_manifest(Path(args.directory), force=bool(args.force))
+        print(f"[INFO] manifest rebuilt: {n} windows", file=sys.stderr)
+
+    def where(e: Dict[str, Any]) -> bool:
+        if args.market_key and e.get("market_key") != args.market_key:
+            return False
+        mid = close_mid(e, args.outcome)
+        if args.close_mid_above is not None and (mid is None or mid <= args.close_mid_above):
+            return False
+        if args.close_mid_below is not None and (mid is None or mid >= args.close_mid_below):
+            return False
+        return True
+
+    for e in query_manifest(Path(args.directory), where):
+        print(json.dumps({
+            "market_slug": e["market_slug"],
+            "ticks": e.get("ticks"),
+            "gap_count": e.get("gap_count"),
+            "close_mid": close_mid(e, args.outcome),
+        }))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,592 @@
+#!/usr/bin/env python3
+"""
+Polymarket CLOB market WebSocket 频道客户端
+
+订阅所有跟踪中的token，基于 `book` 快照和 `price_change` 事件维护本地订单簿，
+供采集器按tick采样（输出与REST模式相同的JSONL结构），也可保留原始事件。
+
+依赖：websocket-client（pip install websocket-client）
+
+连接断开（或超过 3 个 ping 间隔没有收到任何消息）时，清空该连接订阅的本地订单簿：
+断线期间的增量已经丢失，重连后等新的 book 快照到达前 snapshot() 返回 None，
+由采集器回退到 REST。snapshot(token_id, max_age_s=...) 另可按最后更新时间判定过期。
+
+测试时可用 --ws-url ws://127.0.0.1:PORT 指向本地替身服务：
+
+    python polymarket_ws_stream.py --serve 8765 [--serve-drop-after-s 20] [--serve-stall-after-s 30]
+    python polymarket_ws_stream.py --serve 8765 --serve-replay real_hot/xxx.events.jsonl [--serve-speed 10]
+
+回放模式按录制时间推进（断线期间也继续前进），新连接从当前位置重建的 book 快照开始。
+"""
+
+from __future__ import annotations
+
+import argparse
+import base64
+import hashlib
+import json
+import os
+import random
+import socket
+import socketserver
+import struct
+import sys
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Iterable, List, Optional, Tuple
+
+try:
+    import websocket  # type: ignore  # websocket-client
+except ImportError:  # pragma: no cover - 可选依赖
+    websocket = None
+
+WS_MARKET_URL = os.environ.get(
+    "POLYMARKET_WS_URL", "wss://ws-subscriptions-clob.polymarket.com/ws/market"
+)
+
+
+def _parse_levels(levels: Iterable[Any]) -> Dict[float, float]:
+    out: Dict[float, float] = {}
+    for level in levels or []:
+        try:
+            if isinstance(level, dict):
+                p = float(level.get("price", 0))
+                s = float(level.get("size", 0))
+            else:
+                p, s = float(level[0]), float(level[1])
+        except Exception:
+            continue
+        if s > 0:
+            out[p] = s
+    return out
+
+
+class LocalBookStore:
+    """
+    线程安全的本地订单簿集合（token_id -> bids/asks）
+
+    snapshot() 的价位顺序与 REST /book 一致：bids 价格升序，asks 价格降序。
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._books: Dict[str, Dict[str, Dict[float, float]]] = {}
+        self._updated_at: Dict[str, float] = {}
+
+    def apply_event(self, event: Dict[str, Any]) -> None:
+        etype = event.get("event_type")
+        if etype == "book":
+            tid = str(event.get("asset_id") or "")
+            if not tid:
+                return
+            bids = _parse_levels(event.get("bids") or event.get("buys") or [])
+            asks = _parse_levels(event.get("asks") or event.get("sells") or [])
+            with self._lock:
+                self._books[tid] = {"bids": bids, "asks": asks}
+                self._updated_at[tid] = time.time()
+        elif etype == "price_change":
+            # 新格式: price_changes=[{asset_id, price, size, side}]
+            # 旧格式: asset_id + changes=[{price, size, side}]
+            changes = event.get("price_changes")
+            if changes is None:
+                tid = event.get("asset_id")
+                changes = [dict(c, asset_id=tid) for c in event.get("changes") or []]
+            with self._lock:
+                for c in changes:
+                    tid = str(c.get("asset_id") or "")
+                    book = self._books.get(tid)
+                    if book is None:
+                        # 尚未收到快照，增量无法应用
+                        continue
+                    side = "bids" if str(c.get("side", "")).upper() == "BUY" else "asks"
+                    try:
+                        p = float(c.get("price"))
+                        s = float(c.get("size"))
+                    except Exception:
+                        continue
+                    if s <= 0:
+                        book[side].pop(p, None)
+                    else:
+                        book[side][p] = s
+                    self._updated_at[tid] = time.time()
+
+    def snapshot(self, token_id: str, max_age_s: Optional[float] = None) -> Optional[Dict[str, List[List[float]]]]:
+        """max_age_s>0 时，超过该时间没有更新的订单簿视为过期，返回None"""
+        with self._lock:
+            book = self._books.get(str(token_id))
+            if book is None:
+                return None
+            if max_age_s and time.time() - self._updated_at.get(str(token_id), 0.0) > float(max_age_s):
+                return None
+            return {
+                "bids": [[p, s] for p, s in sorted(book["bids"].items())],
+                "asks": [[p, s] for p, s in sorted(book["asks"].items(), reverse=True)],
+            }
+
+    def clear(self, token_ids: Iterable[str]) -> None:
+        """丢弃这些token的订单簿（连接断开后不再可信）"""
+        with self._lock:
+            for tid in token_ids:
+                self._books.pop(str(tid), None)
+                self._updated_at.pop(str(tid), None)
+
+    def retain(self, token_ids: Iterable[str]) -> None:
+        keep = set(str(t) for t in token_ids)
+        with self._lock:
+            for tid in list(self._books):
+                if tid not in keep:
+                    self._books.pop(tid, None)
+                    self._updated_at.pop(tid, None)
+
+
+class MarketChannelStream:
+    """
+    后台线程：连接market频道、订阅token、把事件应用到LocalBookStore
+
+    - set_assets(ids): 跟踪的token集合变化时重新订阅（重连）
+    - drain_events(): 取出自上次调用以来收到的原始事件 [(recv_ts_ms, event), ...]
+      （仅当 keep_events=True 时保留）
+    """
+
+    def __init__(
+        self,
+        url: str = WS_MARKET_URL,
+        *,
+        store: Optional[LocalBookStore] = None,
+        keep_events: bool = False,
+        max_events: int = 100_000,
+        ping_interval_s: float = 10.0,
+        on_event: Optional[Callable[[Dict[str, Any]], None]] = None,
+    ) -> None:
+        if websocket is None:
+            raise RuntimeError("WebSocket模式需要安装 websocket-client (pip install websocket-client)")
+        self.url = url
+        self.store = store or LocalBookStore()
+        self.keep_events = bool(keep_events)
+        self.ping_interval_s = float(ping_interval_s)
+        self.on_event = on_event
+        self._events: Deque[Tuple[int, Dict[str, Any]]] = deque(maxlen=int(max_events))
+        self._lock = threading.Lock()
+        self._assets: Tuple[str, ...] = ()
+        self._ws = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="poly-ws", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._close_ws()
+
+    def set_assets(self, token_ids: Iterable[str]) -> None:
+        assets = tuple(sorted(set(str(t) for t in token_ids if t)))
+        with self._lock:
+            if assets == self._assets:
+                return
+            self._assets = assets
+        self.store.retain(assets)
+        # 断开当前连接，由后台线程用新的token集合重连订阅
+        self._close_ws()
+
+    def drain_events(self) -> List[Tuple[int, Dict[str, Any]]]:
+        out = []
+        while self._events:
+            try:
+                out.append(self._events.popleft())
+            except IndexError:
+                break
+        return out
+
+    def _close_ws(self) -> None:
+        ws = self._ws
+        if ws is not None:
+            try:
+                ws.close()
+            except Exception:
+                pass
+
+    def _handle_message(self, raw: str) -> None:
+        if raw in ("PONG", "PING", ""):
+            return
+        try:
+            payload = json.loads(raw)
+        except Exception:
+            return
+        events = payload if isinstance(payload, list) else [payload]
+        recv_ms = int(time.time() * 1000)
+        for event in events:
+            if not isinstance(event, dict):
+                continue
+            self.store.apply_event(event)
+            if self.keep_events:
+                self._events.append((recv_ms, event))
+            if self.on_event is not None:
+                self.on_event(event)
+
+    def _run(self) -> None:
+        backoff = 1.0
+        while not self._stop.is_set():
+            with self._lock:
+                assets = self._assets
+            if not assets:
+                time.sleep(0.2)
+                continue
+            delay = 0.0
+            try:
+                ws = websocket.create_connection(self.url, timeout=self.ping_interval_s)
+                self._ws = ws
+                ws.send(json.dumps({"assets_ids": list(assets), "type": "market"}))
+                print(f"[INFO] WS subscribed {len(assets)} tokens: {self.url}", file=sys.stderr)
+                backoff = 1.0
+                last_ping = last_recv = time.time()
+                while not self._stop.is_set():
+                    with self._lock:
+                        if self._assets != assets:
+                            break
+                    try:
+                        raw = ws.recv()
+                        last_recv = time.time()
+                    except websocket.WebSocketTimeoutException:
+                        raw = ""
+                        if time.time() - last_recv > 3 * self.ping_interval_s:
+                            raise ConnectionError(f"no messages for {time.time() - last_recv:.0f}s")
+                    if raw is None:
+                        break
+                    if isinstance(raw, bytes):
+                        raw = raw.decode("utf-8", errors="replace")
+                    self._handle_message(raw)
+                    if time.time() - last_ping >= self.ping_interval_s:
+                        ws.send("PING")
+                        last_ping = time.time()
+            except Exception as e:
+                with self._lock:
+                    resubscribe = self._assets != assets
+                if not self._stop.is_set() and not resubscribe:
+                    print(f"[WARN] WS connection error: {type(e).__name__}: {e}", file=sys.stderr)
+                    delay = backoff
+                    backoff = min(backoff * 2, 30.0)
+            finally:
+                self._close_ws()
+                self._ws = None
+                # 断线期间的增量已丢失，等重连后的 book 快照
+                self.store.clear(assets)
+            if delay:
+                time.sleep(delay)
+
+
+# ---- 本地替身服务（测试用） ----
+
+_WS_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+
+def _ws_frame(opcode: int, data: bytes) -> bytes:
+    """服务端帧（不加掩码）"""
+    n = len(data)
+    if n < 126:
+        header = struct.pack(">BB", 0x80 | opcode, n)
+    elif n < 65536:
+        header = struct.pack(">BBH", 0x80 | opcode, 126, n)
+    else:
+        header = struct.pack(">BBQ", 0x80 | opcode, 127, n)
+    return header + data
+
+
+def _ws_read_frame(rfile: Any) -> Optional[Tuple[int, bytes]]:
+    head = rfile.read(2)
+    if len(head) < 2:
+        return None
+    opcode, n = head[0] & 0x0F, head[1] & 0x7F
+    if n == 126:
+        n = struct.unpack(">H", rfile.read(2))[0]
+    elif n == 127:
+        n = struct.unpack(">Q", rfile.read(8))[0]
+    mask = rfile.read(4) if head[1] & 0x80 else b""
+    data = rfile.read(n)
+    if mask:
+        data = bytes(b ^ mask[i % 4] for i, b in enumerate(data))
+    return opcode, data
+
+
+def _book_event(token_id: str, bids: Iterable[Any], asks: Iterable[Any]) -> Dict[str, Any]:
+    return {
+        "event_type": "book",
+        "asset_id": token_id,
+        "timestamp": str(int(time.time() * 1000)),
+        "bids": [{"price": f"{float(p):g}", "size": f"{float(s):g}"} for p, s in bids],
+        "asks": [{"price": f"{float(p):g}", "size": f"{float(s):g}"} for p, s in asks],
+    }
+
+
+def _event_assets(event: Dict[str, Any]) -> List[str]:
+    ids = [event.get("asset_id")] + [
+        c.get("asset_id") for c in event.get("price_changes") or [] if isinstance(c, dict)
+    ]
+    return [str(a) for a in ids if a]
+
+
+class _RandomFeed:
+    """替身数据源：固定的初始订单簿 + 随机的 price_change"""
+
+    def __init__(self, seed: int = 0) -> None:
+        self._rng = random.Random(seed)
+        self._books: Dict[str, Dict[str, Dict[float, float]]] = {}
+        self._lock = threading.Lock()
+
+    def snapshot(self, assets: List[str]) -> Tuple[List[Dict[str, Any]], int]:
+        with self._lock:
+            events = []
+            for tid in assets:
+                book = self._books.setdefault(tid, {
+                    "bids": {round(0.40 + i / 100, 2): 100.0 for i in range(10)},
+                    "asks": {round(0.51 + i / 100, 2): 100.0 for i in range(10)},
+                })
+                events.append(_book_event(tid, sorted(book["bids"].items()), sorted(book["asks"].items())))
+            return events, 0
+
+    def since(self, cursor: int, assets: List[str]) -> Tuple[List[Dict[str, Any]], int]:
+        rng = self._rng
+        with self._lock:
+            tid = rng.choice(assets)
+            side = rng.choice(["bids", "asks"])
+            price = round((0.40 if side == "bids" else 0.51) + rng.randrange(10) / 100, 2)
+            size = float(rng.choice([0, rng.randint(1, 500)]))
+            book = self._books.setdefault(tid, {"bids": {}, "asks": {}})
+            if size > 0:
+                book[side][price] = size
+            else:
+                book[side].pop(price, None)
+        event = {
+            "event_type": "price_change",
+            "timestamp": str(int(time.time() * 1000)),
+            "price_changes": [{
+                "asset_id": tid, "price": f"{price:.2f}", "size": f"{size:.0f}",
+                "side": "BUY" if side == "bids" else "SELL",
+            }],
+        }
+        return [event], cursor
+
+
+class _ReplayFeed:
+    """
+    替身数据源：回放 --ws-record-events 写下的 {market_slug}.events.jsonl（每行 {"recv_ts", "event"}）
+
+    回放时钟在第一个订阅到达时启动，按录制的 recv_ts 以 speed 倍速推进（speed<=0 表示一次全部放出），
+    所有连接共享同一个位置：断线期间行情照常前进。新连接先收到当前位置的 book 快照
+    （由已回放的事件重建），之后接着发送新事件，可据此检验断线重连后的订单簿重建。
+    """
+
+    def __init__(self, paths: Iterable[str], *, speed: float = 1.0) -> None:
+        events: List[Tuple[int, Dict[str, Any]]] = []
+        for path in paths:
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        rec = json.loads(line)
+                        events.append((int(rec["recv_ts"]), rec["event"]))
+                    except Exception:
+                        continue
+        events.sort(key=lambda e: e[0])
+        self.events = events
+        self.speed = float(speed)
+        self.store = LocalBookStore()
+        self._pos = 0
+        self._t0: Optional[float] = None
+        self._lock = threading.Lock()
+        print(f"[INFO] WS stand-in replay: {len(events)} events, speed={self.speed:g}", file=sys.stderr)
+
+    def _advance(self) -> int:
+        """把回放时钟之前的事件应用到本地订单簿（持锁调用）"""
+        if self._t0 is None:
+            self._t0 = time.time()
+        if self.speed > 0 and self.events:
+            limit = self.events[0][0] + (time.time() - self._t0) * 1000.0 * self.speed
+        else:
+            limit = float("inf")
+        n = len(self.events)
+        start = self._pos
+        while self._pos < n and self.events[self._pos][0] <= limit:
+            self.store.apply_event(self.events[self._pos][1])
+            self._pos += 1
+        if start < n and self._pos == n:
+            print("[INFO] WS stand-in replay: 已放完全部事件", file=sys.stderr)
+        return self._pos
+
+    def snapshot(self, assets: List[str]) -> Tuple[List[Dict[str, Any]], int]:
+        with self._lock:
+            cursor = self._advance()
+            events = []
+            for tid in assets:
+                book = self.store.snapshot(tid)
+                if book is not None:
+                    events.append(_book_event(tid, book["bids"], book["asks"]))
+            return events, cursor
+
+    def since(self, cursor: int, assets: List[str]) -> Tuple[List[Dict[str, Any]], int]:
+        with self._lock:
+            pos = self._advance()
+        want = set(assets)
+        events = [e for _, e in self.events[cursor:pos] if want.intersection(_event_assets(e))]
+        return events, pos
+
+
+def _stand_in_handler(
+    feed: Any = None,
+    *,
+    interval_s: float = 0.2,
+    drop_after_s: float = 0.0,
+    stall_after_s: float = 0.0,
+):
+    """
+    本地替身：完成 WebSocket 握手，收到订阅后先发 book 快照，之后每 interval_s 发送
+    数据源（_RandomFeed / _ReplayFeed）的新事件；回应 "PING"。
+    drop_after_s>0: 连接保持该时间后主动断开；stall_after_s>0: 该时间后不再发送任何消息（半死连接）。
+    """
+    feed = feed if feed is not None else _RandomFeed()
+
+    class Handler(socketserver.StreamRequestHandler):
+        def handle(self) -> None:
+            self.rfile.readline()
+            headers: Dict[str, str] = {}
+            while True:
+                line = self.rfile.readline().decode("latin-1").strip()
+                if not line:
+                    break
+                k, _, v = line.partition(":")
+                headers[k.strip().lower()] = v.strip()
+            key = headers.get("sec-websocket-key")
+            if not key:
+                return
+            accept = base64.b64encode(hashlib.sha1((key + _WS_GUID).encode("ascii")).digest()).decode("ascii")
+            self.wfile.write(
+                "HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+                f"Sec-WebSocket-Accept: {accept}\r\n\r\n".encode("ascii")
+            )
+            self.wfile.flush()
+
+            t_open = time.time()
+            assets: List[str] = []
+            send_lock = threading.Lock()
+            closed = threading.Event()
+
+            def stalled() -> bool:
+                return stall_after_s > 0 and time.time() - t_open >= stall_after_s
+
+            def send(text: str) -> None:
+                with send_lock:
+                    self.wfile.write(_ws_frame(0x1, text.encode("utf-8")))
+                    self.wfile.flush()
+
+            def reader() -> None:
+                try:
+                    while not closed.is_set():
+                        frame = _ws_read_frame(self.rfile)
+                        if frame is None or frame[0] == 0x8:
+                            break
+                        if frame[0] != 0x1:
+                            continue
+                        text = frame[1].decode("utf-8", errors="replace")
+                        if text == "PING":
+                            if not stalled():
+                                send("PONG")
+                            continue
+                        try:
+                            msg = json.loads(text)
+                        except Exception:
+                            continue
+                        assets[:] = [str(a) for a in msg.get("assets_ids") or []]
+                except Exception:
+                    pass
+                closed.set()
+
+            threading.Thread(target=reader, daemon=True).start()
+            cursor: Optional[int] = None
+            try:
+                while not closed.is_set():
+                    if drop_after_s > 0 and time.time() - t_open >= drop_after_s:
+                        break
+                    if not assets or stalled():
+                        time.sleep(0.05)
+                        continue
+                    if cursor is None:
+                        events, cursor = feed.snapshot(list(assets))
+                    else:
+                        events, cursor = feed.since(cursor, list(assets))
+                    if events:
+                        send(json.dumps(events))
+                    time.sleep(interval_s)
+                with send_lock:
+                    self.wfile.write(_ws_frame(0x8, struct.pack(">H", 1000)))
+                    self.wfile.flush()
+            except Exception:
+                pass
+            closed.set()
+            # 读线程阻塞在 rfile.read 上：先关闭socket让它退出，否则 finish() 关闭 rfile 时会卡住
+            try:
+                self.request.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    return Handler
+
+
+class _StandInServer(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Polymarket market频道客户端 / 本地替身")
+    ap.add_argument("--url", type=str, default=WS_MARKET_URL)
+    ap.add_argument("--assets", type=str, default="", help="逗号分隔的token_id（客户端模式）")
+    ap.add_argument("--serve", type=int, default=0, help="在该端口启动本地替身服务")
+    ap.add_argument("--serve-interval-s", type=float, default=0.2, help="替身发送间隔（秒）")
+    ap.add_argument(
+        "--serve-replay",
+        action="append",
+        default=[],
+        help="替身回放录制的 {market_slug}.events.jsonl（--ws-record-events 输出，可重复）；不指定则随机生成",
+    )
+    ap.add_argument("--serve-speed", type=float, default=1.0, help="回放倍速（<=0 表示一次全部放出）")
+    ap.add_argument("--serve-drop-after-s", type=float, default=0.0, help="替身连接保持N秒后主动断开（0=不断开）")
+    ap.add_argument("--serve-stall-after-s", type=float, default=0.0, help="替身连接N秒后停止发送（0=不停止）")
+    args = ap.parse_args()
+
+    if args.serve:
+        feed = _ReplayFeed(args.serve_replay, speed=float(args.serve_speed)) if args.serve_replay else None
+        handler = _stand_in_handler(
+            feed,
+            interval_s=float(args.serve_interval_s),
+            drop_after_s=float(args.serve_drop_after_s),
+            stall_after_s=float(args.serve_stall_after_s),
+        )
+        server = _StandInServer(("127.0.0.1", int(args.serve)), handler)
+        print(f"[INFO] WS stand-in on ws://127.0.0.1:{int(args.serve)}", file=sys.stderr)
+        server.serve_forever()
+        return
+
+    assets = [a for a in str(args.assets).split(",") if a]
+    if not assets:
+        print("[ERROR] --assets 为空", file=sys.stderr)
+        return
+    stream = MarketChannelStream(args.url)
+    stream.set_assets(assets)
+    stream.start()
+    try:
+        while True:
+            time.sleep(1.0)
+            for tid in assets:
+                book = stream.store.snapshot(tid)
+                if book is None:
+                    print(f"[{tid}] no book", flush=True)
+                    continue
+                bid = book["bids"][-1][0] if book["bids"] else "N/A"
+                ask = book["asks"][-1][0] if book["asks"] else "N/A"
+                print(f"[{tid}] bid={bid} ask={ask}", flush=True)
+    except KeyboardInterrupt:
+        stream.stop()
+
+
+if __name__ == "__main__":
+    main()